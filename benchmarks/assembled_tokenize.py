@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from kgtools.nlp.tokenizer import CompoundTokenizer
+
+SENTENCES = [
+    "Call onNewIntent(Intent) when the activity is re-launched, e.g. from a notification.",
+    "The app:initialExpandedChildrenCount=\"0\" attribute controls how many up-to-date children are shown.",
+    "Use <manifest> to declare the package name, i.e. the application ID of your app.",
+    "You can call getSupportFragmentManager().beginTransaction() to start a new transaction.",
+    "If the list is empty, java.util.List.get(int) throws an IndexOutOfBoundsException.",
+    "Don't call this method from the UI thread; it blocks until the result is available.",
+]
+
+
+def run(sentences, assemble):
+    tokenizer = CompoundTokenizer(assemble=assemble)
+    start = time.time()
+    for sent in sentences:
+        tokenizer.word_tokenize(sent)
+    return time.time() - start
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sentences = [line.strip() for line in Path(sys.argv[1]).open(encoding="utf-8") if len(line.strip()) > 0]
+    else:
+        sentences = SENTENCES
+    sentences = list(dict.fromkeys(sentences))
+
+    run(sentences[:1], False)
+    default, assembled = run(sentences, False), run(sentences, True)
+    print("sentences: %d" % len(sentences))
+    print("default:   %.3fs (%.1f sent/s)" % (default, len(sentences) / default))
+    print("assembled: %.3fs (%.1f sent/s)" % (assembled, len(sentences) / assembled))
+
+    mismatches = CompoundTokenizer().verify_assembled(sentences)
+    print("mismatches: %d" % len(mismatches))
+    for sent in mismatches[:20]:
+        print("  " + sent)
+    sys.exit(1 if len(mismatches) > 0 else 0)
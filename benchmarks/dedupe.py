@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from kgtools.type import Sentence, SentenceTable
+
+
+class LegacySentence(Sentence):
+    """Sentence with the previous hashing: hash(str(self)) on every call, equality through hashes."""
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __eq__(self, other):
+        return hash(self) == hash(other)
+
+
+def make_sentences(cls, n, distinct):
+    # generated lazily: 10M sentence objects do not fit in memory at once, only the distinct ones are kept
+    for i in range(n):
+        yield cls("Call method%d() to get the value of the field %d." % (i % distinct, i % distinct), docs={"doc%d" % (i % 1000)})
+
+
+def construct(sents):
+    start = time.time()
+    count = sum(1 for _ in sents)
+    return count, time.time() - start
+
+
+def dedupe(sents):
+    start = time.time()
+    sent2sent = {}
+    for sent in sents:
+        if sent in sent2sent:
+            sent2sent[sent].docs |= sent.docs
+        else:
+            sent2sent[sent] = sent
+    result = set(sent2sent.values())
+    return len(result), time.time() - start
+
+
+def intern(sents):
+    start = time.time()
+    table = SentenceTable()
+    for sent in sents:
+        table.intern(sent)
+    return len(set(table)), time.time() - start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    distinct = max(n // 10, 1)
+    print("sentences: %d, distinct: %d" % (n, distinct))
+    # every run includes building its sentences, "construct" is that cost alone
+    for name, cls, fn in (("construct", Sentence, construct), ("legacy", LegacySentence, dedupe), ("cached", Sentence, dedupe), ("interned", Sentence, intern)):
+        size, elapsed = fn(make_sentences(cls, n, distinct))
+        print("%-9s %8.3fs  %d %s" % (name, elapsed, size, "sentences" if fn is construct else "unique"))
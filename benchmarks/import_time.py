@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# the imports run in subprocesses, which find kgtools through PYTHONPATH
+ENV = dict(os.environ, PYTHONPATH=os.pathsep.join([str(Path(__file__).resolve().parent.parent)] + [p for p in [os.environ.get("PYTHONPATH")] if p]))
+
+MODULES = [
+    "kgtools.saver",
+    "kgtools.spider",
+    "kgtools.annotation",
+    "kgtools.type",
+    "kgtools.htmlparser",
+    "kgtools.nlp.tokenizer",
+    "kgtools.w2v",
+    "kgtools.preprocessing",
+]
+
+
+def import_time(module, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        proc = subprocess.run([sys.executable, "-c", f"import {module}"], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=ENV)
+        elapsed = time.time() - start
+        if proc.returncode != 0:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def heavy_modules(module):
+    code = f"import sys; import {module}; print('@heavy:' + ' '.join(m for m in ('spacy', 'nltk', 'gensim', 'pathos') if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, env=ENV)
+    if proc.returncode != 0:
+        return "-"
+    return [line for line in proc.stdout.split("\n") if line.startswith("@heavy:")][-1][len("@heavy:"):]
+
+
+if __name__ == "__main__":
+    baseline = import_time("sys")
+    print("%-24s %10s  %s" % ("module", "import(s)", "heavy deps loaded"))
+    for module in MODULES:
+        elapsed = import_time(module)
+        cost = "failed" if elapsed is None else "%.3f" % (elapsed - baseline)
+        print("%-24s %10s  %s" % (module, cost, heavy_modules(module)))
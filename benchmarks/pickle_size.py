@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import copyreg
+import io
+import pickle
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from kgtools.type import Vocab, Token, Sentence, Span
+
+
+class LegacyPickler(pickle.Pickler):
+    """Pickles Token, Sentence and Span with their full __dict__, as before they had __reduce__."""
+
+    def reducer_override(self, obj):
+        if type(obj) in (Token, Sentence, Span):
+            return copyreg.__newobj__, (type(obj),), obj.__dict__
+        return NotImplemented
+
+
+def make_sentences(n_sents=2000, n_words=20000, emb_size=100, seed=0):
+    rng = random.Random(seed)
+    vocab = Vocab.new_instance(emb_size=emb_size)
+    words = ["word%d" % i for i in range(n_words)]
+    vocab.embedding.set_matrix(words, np.random.RandomState(seed).randn(n_words, emb_size))
+    sents = []
+    for i in range(n_sents):
+        tokens = [Token(w, w, vocab=vocab, pos="NOUN", dep="nsubj") for w in rng.sample(words, rng.randint(5, 30))]
+        sent = Sentence(" ".join([t.text for t in tokens]), docs={"https://example.com/%d" % (i % 100)}, tokens=tokens)
+        sent.add_nps((0, 2), (3, 5))
+        sents.append(sent)
+    return sents
+
+
+def measure(sents, pickler_cls):
+    start = time.time()
+    buffer = io.BytesIO()
+    pickler_cls(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(sents)
+    dump_time = time.time() - start
+    payload = buffer.getvalue()
+    start = time.time()
+    pickle.loads(payload)
+    return len(payload), dump_time, time.time() - start
+
+
+if __name__ == "__main__":
+    sents = make_sentences()
+    print("%-8s %12s %10s %10s" % ("format", "bytes", "dump(s)", "load(s)"))
+    for name, pickler_cls in (("legacy", LegacyPickler), ("compact", pickle.Pickler)):
+        print("%-8s %12d %10.3f %10.3f" % ((name, ) + measure(sents, pickler_cls)))
+    print("per-batch (100 sentences, as sent to a Parallel worker):")
+    for name, pickler_cls in (("legacy", LegacyPickler), ("compact", pickle.Pickler)):
+        print("%-8s %12d %10.3f %10.3f" % ((name, ) + measure(sents[:100], pickler_cls)))
@@ -0,0 +1,511 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Reproducible benchmarks for every kgtools stage on the synthetic corpora of `synth.py`.
+
+    python benchmarks/run.py -o base.json                 # run all cases
+    python benchmarks/run.py -o new.json --only html      # run the cases whose name contains "html"
+    python benchmarks/run.py --compare base.json new.json --threshold 0.1
+
+Every case is run `--repeat` times after one warm-up run; the median is compared. Cases whose
+dependencies (e.g. spaCy models, NLTK data) are unavailable are recorded as skipped.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import synth
+
+CASES = {}
+
+
+def case(name):
+    def outer(fn):
+        CASES[name] = fn
+        return fn
+    return outer
+
+
+class Skip(Exception):
+    pass
+
+
+def _parse_batch(html_list):
+    from kgtools.htmlparser import HTMLParser
+
+    parser = HTMLParser()
+    texts = set()
+    for html in html_list:
+        texts.update(parser.parse(html))
+    return texts
+
+
+@case("htmlparser.parse")
+def _(scale, seed):
+    from kgtools.htmlparser import HTMLParser
+
+    pages = list(synth.docsite(int(50 * scale), seed).values())
+    parser = HTMLParser()
+    return lambda: [parser.parse(html) for html in pages], len(pages)
+
+
+@case("htmlparser.process")
+def _(scale, seed):
+    from kgtools.htmlparser import HTMLParser
+
+    pages = list(synth.docsite(int(200 * scale), seed).values())
+    parser = HTMLParser()
+    return lambda: parser.process(pages), len(pages)
+
+
+def _site_case(boilerplate):
+    def setup(scale, seed):
+        from collections import Counter
+        from kgtools.htmlparser import HTMLParser
+
+        pages = list(synth.docsite(int(200 * scale), seed, boilerplate=True).values())
+        parser = HTMLParser()
+        if boilerplate:
+            # learned once per site, so outside the timed runs (see boilerplate.learn)
+            parser.learn_boilerplate(pages[:100])
+        state = {}
+
+        def run():
+            parser.removed = Counter()
+            state["texts"] = parser.process(pages)
+        return run, len(pages), lambda: {"text_bytes": sum(len(text.encode("utf-8")) for text in state["texts"]),
+                                         "removed_bytes": parser.removed["bytes"],
+                                         "removed_sentences": parser.removed["sentences"]}
+    return setup
+
+
+case("htmlparser.process[site]")(_site_case(False))
+case("htmlparser.process[site,boilerplate]")(_site_case(True))
+
+
+@case("boilerplate.learn")
+def _(scale, seed):
+    from kgtools.boilerplate import Boilerplate
+    from kgtools.htmlparser import HTMLParser
+
+    parser = HTMLParser()
+    bodies = [parser.clean(html) for html in synth.docsite(int(100 * scale), seed, boilerplate=True).values()]
+    return lambda: Boilerplate().learn(bodies), len(bodies)
+
+
+@case("javadocparser.parse")
+def _(scale, seed):
+    from kgtools.htmlparser import JavadocParser
+
+    pages = list(synth.javadoc(int(50 * scale), seed).values())
+    parser = JavadocParser()
+    return lambda: [parser.parse(html) for html in pages], len(pages)
+
+
+def _tokenizer(profile="noun_chunks"):
+    from kgtools.nlp.models import get_profile
+    from kgtools.nlp.tokenizer import CompoundTokenizer
+    from kgtools.type import Vocab
+
+    try:
+        vocab = Vocab.new_instance(lemma_first="lemma" in get_profile(profile).fields)
+        tokenizer = CompoundTokenizer(vocab, profile=profile)
+        tokenizer.word_tokenize("Call getIntent() to read it.")
+    except (ImportError, OSError, LookupError) as e:
+        raise Skip(repr(e))
+    return tokenizer
+
+
+@case("tokenizer.sent_tokenize")
+def _(scale, seed):
+    texts = [" ".join(synth.sentences(10, seed + i)) for i in range(int(200 * scale))]
+    tokenizer = _tokenizer()
+    return lambda: [tokenizer.sent_tokenize(text) for text in texts], len(texts)
+
+
+@case("tokenizer.word_tokenize")
+def _(scale, seed):
+    from kgtools.nlp.tokenizer import CompoundTokenizer
+
+    sents = synth.sentences(int(1000 * scale), seed)
+    vocab = _tokenizer().vocab
+    # a fresh tokenizer per run, so its per-sentence cache starts cold
+    return lambda: [CompoundTokenizer(vocab).word_tokenize(sent) for sent in sents], len(sents)
+
+
+def _profile_case(profile):
+    def setup(scale, seed):
+        from kgtools.nlp.tokenizer import CompoundTokenizer
+
+        sents = synth.sentences(int(1000 * scale), seed)
+        vocab = _tokenizer(profile).vocab
+        return lambda: [CompoundTokenizer(vocab, profile=profile).word_tokenize(sent) for sent in sents], len(sents)
+    return setup
+
+
+for _profile in ("tokens", "tokens+lemma", "pos", "noun_chunks", "full"):
+    case(f"tokenizer.word_tokenize[{_profile}]")(_profile_case(_profile))
+
+
+@case("tokenizer.upgrade[tokens+lemma->full]")
+def _(scale, seed):
+    from kgtools.nlp.tokenizer import CompoundTokenizer
+
+    sents = synth.sentences(int(1000 * scale), seed)
+    vocab = _tokenizer("tokens+lemma").vocab
+
+    def run():
+        tokenizer = CompoundTokenizer(vocab, profile="tokens+lemma")
+        tokenized = [tokenizer.word_tokenize(sent) for sent in sents]
+        # parse the sentences with code elements only
+        tokenizer.upgrade([sent for sent in tokenized if len(sent.codes) > 0])
+    return run, len(sents)
+
+
+def _sentences(n, seed, vocab):
+    from kgtools.type import Sentence, Token
+
+    sents = []
+    for text in synth.sentences(n, seed):
+        words = text[:-1].split() + [text[-1]]
+        sents.append(Sentence(text, tokens=[Token.restore(word, word.lower(), vocab) for word in words]))
+    return sents
+
+
+@case("sentence.find_spans")
+def _(scale, seed):
+    from kgtools.type import Vocab
+
+    sents = _sentences(int(5000 * scale), seed, Vocab.new_instance())
+    spans = ["the method", "a list of", "return value", "call", "get activity", "string"]
+    return lambda: [sent.find_spans(*spans) for sent in sents], len(sents)
+
+
+@case("code.find")
+def _(scale, seed):
+    from kgtools.nlp.code import CodeDetector
+
+    sents, detector = synth.sentences(int(20000 * scale), seed), CodeDetector()
+    return lambda: [detector.find(sent) for sent in sents], len(sents)
+
+
+@case("code.find_batch")
+def _(scale, seed):
+    from kgtools.nlp.code import CodeDetector
+
+    sents, detector = synth.sentences(int(20000 * scale), seed), CodeDetector()
+    return lambda: detector.find_batch(sents), len(sents)
+
+
+@case("code.annotate")
+def _(scale, seed):
+    from kgtools.nlp.code import CodeDetector
+    from kgtools.type import Vocab
+
+    sents, detector = _sentences(int(5000 * scale), seed, Vocab.new_instance()), CodeDetector()
+
+    def run():
+        for sent in sents:
+            sent.codes = set()
+        detector.annotate(sents)
+    return run, len(sents)
+
+
+def _urlset_case(kind):
+    def setup(scale, seed):
+        from kgtools.urlset import url_set, bytes_per_url
+
+        urls = ["https://docs.example.com/api/%s/%s.html" % (synth.identifier(rng), i)
+                for rng in [synth._rng(seed)] for i in range(int(100000 * scale))]
+        state = {}
+
+        def run():
+            # every url is checked twice, as links to it are found on several pages
+            state["urls"] = urls_ = url_set(kind)
+            for url in urls:
+                urls_.add(url)
+            for url in urls:
+                urls_.add(url)
+        return run, 2 * len(urls), lambda: {"bytes_per_url": bytes_per_url(state["urls"])}
+    return setup
+
+
+for _kind in ("set", "fingerprint", "bloom", "disk"):
+    case(f"urlset.add[{_kind}]")(_urlset_case(_kind))
+
+
+def _vocab_add_case(**kwargs):
+    def setup(scale, seed):
+        from kgtools.type import Vocab
+
+        words = [str(token) for sent in _sentences(int(5000 * scale), seed, Vocab.new_instance()) for token in sent]
+
+        def run():
+            vocab = Vocab.new_instance(**kwargs)
+            for word in words:
+                vocab.add(word)
+            len(vocab)
+        return run, len(words)
+    return setup
+
+
+case("vocab.add")(_vocab_add_case())
+case("vocab.add[approximate]")(_vocab_add_case(approximate=True, capacity=1000))
+
+
+@case("vocab.merge")
+def _(scale, seed):
+    from kgtools.type import FrequencyCounter, Vocab
+
+    # the per-batch counters sent back by tokenizer workers
+    sents = _sentences(int(5000 * scale), seed, Vocab.new_instance())
+    counters = [FrequencyCounter(str(token) for sent in sents[beg:beg + 64] for token in sent) for beg in range(0, len(sents), 64)]
+
+    def run():
+        vocab = Vocab.new_instance()
+        for counter in counters:
+            vocab.merge(counter)
+    return run, len(counters)
+
+
+@case("vocab.get_embs")
+def _(scale, seed):
+    from kgtools.type import Vocab
+
+    vocab = Vocab.new_instance()
+    rng = np.random.RandomState(seed)
+    words = ["w%d" % i for i in range(int(50000 * scale))]
+    vocab.embedding.set_matrix(words, rng.randn(len(words), 100).astype("float32"))
+    queries = [words[i] for i in rng.randint(0, len(words), int(100000 * scale))] + ["<oov>"] * 1000
+    return lambda: vocab.get_embs(queries), len(queries)
+
+
+@case("vocab.most_similar")
+def _(scale, seed):
+    from kgtools.type import Vocab
+
+    vocab = Vocab.new_instance()
+    rng = np.random.RandomState(seed)
+    words = ["w%d" % i for i in range(int(50000 * scale))]
+    vocab.embedding.set_matrix(words, rng.randn(len(words), 100).astype("float32"))
+    queries = words[:int(1000 * scale)]
+    vocab.similarity_index()
+    return lambda: vocab.most_similar(queries, k=10), len(queries)
+
+
+@case("saver.dump_load")
+def _(scale, seed):
+    from kgtools.saver import Saver
+    from kgtools.type import Vocab
+
+    sents = set(_sentences(int(5000 * scale), seed, Vocab.new_instance()))
+    file_name = Path(tempfile.mkdtemp()) / "sents.bin"
+
+    def run():
+        Saver.dump(sents, file_name)
+        Saver.load(file_name)
+    return run, len(sents)
+
+
+@case("func.reduce_seqs")
+def _(scale, seed):
+    from kgtools.func import reduce_seqs
+
+    sets = [set(range(i * 100, i * 100 + 1000)) for i in range(int(500 * scale))]
+    lists = [list(s) for s in sets]
+    return lambda: (reduce_seqs(sets), reduce_seqs(lists)), 2 * len(sets)
+
+
+def _parallel_case(workers):
+    def setup(scale, seed):
+        from kgtools.annotation import Parallel
+
+        pages = list(synth.docsite(int(200 * scale), seed).values())
+        fn = Parallel(workers=workers)(_parse_batch)
+        return lambda: fn(pages), len(pages)
+    return setup
+
+
+for _workers in (1, 2, 4):
+    case("annotation.parallel[workers=%d]" % _workers)(_parallel_case(_workers))
+
+
+def _skewed_case(size_hint):
+    def setup(scale, seed):
+        from kgtools.annotation import Parallel
+
+        # a few huge pages among many small ones
+        pages = list(synth.docsite(int(200 * scale), seed, size=(2, 10)).values())
+        pages += list(synth.docsite(max(int(4 * scale), 1), seed + 1, size=(400, 600)).values())
+        fn = Parallel(workers=4, size_hint=size_hint)(_parse_batch)
+        return lambda: fn(pages), len(pages)
+    return setup
+
+
+def _io_batch(batch):
+    time.sleep(0.002 * len(batch))
+    return len(batch)
+
+
+async def _io_batch_async(batch):
+    import asyncio
+
+    await asyncio.sleep(0.002 * len(batch))
+    return len(batch)
+
+
+def _numpy_batch(batch):
+    return [float(np.linalg.norm(matrix @ matrix)) for matrix in batch]
+
+
+def _backend_case(backend, workload):
+    def setup(scale, seed):
+        from kgtools.annotation import Parallel
+
+        if workload == "io":
+            data, fn = list(range(int(400 * scale))), _io_batch_async if backend == "async" else _io_batch
+        elif workload == "numpy":
+            rng = np.random.RandomState(seed)
+            data, fn = [rng.randn(200, 200) for _ in range(int(100 * scale))], _numpy_batch
+        else:
+            data, fn = list(synth.docsite(int(100 * scale), seed).values()), _parse_batch
+        fn = Parallel(workers=4, backend=backend)(fn)
+        return lambda: fn(data), len(data)
+    return setup
+
+
+# which backend wins: threads/async for I/O and GIL-releasing numpy, processes for pure Python parsing
+for _workload, _backends in (("io", ("process", "thread", "async")), ("numpy", ("process", "thread")), ("html", ("process", "thread"))):
+    for _backend in _backends:
+        case("annotation.parallel[%s,%s]" % (_workload, _backend))(_backend_case(_backend, _workload))
+
+
+def _vectors_batch(batch):
+    return np.repeat(np.asarray(batch, dtype=np.float32)[:, None], 300, axis=1)
+
+
+def _vectors_list(batch):
+    return [_vectors_batch(batch)]
+
+
+def _matrix_case(shared):
+    def setup(scale, seed):
+        import kgtools.func as func
+
+        data = list(range(int(200000 * scale)))
+        if shared:
+            return lambda: func.parallel(_vectors_batch, data, workers=4, out=300), len(data)
+        return lambda: np.concatenate(func.parallel(_vectors_list, data, workers=4)), len(data)
+    return setup
+
+
+# per-item vectors returned by the workers: pickled and concatenated vs written into shared memory
+case("func.parallel[matrix,pickled]")(_matrix_case(False))
+case("func.parallel[matrix,shared]")(_matrix_case(True))
+
+
+case("annotation.parallel[skewed]")(_skewed_case(None))
+case("annotation.parallel[skewed,size_hint]")(_skewed_case(len))
+
+
+def measure(setup, scale, seed, repeat):
+    try:
+        # a setup may return a third value: a callable giving extra figures to report (e.g. memory)
+        fn, items, *report = setup(scale, seed)
+        fn()
+    except Skip as e:
+        return {"status": "skipped", "reason": str(e)}
+    except Exception as e:
+        return {"status": "error", "reason": repr(e)}
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    median = statistics.median(runs)
+    result = {"status": "ok", "items": items, "runs": runs, "median": median, "min": min(runs),
+              "items_per_sec": items / median if median > 0 else None}
+    for extra in report:
+        result.update(extra())
+    return result
+
+
+def meta(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent).stdout.strip()
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "scale": args.scale, "seed": args.seed, "repeat": args.repeat,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(old, new, threshold):
+    """Print old/new medians per case and return the names of cases slower by more than `threshold`."""
+    regressions = []
+    print("%-36s %12s %12s %8s" % ("case", "old(s)", "new(s)", "ratio"))
+    for name in sorted(set(old["results"]) & set(new["results"])):
+        a, b = old["results"][name], new["results"][name]
+        if a["status"] != "ok" or b["status"] != "ok":
+            print("%-36s %12s %12s %8s" % (name, a["status"], b["status"], "-"))
+            continue
+        ratio = b["median"] / a["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print("%-36s %12.4f %12.4f %8.2f%s" % (name, a["median"], b["median"], ratio, flag))
+    return regressions
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("-o", "--output", default=None)
+    arg_parser.add_argument("--only", nargs="*", default=None)
+    arg_parser.add_argument("--scale", type=float, default=1.)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    arg_parser.add_argument("--threshold", type=float, default=0.1)
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        old, new = [json.loads(Path(file_name).read_text(encoding="utf-8")) for file_name in args.compare]
+        regressions = compare(old, new, args.threshold)
+        if len(regressions) > 0:
+            print("%d regression(s) above %.0f%%: %s" % (len(regressions), args.threshold * 100, ", ".join(regressions)))
+            sys.exit(1)
+        sys.exit(0)
+
+    results = {}
+    for name, setup in CASES.items():
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        results[name] = measure(setup, args.scale, args.seed, args.repeat)
+        result = results[name]
+        if result["status"] == "ok":
+            print("%-36s %10.4fs %12.1f items/s" % (name, result["median"], result["items_per_sec"])
+                  + "".join("  %s=%.4g" % (key, result[key]) for key in ("bytes_per_url", "text_bytes", "removed_bytes", "removed_sentences") if key in result))
+        else:
+            print("%-36s %s (%s)" % (name, result["status"], result["reason"]))
+
+    report = {"meta": meta(args), "results": results}
+    if args.output is not None:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=4), encoding="utf-8")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Deterministic synthetic corpora for the benchmarks.
+
+    python benchmarks/synth.py testdata
+
+writes `testdata/guide.bin` (url -> html, as loaded by kgtools.preprocessing) and
+`testdata/sentences.txt`.
+"""
+
+import random
+import sys
+from pathlib import Path
+
+WORDS = ("the a an this that method class object value field instance returns called when if for with "
+         "list map string number default user view activity layout resource request response thread "
+         "is are be can should must may will create update delete set get add remove use call pass").split()
+TYPES = ("String", "Object", "Integer", "List", "Map", "View", "Context", "Intent", "Bundle", "Activity",
+         "Fragment", "Thread", "Handler", "Cursor", "Uri", "File", "Stream", "Builder", "Listener")
+METHODS = ("get", "set", "add", "remove", "create", "update", "on", "is", "has", "to", "from", "with")
+
+
+def _rng(seed):
+    return random.Random(seed)
+
+
+def identifier(rng):
+    return rng.choice(METHODS) + rng.choice(TYPES) + rng.choice(("", "s", "Count", "Id", "Name"))
+
+
+def code_token(rng):
+    kind = rng.randrange(4)
+    if kind == 0:
+        return "%s()" % identifier(rng)
+    if kind == 1:
+        return "%s.%s(%s)" % (rng.choice(TYPES), identifier(rng), rng.choice(("", "int", "String")))
+    if kind == 2:
+        return "java.%s.%s" % (rng.choice(("util", "io", "lang", "net")), rng.choice(TYPES))
+    return "%s().%s()" % (identifier(rng), identifier(rng))
+
+
+def sentence(rng, code_ratio=0.15, length=(6, 30)):
+    words = []
+    for _ in range(rng.randint(*length)):
+        words.append(code_token(rng) if rng.random() < code_ratio else rng.choice(WORDS))
+    words[0] = words[0].capitalize() if words[0][0].islower() else words[0]
+    return " ".join(words) + rng.choice((".", ".", ".", "?", "!"))
+
+
+def sentences(n, seed=0, code_ratio=0.15):
+    rng = _rng(seed)
+    return [sentence(rng, code_ratio) for _ in range(n)]
+
+
+def paragraph(rng, n=None):
+    return " ".join(sentence(rng) for _ in range(n if n is not None else rng.randint(1, 6)))
+
+
+# blocks repeated verbatim on every page of a site, as learned by kgtools.boilerplate
+BOILERPLATE = ('<div class="devsite-sidebar"><ul>%s</ul></div>' % "".join("<li><a>%s</a></li>" % title for title in (
+                   "Getting started", "App fundamentals", "Activities", "Fragments", "Intents and intent filters",
+                   "User interface", "Layouts", "Animations", "Background work", "Data and file storage", "Permissions",
+                   "Testing", "Performance", "Security", "Publishing")),
+               '<div class="devsite-breadcrumb"><a>Home</a> &gt; <a>Guides</a> &gt; <a>App basics</a></div>',
+               '<div class="cookie-banner"><p>This site uses cookies from Google to deliver its services and to analyze traffic.</p><button>OK, got it</button></div>',
+               '<div class="devsite-feedback"><p>Was this page helpful?</p><button>Yes</button><button>No</button></div>')
+
+
+def docsite_html(rng, size=20, boilerplate=False):
+    nav = "".join('<li><a href="/guide/%s.html">%s</a></li>' % (identifier(rng), identifier(rng)) for _ in range(30))
+    body = []
+    for _ in range(size):
+        kind = rng.randrange(6)
+        if kind == 0:
+            body.append("<h%d>%s</h%d>" % (rng.randint(1, 4), paragraph(rng, 1).rstrip(".?!"), rng.randint(1, 4)))
+        elif kind == 1:
+            body.append("<ul>%s</ul>" % "".join("<li>%s</li>" % sentence(rng).rstrip(".") for _ in range(rng.randint(2, 6))))
+        elif kind == 2:
+            body.append("<pre><code>%s</code></pre>" % "\n".join(code_token(rng) + ";" for _ in range(rng.randint(3, 12))))
+        elif kind == 3:
+            rows = "".join("<tr><td>%s</td><td>%s</td></tr>" % (code_token(rng), sentence(rng)) for _ in range(rng.randint(2, 8)))
+            body.append("<table>%s</table>" % rows)
+        else:
+            body.append("<p>%s Use <code>%s</code> here.</p>" % (paragraph(rng), code_token(rng)))
+    head, tail = (BOILERPLATE[:2], BOILERPLATE[2:]) if boilerplate else ((), ())
+    return ('<html><head><script>var x = 1;</script></head><body>'
+            '<div class="devsite-nav"><ul>%s</ul></div>%s'
+            '<div class="devsite-article-body">%s</div>%s'
+            '<footer><p>Content is licensed under Apache 2.0. Was this page helpful?</p></footer>'
+            '</body></html>') % (nav, "".join(head), "".join(body), "".join(tail))
+
+
+def javadoc_html(rng, members=20):
+    blocks = []
+    for _ in range(members):
+        blocks.append('<li class="blockList"><h4>%s</h4><pre>public %s %s(%s)</pre><div class="block">%s</div></li>'
+                      % (identifier(rng), rng.choice(TYPES), identifier(rng), rng.choice(TYPES), paragraph(rng)))
+    return ('<html><body><div class="topNav"><ul><li>Overview</li><li>Package</li></ul></div>'
+            '<div class="header"><h2 title="Class %s">Class %s</h2></div>'
+            '<div class="contentContainer"><div class="block">%s</div><ul>%s</ul></div>'
+            '<div class="bottomNav">Java SE 8</div></body></html>') % ((rng.choice(TYPES),) * 2 + (paragraph(rng), "".join(blocks)))
+
+
+def docsite(n, seed=0, size=(5, 40), boilerplate=False):
+    rng = _rng(seed)
+    return {"https://developer.example.com/guide/page%d.html" % i: docsite_html(rng, rng.randint(*size), boilerplate) for i in range(n)}
+
+
+def javadoc(n, seed=0, members=(5, 40)):
+    rng = _rng(seed)
+    return {"https://docs.example.com/api/Class%d.html" % i: javadoc_html(rng, rng.randint(*members)) for i in range(n)}
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from kgtools.saver import Saver
+
+    out = Path(sys.argv[1] if len(sys.argv) > 1 else "testdata")
+    Saver.dump(docsite(200), out / "guide.bin")
+    Saver.dump(javadoc(200), out / "javadoc.bin")
+    with (out / "sentences.txt").open("w", encoding="utf-8") as f:
+        f.write("\n".join(sentences(5000)))
@@ -1,86 +1,197 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import asyncio
+import logging
 import time
 import threading
 import multiprocessing
 import random
+from collections import OrderedDict
+from contextlib import contextmanager
 from functools import wraps
-from pathos.multiprocessing import ProcessingPool as Pool
+
+import numpy as np
 
 from kgtools.func import reduce_seqs
+from kgtools.profiler import PROFILER, Profiled, logger, timed
+from kgtools.scheduler import schedule, AsyncPool
+from kgtools.shm import SharedArray, RowWriter
 
-WORKERS = multiprocessing.cpu_count() - 1
+WORKERS = max(multiprocessing.cpu_count() - 1, 1)
 
 
 def TimeLog(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        print("@TimeLog[%s]: %s starts." % (time.strftime("%X", time.localtime()), fn.__qualname__))
-        start = time.time()
-        rs = fn(*args, **kwargs)
-        end = time.time()
-        print("@TimeLog[%s]: %s finishes." % (time.strftime("%X", time.localtime()), fn.__qualname__))
-        print("@TimeLog[%fs]: %s takes." % (end - start, fn.__qualname__))
+        logger.debug("@TimeLog: %s starts.", fn.__qualname__)
+        start = time.perf_counter()
+        with PROFILER.span(fn.__qualname__):
+            rs = fn(*args, **kwargs)
+        logger.info("@TimeLog[%fs]: %s takes.", time.perf_counter() - start, fn.__qualname__)
         return rs
     return wrapper
 
 
+class SingleFlight:
+    """Per-key locks: concurrent callers holding the same key run one at a time, other keys are not blocked."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__keys = {}
+
+    @contextmanager
+    def hold(self, key):
+        with self.__lock:
+            entry = self.__keys.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.__lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.__keys[key]
+
+
 class Lazy(object):
     def __init__(self, func):
         self.func = func
-        print("@Lazy[%s]: lazy property is declared." % self.func.__qualname__)
+        self.flight = SingleFlight()
+        logger.debug("@Lazy[%s]: lazy property is declared.", self.func.__qualname__)
 
     def __get__(self, instance, cls):
-        val = self.func(instance)
-        setattr(instance, self.func.__name__, val)
+        if instance is None:
+            return self
+        name = self.func.__name__
+        # once computed, the instance attribute shadows this descriptor; concurrent first reads compute once
+        with self.flight.hold(id(instance)):
+            if name in instance.__dict__:
+                return instance.__dict__[name]
+            val = self.func(instance)
+            setattr(instance, name, val)
         return val
 
 
 def ID(*prime_keys):
+    # the formatted key is computed once per object: prime keys must not change afterwards. Only the string
+    # is cached (it caches its own hash): string hashes are salted per process, so a hash pickled with the
+    # object would be stale in another process
+    def key(obj):
+        string = obj.__dict__.get("_ID__key")
+        if string is None:
+            string = obj.__dict__["_ID__key"] = '<{}: {}>'.format(obj.__class__.__name__, " ".join([f"{key}={str(obj.__dict__[key])}" for key in prime_keys]))
+        return string
+
     def wrapper(clazz):
-        clazz.__str__ = lambda obj: '<{}: {}>'.format(obj.__class__.__name__, " ".join([f"{key}={str(obj.__dict__[key])}" for key in prime_keys]))
-        clazz.__repr__ = lambda obj: '<{}: {}>'.format(obj.__class__.__name__, " ".join([f"{k}={str(v)}" for k, v in obj.__dict__.items()]))
-        clazz.__eq__ = lambda obj, other: hash(obj) == hash(other)
-        clazz.__hash__ = lambda obj: hash(str(obj))
+        clazz.__str__ = key
+        clazz.__repr__ = lambda obj: '<{}: {}>'.format(obj.__class__.__name__, " ".join([f"{k}={str(v)}" for k, v in obj.__dict__.items() if k != "_ID__key"]))
+        clazz.__eq__ = lambda obj, other: obj is other or hash(obj) == hash(other)
+        clazz.__hash__ = lambda obj: hash(key(obj))
         return clazz
     return wrapper
 
 
+_SINGLETON_LOCK = threading.RLock()
+
+
 def Singleton(clazz):
+    # the instance is created and initialized once under one shared lock; later calls return it as is
+    init = clazz.__init__
+
     def new(cls, *args, **kwargs):
-        if not hasattr(cls, "__instance"):
-            with threading.Lock():
-                if not hasattr(cls, "__instance"):
-                    print("@Singleton[%s]: initialize singleton object." % cls.__name__)
-                    cls.__instance = object.__new__(cls)
-                    cls.__instance.__init__(*args, **kwargs)
-        # print("@Singleton[%s]: get singleton object." % cls.__name__)
-        return cls.__instance
-
-    if not hasattr(clazz, "__Singleton"):
-        with threading.Lock():
-            if not hasattr(clazz, "__Singleton"):
-                clazz.__Singleton = True
-                clazz.__new__ = new
+        if "__instance" not in cls.__dict__:
+            with _SINGLETON_LOCK:
+                if "__instance" not in cls.__dict__:
+                    logger.debug("@Singleton[%s]: initialize singleton object.", cls.__name__)
+                    instance = object.__new__(cls)
+                    init(instance, *args, **kwargs)
+                    setattr(cls, "__instance", instance)
+        return cls.__dict__["__instance"]
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    with _SINGLETON_LOCK:
+        if "__Singleton" not in clazz.__dict__:
+            setattr(clazz, "__Singleton", True)
+            clazz.__new__ = new
+            clazz.__init__ = __init__
     return clazz
 
 
-def Cache(fn):
-    cache = {}
-    print("@Cache[%s]: add cache." % fn.__qualname__)
+def Cache(fn=None, maxsize=10000):
+    """Memoize `fn` by its (hashable) positional arguments, keeping the `maxsize` most recently used results (all of them with None).
+
+    Used bare (`@Cache`) or with a bound (`@Cache(maxsize=...)`). The bound keeps long-lived callers, such
+    as the tokenizers resident in pipeline workers, from growing with every distinct input they see.
+    """
+    if fn is None:
+        return lambda fn: Cache(fn, maxsize)
+    cache = OrderedDict()
+    lock = threading.Lock()
+    flight = SingleFlight()
+    logger.debug("@Cache[%s]: add cache (maxsize=%s).", fn.__qualname__, maxsize)
+
+    def get(arg):
+        with lock:
+            if arg in cache:
+                cache.move_to_end(arg)
+                return True, cache[arg]
+        return False, None
 
     @wraps(fn)
     def wrapper(*arg):
-        if arg not in cache:
-            result = fn(*arg)
-            cache[arg] = result
-        return cache[arg]
+        found, value = get(arg)
+        if found:
+            return value
+        # concurrent misses on the same key wait for one computation
+        with flight.hold(arg):
+            found, value = get(arg)
+            if not found:
+                value = fn(*arg)
+                with lock:
+                    cache[arg] = value
+                    if maxsize is not None and len(cache) > maxsize:
+                        cache.popitem(last=False)
+        return value
+    wrapper.cache = cache
+    wrapper.maxsize = maxsize
     return wrapper
 
 
-def Parallel(workers=WORKERS, batch_size=None, shuffle=True, after_hook=None):
+def _pool(backend, workers):
+    if backend == "process":
+        from multiprocess import Pool
+        return Pool(workers)
+    if backend == "thread":
+        from multiprocessing.pool import ThreadPool
+        return ThreadPool(workers)
+    return AsyncPool(workers)
+
+
+def Parallel(workers=WORKERS, batch_size=None, shuffle=False, after_hook=None, size_hint=None, target=0.2, backend="process", out=None, out_dtype="float32"):
+    """Run the decorated `fn(batch, ...)` over chunks of its data argument in a pool and reduce the results.
+
+    `backend` is "process" (the default; CPU-bound pure Python), "thread" (I/O, or C code that
+    releases the GIL such as lxml and numpy; no process start-up or pickling) or "async" (`fn` is a
+    coroutine function and `workers` chunks are awaited at once on one event loop).
+
+    With `out` (the shape of one row, e.g. `out=100`), `fn` returns one row per item and the rows are
+    written by the workers into a preallocated (shared-memory, for processes) matrix, which is
+    returned without being pickled back or concatenated.
+
+    Chunks are pulled by idle workers and sized so that each takes about `target` seconds, from the
+    per-item cost measured on earlier chunks (see kgtools.scheduler). `size_hint(item)` estimates the
+    cost of an item (e.g. `len` for html), so the largest items go first. A fixed `batch_size` turns
+    the adaptation off. Results are reduced in chunk order, i.e. in input order without `size_hint`.
+    """
+    assert backend in {"process", "thread", "async"}, "The parameter 'backend' must be in {'process', 'thread', 'async'}"
+
     def outer(fn):
+        assert backend != "async" or asyncio.iscoroutinefunction(fn), "The 'async' backend needs a coroutine function"
+
         @wraps(fn)
         def wrapper(*args, **kwargs):
 
@@ -93,29 +204,46 @@ def Parallel(workers=WORKERS, batch_size=None, shuffle=True, after_hook=None):
 
             if type(data) != list:
                 data = list(data)
-
-            total_size = len(data)
-            _batch_size = total_size // workers + 1 if batch_size is None else batch_size
-            # assert type(data) == list, "Type of data must be list"
-            print(f"@Parallel[workers={workers}, data_size={total_size}, batch_size={_batch_size}]: parallel for {fn.__qualname__}.")
-
             if shuffle:
-                print(f"@Parallel[workers={workers}, data_size={total_size}, batch_size={_batch_size}]: shuffle data for {fn.__qualname__}.")
                 random.shuffle(data)
 
-            pool = Pool(workers)
-            pool.terminate()
-            pool.restart()
-
-            proc = []
-            for beg, end in zip(range(0, total_size, _batch_size), range(_batch_size, total_size + _batch_size, _batch_size)):
-                batch = data[beg:end]
-                p = pool.apipe(fn, *obj, batch, *_args, **kwargs)
-                proc.append(p)
-            pool.close()
-            pool.join()
-
-            result = reduce_seqs([p.get() for p in proc])
+            total_size = len(data)
+            if total_size == 0:
+                if out is not None:
+                    return np.empty((0, *np.atleast_1d(out)), out_dtype)
+                result = fn(*obj, data, *_args, **kwargs)
+                return asyncio.run(result) if backend == "async" else result
+            _workers = max(min(workers, total_size), 1)
+            logger.info("@Parallel[backend=%s, workers=%d, data_size=%d, batch_size=%s]: parallel for %s.", backend, _workers, total_size, batch_size or "adaptive", fn.__qualname__)
+
+            hints = None if size_hint is None else [size_hint(item) for item in data]
+            task, matrix = fn, None
+            if out is not None:
+                shape = (total_size, *np.atleast_1d(out))
+                matrix = SharedArray(shape, out_dtype) if backend == "process" else np.empty(shape, out_dtype)
+                task = RowWriter(fn, matrix)
+            if PROFILER.enabled and backend == "process":
+                task = Profiled(task, fn.__qualname__, PROFILER.memory)
+            elif PROFILER.enabled and backend == "thread":
+                # worker threads record into this process' profiler directly
+                task = timed(task, fn.__qualname__)
+            try:
+                with _pool(backend, _workers) as pool:
+                    results, chunks = schedule(pool, task, data, obj, tuple(_args), kwargs, _workers, hints, batch_size, target, out is not None)
+            finally:
+                if isinstance(matrix, SharedArray):
+                    matrix.unlink()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("@Parallel[chunks=%d, sizes=%d..%d]: %s done.", len(chunks), min(map(len, chunks)), max(map(len, chunks)), fn.__qualname__)
+
+            if PROFILER.enabled and backend == "process":
+                for _, snapshot in results:
+                    PROFILER.merge(snapshot)
+                results = [rs for rs, _ in results]
+            if matrix is not None:
+                result = matrix.array if isinstance(matrix, SharedArray) else matrix
+            else:
+                result = reduce_seqs(results)
             if after_hook is not None:
                 result = after_hook(result)
 
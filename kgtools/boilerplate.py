@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import re
+from collections import Counter
+from hashlib import blake2b
+
+BLOCKS = {"div", "section", "aside", "nav", "header", "footer", "main", "article", "form", "ul", "ol", "li", "dl", "dt", "dd",
+          "p", "h1", "h2", "h3", "h4", "h5", "h6", "table", "tr", "blockquote"}
+UNITS = ["li", "p", "h1", "h2", "h3", "h4", "h5", "h6"]
+
+
+def _segment(tag):
+    classes = tag.get("class")
+    return tag.name + ("." + ".".join(sorted(classes)) if classes else "")
+
+
+def _text(tag):
+    return re.sub(r'\s+', ' ', tag.get_text(" ")).strip()
+
+
+class Boilerplate:
+    """Blocks that repeat across the pages of a site (sidebars, breadcrumbs, banners, feedback widgets).
+
+    A block is fingerprinted by its tag path (tag names and classes from the body down) and its
+    text. `learn` counts on how many pages of a sample every fingerprint occurs; the ones found on at
+    least `threshold` of the pages (and on `min_pages` pages) are boilerplate, and `strip` removes
+    them from a page in one top-down walk that does not descend into removed blocks. Only the
+    blocks at a path where boilerplate was learned have their text hashed.
+    """
+
+    def __init__(self, threshold=0.5, min_pages=3, sample=100, seed=0):
+        assert 0 < threshold <= 1, "The parameter 'threshold' must be in (0, 1]"
+        self.threshold = threshold
+        self.min_pages = min_pages
+        self.sample = sample
+        self.seed = seed
+        self.fingerprints = set()
+        self.paths = set()
+        self.pages = 0
+
+    @property
+    def learned(self):
+        return self.pages > 0
+
+    @staticmethod
+    def fingerprint(path, text):
+        return int.from_bytes(blake2b(f"{path}\0{text}".encode("utf-8"), digest_size=8).digest(), "big")
+
+    @staticmethod
+    def walk(body, visit):
+        """Call `visit(block, path)` on the blocks of `body` top-down, skipping the children of a block it returns True for."""
+        stack = [(body, "body")]
+        while len(stack) > 0:
+            element, path = stack.pop()
+            children = []
+            for child in list(element.children):
+                if child.name is not None:
+                    child_path = path + ">" + _segment(child)
+                    if child.name not in BLOCKS or not visit(child, child_path):
+                        children.append((child, child_path))
+            stack.extend(reversed(children))
+
+    def learn(self, bodies):
+        """Learn the boilerplate from parsed page bodies (a sample of `sample` of them); returns self."""
+        bodies = [body for body in bodies if body is not None]
+        if len(bodies) > self.sample:
+            bodies = random.Random(self.seed).sample(bodies, self.sample)
+        counts = Counter()
+        for body in bodies:
+            found = set()
+
+            def visit(block, path):
+                text = _text(block)
+                if len(text) > 0:
+                    found.add((path, Boilerplate.fingerprint(path, text)))
+                return False
+            Boilerplate.walk(body, visit)
+            counts.update(found)
+        self.pages = len(bodies)
+        least = max(self.threshold * self.pages, self.min_pages)
+        learned = [key for key, count in counts.items() if count >= least]
+        self.fingerprints = {fp for _, fp in learned}
+        self.paths = {path for path, _ in learned}
+        return self
+
+    def strip(self, body):
+        """Remove the boilerplate blocks from `body` in place; returns a Counter of blocks, bytes and (estimated) sentences removed."""
+        removed = Counter()
+        if len(self.fingerprints) == 0:
+            return removed
+
+        def visit(block, path):
+            if path not in self.paths:
+                return False
+            text = _text(block)
+            if len(text) == 0 or Boilerplate.fingerprint(path, text) not in self.fingerprints:
+                return False
+            removed["blocks"] += 1
+            removed["bytes"] += len(text.encode("utf-8"))
+            # the parser ends every list item, heading and paragraph as a sentence
+            removed["sentences"] += max(len(block.find_all(UNITS)) + (block.name in UNITS), 1)
+            block.extract()
+            return True
+        Boilerplate.walk(body, visit)
+        return removed
+
+    def __len__(self):
+        return len(self.fingerprints)
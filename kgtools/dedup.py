@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import zlib
+from collections import OrderedDict
+from itertools import islice
+from pathlib import Path
+import numpy as np
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX = np.uint64((1 << 32) - 1)
+
+
+class NearDuplicateDetector:
+    """Near-duplicate sentence detection with MinHash signatures and banded LSH, over a stream of sentences.
+
+    Sentences are shingled over lemmas (or texts) and MinHashed in numpy batches of `batch_size`, and
+    every band of a signature is reduced to one 64-bit key. Each sentence is then looked up in an
+    index of band key -> representative: the representatives sharing a key with it in any band are
+    its candidates, and with `verify` the most similar one at least `threshold` similar (on the
+    signatures) is its representative. A sentence without one becomes a representative itself.
+
+    Only representatives are indexed, at most `capacity` of them: past that, the one matched least
+    recently is evicted. Memory is O(capacity * (bands + num_perm)) whatever the length of the
+    stream; the signatures are memory-mapped under `workdir` if given. The index persists across
+    calls, so a corpus can be fed in pieces.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, bands=None, shingle=3, is_lemma=True, verify=True,
+                 batch_size=10000, capacity=200000, workdir=None, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands if bands is not None else NearDuplicateDetector.optimal_bands(threshold, num_perm)
+        assert num_perm % self.bands == 0, "The parameter 'num_perm' must be divisible by 'bands'"
+        self.rows = num_perm // self.bands
+        self.shingle = shingle
+        self.is_lemma = is_lemma
+        self.verify = verify
+        self.batch_size = batch_size
+        self.capacity = capacity
+        self.workdir = workdir
+
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 31, num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 31, num_perm).astype(np.uint64)
+        self.band_weights = rng.randint(1, 1 << 31, self.rows).astype(np.uint64)
+        self.reset()
+
+    def reset(self):
+        """Forget every representative."""
+        self.index = [{} for _ in range(self.bands)]
+        # slot -> representative, the least recently matched first
+        self.slots = OrderedDict()
+        self.keys = np.empty((0, self.bands), dtype=np.uint64)
+        self.signatures = np.empty((0, self.num_perm), dtype=np.uint32)
+
+    @staticmethod
+    def optimal_bands(threshold, num_perm):
+        # the LSH S-curve of b bands with r rows rises at about (1/b)^(1/r)
+        candidates = [b for b in range(1, num_perm + 1) if num_perm % b == 0]
+        return min(candidates, key=lambda b: abs((1. / b) ** (b / num_perm) - threshold))
+
+    def shingles(self, sent):
+        if sent.tokens:
+            words = [token.lemma if self.is_lemma else token.text for token in sent.tokens]
+        else:
+            words = sent.text.split()
+        if len(words) < self.shingle:
+            grams = [" ".join(words)]
+        else:
+            grams = [" ".join(words[i:i + self.shingle]) for i in range(len(words) - self.shingle + 1)]
+        return np.array(sorted({zlib.crc32(gram.encode("utf-8")) for gram in grams}), dtype=np.uint64)
+
+    def signature(self, sents):
+        shingles = [self.shingles(sent) for sent in sents]
+        offsets = np.concatenate([[0], np.cumsum([len(s) for s in shingles])[:-1]]).astype(np.int64)
+        values = np.concatenate(shingles)
+        hashes = ((values[:, None] * self.a[None, :] + self.b[None, :]) % _PRIME) & _MAX
+        return np.minimum.reduceat(hashes, offsets, axis=0).astype(np.uint32)
+
+    def band_keys(self, signatures):
+        bands = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (bands * self.band_weights).sum(axis=2)
+
+    def __reserve(self, size):
+        if size <= len(self.keys):
+            return
+        size = min(max(size, 2 * len(self.keys), 1024), self.capacity)
+        if self.workdir is not None and self.verify:
+            # mapped at full capacity once: the file is sparse until rows are written
+            Path(self.workdir).mkdir(parents=True, exist_ok=True)
+            size = self.capacity
+            signatures = np.lib.format.open_memmap(str(Path(self.workdir) / "signatures.npy"), mode="w+", dtype=np.uint32, shape=(size, self.num_perm))
+        else:
+            signatures = np.empty((size if self.verify else 0, self.num_perm), dtype=np.uint32)
+        signatures[:len(self.signatures)] = self.signatures
+        keys = np.empty((size, self.bands), dtype=np.uint64)
+        keys[:len(self.keys)] = self.keys
+        self.keys, self.signatures = keys, signatures
+
+    def __match(self, keys, signature):
+        candidates = []
+        for band, key in enumerate(keys):
+            slot = self.index[band].get(key)
+            if slot is not None and slot not in candidates:
+                candidates.append(slot)
+        if len(candidates) == 0:
+            return None
+        if not self.verify:
+            return candidates[0]
+        sims = (self.signatures[candidates] == signature).mean(axis=1)
+        best = int(np.argmax(sims))
+        return candidates[best] if sims[best] >= self.threshold else None
+
+    def __add(self, keys, signature, sent):
+        if len(self.slots) >= self.capacity:
+            slot, _ = self.slots.popitem(last=False)
+            for band, key in enumerate(self.keys[slot].tolist()):
+                if self.index[band].get(key) == slot:
+                    del self.index[band][key]
+        else:
+            slot = len(self.slots)
+            self.__reserve(slot + 1)
+        self.keys[slot] = keys
+        if self.verify:
+            self.signatures[slot] = signature
+        for band, key in enumerate(keys):
+            self.index[band][key] = slot
+        self.slots[slot] = sent
+
+    def representatives(self, sents):
+        """Yield (sentence, representative) for every sentence of the stream; the representative is None for a new one."""
+        sents = iter(sents)
+        batch = list(islice(sents, self.batch_size))
+        while len(batch) > 0:
+            signatures = self.signature(batch)
+            for sent, keys, signature in zip(batch, self.band_keys(signatures).tolist(), signatures):
+                slot = self.__match(keys, signature)
+                if slot is None:
+                    self.__add(keys, signature, sent)
+                    yield sent, None
+                else:
+                    self.slots.move_to_end(slot)
+                    yield sent, self.slots[slot]
+            batch = list(islice(sents, self.batch_size))
+
+    def groups(self, sents):
+        """Return, for each sentence of a list, the index of its representative (the first sentence of its group).
+
+        The label is -1 for a sentence whose representative came from an earlier call.
+        """
+        first, labels = {}, []
+        for i, (sent, rep) in enumerate(self.representatives(sents)):
+            if rep is None:
+                first[id(sent)] = i
+            labels.append(first.get(id(sent if rep is None else rep), -1))
+        return np.array(labels, dtype=np.int64)
+
+    def dedupe(self, sents):
+        """Merge near-duplicates into their representative, unioning their `docs`; returns the representatives."""
+        reps = []
+        for sent, rep in self.representatives(sents):
+            if rep is None:
+                reps.append(sent)
+            elif sent.docs:
+                if rep.docs is None:
+                    rep.docs = set(sent.docs)
+                else:
+                    rep.docs |= sent.docs
+        return reps
+
+    def stage(self, items):
+        """Pipeline stage over (url, sentences): every near-duplicate is replaced by its representative."""
+        for key, sents in items:
+            yield key, [sent if rep is None else rep for sent, rep in self.representatives(sents)]
+
+    def __call__(self, sents):
+        return self.dedupe(sents)
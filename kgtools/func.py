@@ -3,62 +3,100 @@
 
 import multiprocessing
 import random
+from collections import Counter
 from functools import reduce
+from itertools import chain
 
-WORKERS = multiprocessing.cpu_count() - 1
+import numpy as np
+
+from kgtools.profiler import PROFILER, Profiled, logger
+from kgtools.scheduler import schedule
+from kgtools.shm import SharedArray, RowWriter
+
+WORKERS = max(multiprocessing.cpu_count() - 1, 1)
 
 
 def reduce_sets(sets):
-    return reduce(lambda x, y: x | y, sets)
+    return set().union(*sets)
 
 
 def reduce_lists(lists):
-    return reduce(lambda x, y: x + y, lists)
+    return list(chain.from_iterable(lists))
 
 
 def reduce_dicts(dicts):
-    return reduce(lambda x, y: dict(set(x.items()) | set(y.items())), dicts)
+    merged = {}
+    for d in dicts:
+        merged.update(d)
+    return merged
+
+
+def reduce_counters(counters):
+    merged = Counter()
+    for counter in counters:
+        merged.update(counter)
+    # like x + y, keep the positive counts only
+    return +merged
 
 
 def reduce_seqs(seqs):
+    # every chunk is merged in one pass: folding with x | y or x + y copies the accumulator per chunk
     if seqs[0] is None:
         return None
     dtype = type(seqs[0])
     assert all([isinstance(ele, dtype) for ele in seqs]), "All element type must be same"
     if dtype == set:
-        return reduce(lambda x, y: x | y, seqs)
+        return reduce_sets(seqs)
     elif dtype == list:
-        return reduce(lambda x, y: x + y, seqs)
+        return reduce_lists(seqs)
+    elif dtype == Counter:
+        return reduce_counters(seqs)
     elif dtype == dict:
-        return reduce(lambda x, y: dict(x, **y))
+        return reduce_dicts(seqs)
     elif dtype == tuple:
         return tuple(reduce_seqs(d) for d in zip(*seqs))
     else:
         return reduce(lambda x, y: x + y, seqs)
 
 
-def parallel(fn, data, *args, shuffle=True, in_place=False, workers=WORKERS):
-    print("Start %d workers..." % workers)
-
+def parallel(fn, data, *args, shuffle=False, in_place=False, workers=WORKERS, size_hint=None, batch_size=None, out=None, out_dtype="float32"):
+    """Map `fn(batch, *args)` over chunks of `data` in a process pool; see annotation.Parallel for `size_hint` and `out`."""
     if shuffle:
         random.shuffle(data)
 
     total_size = len(data)
-    batch_size = total_size // workers
-    proc = []
-    pool = multiprocessing.Pool(processes=workers)
-    for beg, end in zip(range(0, total_size, batch_size), range(batch_size, total_size + batch_size, batch_size)):
-        batch = data[beg:end]
-        p = pool.apply_async(fn, args=(batch, *args))
-        proc.append(p)
-
-    pool.close()
-    pool.join()
+    if total_size == 0:
+        if out is not None:
+            return np.empty((0, *np.atleast_1d(out)), out_dtype)
+        return None if in_place else fn(data, *args)
+    workers = max(min(workers, total_size), 1)
+    logger.info("Start %d workers...", workers)
+
+    hints = None if size_hint is None else [size_hint(item) for item in data]
+    task, matrix = fn, None
+    if out is not None:
+        matrix = SharedArray((total_size, *np.atleast_1d(out)), out_dtype)
+        task = RowWriter(fn, matrix)
+    if PROFILER.enabled:
+        task = Profiled(task, getattr(fn, "__qualname__", "parallel"), PROFILER.memory)
+    try:
+        with multiprocessing.Pool(processes=workers) as pool:
+            results, _ = schedule(pool, task, data, (), args, None, workers, hints, batch_size, indexed=out is not None)
+    finally:
+        if matrix is not None:
+            matrix.unlink()
+
+    if PROFILER.enabled:
+        for _, snapshot in results:
+            PROFILER.merge(snapshot)
+        results = [rs for rs, _ in results]
+
+    if matrix is not None:
+        return matrix.array
 
     result = None
     if not in_place:
-        result = [p.get() for p in proc]
-        result = reduce_seqs(result)
+        result = reduce_seqs(results)
 
     if result is not None:
         return result
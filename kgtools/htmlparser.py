@@ -2,11 +2,15 @@
 # -*- coding: utf-8 -*-
 
 from abc import ABCMeta, abstractmethod
+from collections import Counter
 from typing import List
+import random
 import re
 from bs4 import BeautifulSoup
 
 from kgtools.annotation import Parallel, TimeLog
+from kgtools.boilerplate import Boilerplate
+from kgtools.profiler import logger
 from kgtools.symbol import HTML
 
 
@@ -19,11 +23,17 @@ class HTMLParser:
             self.key = key
             self.value = value
 
-    def __init__(self, entry_nodes: List[Node]=None, filter_nodes: List[Node]=None):
+    def __init__(self, entry_nodes: List[Node]=None, filter_nodes: List[Node]=None, boilerplate=None):
         self.entry_nodes = entry_nodes if entry_nodes is not None else []
         self.filter_nodes = filter_nodes if filter_nodes is not None else []
-
-    def parse(self, html):
+        # boilerplate=True learns the site's repeated blocks from a sample of the pages given to `process`
+        # (Pipeline.process learns from the first pages of its stream); `parse` alone only strips the blocks
+        # of an already learned Boilerplate
+        self.boilerplate = Boilerplate() if boilerplate is True else (None if boilerplate is False else boilerplate)
+        self.removed = Counter()
+        self.__warned = False
+
+    def clean(self, html):
         body = BeautifulSoup(html, "lxml").body
 
         # remove useless elements
@@ -39,6 +49,29 @@ class HTMLParser:
         for node in self.filter_nodes:
             filtered = body.findAll(**{node.key: node.value})
             [n.extract() for n in filtered]
+        return body
+
+    def learn_boilerplate(self, html_list):
+        if self.boilerplate is None:
+            self.boilerplate = Boilerplate()
+        self.boilerplate.learn(self.clean(html) for html in html_list)
+        logger.info("@HTMLParser[boilerplate]: %d boilerplate blocks learned from %d pages.", len(self.boilerplate), self.boilerplate.pages)
+        return self.boilerplate
+
+    def parse(self, html):
+        texts, removed = self._parse(html)
+        self.removed += removed
+        return texts
+
+    def _parse(self, html):
+        body = self.clean(html)
+        removed = Counter()
+        if self.boilerplate is not None:
+            if not self.boilerplate.learned and not self.__warned:
+                self.__warned = True
+                logger.warning("@HTMLParser.parse[boilerplate]: nothing is stripped, no boilerplate was learned (see learn_boilerplate).")
+            removed = self.boilerplate.strip(body)
+            removed["pages"] += 1
 
         entries = []
         for node in self.entry_nodes:
@@ -97,16 +130,28 @@ class HTMLParser:
                 if text[-1] not in set(".?!:;,"):
                     text = text + "."
                 texts.add(text)
-        return texts
+        return texts, removed
 
     @TimeLog
-    @Parallel()
     def process(self, html_list):
-        docs = set()
+        html_list = list(html_list)
+        if self.boilerplate is not None and not self.boilerplate.learned:
+            self.learn_boilerplate(random.Random(self.boilerplate.seed).sample(html_list, min(self.boilerplate.sample, len(html_list))))
+        docs, removed = self._process(html_list)
+        if self.boilerplate is not None:
+            self.removed += removed
+            logger.info("@HTMLParser.process[boilerplate]: removed %d blocks, %d bytes and ~%d sentences from %d pages.",
+                        removed["blocks"], removed["bytes"], removed["sentences"], removed["pages"])
+        return docs
+
+    @Parallel(size_hint=len)
+    def _process(self, html_list):
+        docs, removed = set(), Counter()
         for html in html_list:
-            texts = self.parse(html)
+            texts, page_removed = self._parse(html)
             docs.update(texts)
-        return docs
+            removed += page_removed
+        return docs, removed
 
 
 class JavadocParser(HTMLParser):
@@ -115,6 +160,9 @@ class JavadocParser(HTMLParser):
     def __init__(self, **cfg):
         super(self.__class__, self).__init__(**cfg)
 
+    def _parse(self, html):
+        return self.parse(html), Counter()
+
     def parse(self, html):
         body = BeautifulSoup(html, "lxml").body
         strings = []
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+from pathlib import Path
+
+from kgtools.saver import Saver, FileFormat
+
+
+class Manifest:
+    """Content hash of every document of a pipeline run, plus the stage outputs keyed by hash.
+
+    Outputs are stored as `outputs/<hash>.bin` next to `manifest.json`, so a document whose content
+    did not change (even if it moved to another url) is never processed again.
+    """
+
+    def __init__(self, workdir):
+        self.workdir = Path(workdir)
+        self.file = self.workdir / "manifest.json"
+        self.docs = Saver.load(self.file, FileFormat.JSON)["docs"] if self.file.exists() else {}
+
+    @staticmethod
+    def digest(content):
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    def diff(self, hashes):
+        """Compare {url: hash} with the manifest and return (added, changed, removed) url sets."""
+        added = {url for url in hashes if url not in self.docs}
+        changed = {url for url in hashes if url in self.docs and self.docs[url] != hashes[url]}
+        removed = {url for url in self.docs if url not in hashes}
+        return added, changed, removed
+
+    def __output(self, digest):
+        return self.workdir / "outputs" / f"{digest}.bin"
+
+    def has_output(self, digest):
+        return self.__output(digest).exists()
+
+    def load_output(self, digest):
+        return Saver.load(self.__output(digest))
+
+    def dump_output(self, digest, output):
+        Saver.dump(output, self.__output(digest))
+
+    def save(self, hashes):
+        self.docs = dict(hashes)
+        Saver.dump({"docs": self.docs}, self.file, FileFormat.JSON)
+        live = set(self.docs.values())
+        for output in (self.workdir / "outputs").glob("*.bin"):
+            if output.stem not in live:
+                output.unlink()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+
+IDENT = r'[A-Za-z_$][\w$]*'
+ARGS = r'\([\w$.,<>\[\]? ]*\)'
+CALL = IDENT + ARGS
+
+# tried in this order at every position, so a method chain wins over the single call it starts with
+PATTERNS = (
+    ("chain", rf'(?:{IDENT}\.)*{CALL}(?:\.{CALL})+'),
+    ("call", rf'(?:{IDENT}\.)*{CALL}'),
+    ("annotation", rf'@{IDENT}(?:\.{IDENT})*'),
+    ("qualified", rf'{IDENT}[\w$](?:\.{IDENT})+'),
+    ("camel", r'(?:[a-z_$][a-z\d_$]*|[A-Z][a-z\d]+)[A-Z][\w$]*'),
+    ("constant", r'[A-Z][A-Z\d]*(?:_[A-Z\d]+)+'),
+    ("snake", r'[a-z][a-z\d]*(?:_[a-z\d]+)+'),
+)
+# every built-in element has one of these within its first word: plain words are rejected in one
+# pass instead of being re-scanned by each alternative
+GUARD = r'(?=@|[\w$]*(?:[.(_$]|[a-z\d][A-Z]))'
+
+
+class CodeDetector:
+    """Finds code elements (calls, method chains, qualified names, identifiers, ...) in sentences.
+
+    The built-in patterns and the user `patterns` (a list of regexes, or a dict name -> regex) are
+    combined into one alternation of named groups, so a sentence is scanned once and `lastgroup`
+    tells which pattern matched. User patterns come first and win over the built-in ones. A pattern
+    that cannot be inlined (one with backreferences or its own flags) is run on its own; one that
+    matches the empty string is dropped. `find_batch` scans many sentences in one pass over their
+    concatenation.
+    """
+
+    def __init__(self, patterns=None, builtin=True):
+        if patterns is None:
+            patterns = {}
+        elif not isinstance(patterns, dict):
+            patterns = {f"user{i}": pattern for i, pattern in enumerate(patterns)}
+        self.patterns = {}
+        self.separate = []
+        for name, pattern in patterns.items():
+            assert re.fullmatch(r'[A-Za-z_]\w*', name) is not None, f"The pattern name '{name}' must be an identifier"
+            compiled = re.compile(pattern) if isinstance(pattern, str) else pattern
+            if compiled.match("") is not None:
+                continue
+            if compiled.flags & ~re.UNICODE or re.search(r'\\\d|\(\?P=', compiled.pattern) is not None:
+                self.separate.append((name, compiled))
+            else:
+                # nested named groups would clash in the alternation
+                self.patterns[name] = re.sub(r'\(\?P<\w+>', '(?:', compiled.pattern)
+        alternatives = [f"(?P<{name}>{pattern})" for name, pattern in self.patterns.items()]
+        if builtin:
+            builtins = [f"(?P<{name}>{pattern})" for name, pattern in PATTERNS if name not in self.patterns]
+            alternatives.append(GUARD + "(?:" + "|".join(builtins) + ")")
+            self.patterns.update((name, pattern) for name, pattern in PATTERNS if name not in self.patterns)
+        alternatives = "|".join(alternatives)
+        self.regex = re.compile(rf'(?<![\w$.@])(?:{alternatives})(?![\w$])') if alternatives else None
+
+    def __scan(self, text):
+        return [] if self.regex is None else [(m.lastgroup, m.start(), m.end()) for m in self.regex.finditer(text) if m.end() > m.start()]
+
+    def __separate(self, text, found):
+        if len(self.separate) == 0:
+            return found
+        found = found + [(name, m.start(), m.end()) for name, pattern in self.separate for m in pattern.finditer(text) if m.end() > m.start()]
+        found.sort(key=lambda x: (x[1], -x[2]))
+        kept, end = [], 0
+        for element in found:
+            if element[1] >= end:
+                kept.append(element)
+                end = element[2]
+        return kept
+
+    def find(self, text):
+        """Return the code elements of `text` as (kind, start, end) character spans."""
+        return self.__separate(text, self.__scan(text))
+
+    def find_batch(self, texts):
+        texts = [str(text) for text in texts]
+        found = [[] for _ in texts]
+        if self.regex is not None and len(texts) > 0:
+            starts, offset = [], 0
+            for text in texts:
+                starts.append(offset)
+                offset += len(text) + 1
+            i = 0
+            for m in self.regex.finditer("\n".join(texts)):
+                while i + 1 < len(starts) and starts[i + 1] <= m.start():
+                    i += 1
+                # a user pattern may match across the separator
+                if m.end() > m.start() and m.end() - starts[i] <= len(texts[i]):
+                    found[i].append((m.lastgroup, m.start() - starts[i], m.end() - starts[i]))
+        return [self.__separate(text, elements) for text, elements in zip(texts, found)]
+
+    def annotate(self, sentences):
+        """Attach the code elements found in `sentences` to them (see `Sentence.add_codes`)."""
+        sentences = list(sentences)
+        for sent, elements in zip(sentences, self.find_batch(sent.text for sent in sentences)):
+            sent.add_codes(*elements)
+        return sentences
+
+    def __call__(self, text):
+        return self.find(text)
+
+
+if __name__ == "__main__":
+    detector = CodeDetector()
+    for element in detector.find("Call getIntent().getExtras() or Map.get(String), see java.util.List and MAX_VALUE in @Override."):
+        print(element)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import threading
+from collections import namedtuple
+
+from kgtools.profiler import logger
+
+HYPHEN_PATTERN = r"[A-Za-z\d]+-[A-Za-z\d]+|'[a-z]+|''|id|ID|Id"
+
+_MODELS = {}
+_LOCK = threading.Lock()
+
+Profile = namedtuple("Profile", ["name", "disable", "fields"])
+
+# the spaCy components a profile switches off and the Token fields it fills (the others stay None);
+# without the tagger, lemmas come from spaCy's lookup table instead of the POS-based rules
+PROFILES = {
+    "tokens": Profile("tokens", ("tagger", "parser", "ner"), ("text",)),
+    "tokens+lemma": Profile("tokens+lemma", ("tagger", "parser", "ner"), ("text", "lemma")),
+    "pos": Profile("pos", ("parser", "ner"), ("text", "lemma", "pos")),
+    "noun_chunks": Profile("noun_chunks", ("ner",), ("text", "lemma", "pos", "dep", "nps")),
+    "full": Profile("full", (), ("text", "lemma", "pos", "dep", "nps", "ner")),
+}
+
+
+def _build_spacy(name, disable, token_match):
+    import spacy
+    from spacy.tokenizer import Tokenizer as SpacyTokenizer
+
+    logger.info("@load_spacy[%s]: load spaCy pipeline (disable=%s).", name, list(disable))
+    nlp = spacy.load(name, disable=list(disable))
+    if token_match is not None:
+        prefix_re = spacy.util.compile_prefix_regex(nlp.Defaults.prefixes)
+        infix_re = spacy.util.compile_infix_regex(nlp.Defaults.infixes)
+        suffix_re = spacy.util.compile_suffix_regex(nlp.Defaults.suffixes)
+        nlp.tokenizer = SpacyTokenizer(nlp.vocab, prefix_search=prefix_re.search, infix_finditer=infix_re.finditer,
+                                       suffix_search=suffix_re.search, token_match=re.compile(token_match).match)
+    return nlp
+
+
+def load_spacy(name="en", disable=("ner",), token_match=HYPHEN_PATTERN):
+    """Return the process-wide spaCy pipeline for this config, loading it on first use."""
+    key = (name, tuple(sorted(disable)), token_match)
+    if key not in _MODELS:
+        with _LOCK:
+            if key not in _MODELS:
+                _MODELS[key] = _build_spacy(name, key[1], token_match)
+    return _MODELS[key]
+
+
+def get_profile(profile):
+    if isinstance(profile, Profile):
+        return profile
+    assert profile in PROFILES, f"The parameter 'profile' must be in {set(PROFILES.keys())}"
+    return PROFILES[profile]
+
+
+def load_profile(profile, name="en", token_match=HYPHEN_PATTERN):
+    """Return the spaCy pipeline with only the components `profile` needs."""
+    return load_spacy(name, disable=get_profile(profile).disable, token_match=token_match)
+
+
+def clear_models():
+    with _LOCK:
+        _MODELS.clear()
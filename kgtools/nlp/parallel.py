@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import sys
+
+from kgtools.func import WORKERS
+from kgtools.profiler import logger
+from kgtools.type import Vocab, Token, Sentence
+from kgtools.nlp.tokenizer import CompoundTokenizer
+
+_TOKENIZER = None
+
+
+def _init_worker(tokenizer_cls, lemma_first, kwargs):
+    global _TOKENIZER
+    _TOKENIZER = tokenizer_cls(vocab=Vocab.new_instance(lemma_first=lemma_first), **kwargs)
+
+
+def _tokenize_batch(batch):
+    strings = {}
+
+    def sid(string):
+        return strings.setdefault(string, len(strings))
+
+    results = []
+    for i, text in batch:
+        for sent in _TOKENIZER.tokenize(text):
+            tokens = [(sid(t.text), sid(t.lemma), sid(t.pos), sid(t.dep)) for t in sent.tokens]
+            codes = [(span.kind, span.char_start, span.char_end) for span in sent.codes]
+            results.append((i, sent.text, tokens, [(span.start, span.end) for span in sent.nps], codes))
+    counts = (_TOKENIZER.vocab.token_counts, _TOKENIZER.vocab.lemma_counts)
+    _TOKENIZER.vocab.reset_counts()
+    return list(strings.keys()), results, counts
+
+
+class ParallelTokenizer:
+    """Tokenizes texts in worker processes that each keep one tokenizer (and spaCy pipeline) loaded.
+
+    Workers send back string tables with token-id tuples and their token and lemma counters; the
+    parent rebuilds the sentences against its own `vocab` and merges the counters into it.
+    """
+
+    def __init__(self, tokenizer_cls=CompoundTokenizer, vocab=Vocab(), workers=WORKERS, batch_size=64, **kwargs):
+        self.tokenizer_cls = tokenizer_cls
+        self.vocab = vocab
+        self.workers = max(workers, 1)
+        self.batch_size = batch_size
+        self.kwargs = kwargs
+
+    def __rebuild(self, strings, results, sents):
+        strings = [sys.intern(s) if isinstance(s, str) else s for s in strings]
+        for i, text, tokens, nps, codes in results:
+            sentence = Sentence(text, tokens=[Token.restore(strings[t], strings[lm], self.vocab, strings[p], strings[d])
+                                              for t, lm, p, d in tokens])
+            sentence.add_nps(*nps)
+            sentence.add_codes(*codes)
+            sents[i].append(sentence)
+
+    def tokenize(self, texts):
+        texts = list(texts)
+        indexed = list(enumerate(texts))
+        batches = [indexed[beg:beg + self.batch_size] for beg in range(0, len(texts), self.batch_size)]
+        sents = [[] for _ in texts]
+        logger.info("@ParallelTokenizer[workers=%d, data_size=%d, batch_size=%d]: tokenize with %s.", self.workers, len(texts), self.batch_size, self.tokenizer_cls.__name__)
+        with multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                  initargs=(self.tokenizer_cls, self.vocab.lemma_first, self.kwargs)) as pool:
+            for strings, results, (token_counts, lemma_counts) in pool.imap_unordered(_tokenize_batch, batches):
+                self.__rebuild(strings, results, sents)
+                self.vocab.token_counts.update(token_counts)
+                self.vocab.lemma_counts.update(lemma_counts)
+        return sents
+
+    def batch_process(self, texts):
+        sents = set()
+        for group in self.tokenize(texts):
+            sents.update(group)
+        return sents
+
+    def __call__(self, texts):
+        return self.tokenize(texts)
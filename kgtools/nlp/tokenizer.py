@@ -2,22 +2,47 @@
 # -*- coding: utf-8 -*-
 
 from abc import ABCMeta, abstractmethod
-from nltk.tokenize import sent_tokenize as nltk_st, word_tokenize as nltk_wt
+from collections import Counter, OrderedDict
 import re
-import spacy
 from typing import Set
 
 from kgtools.type import Vocab, Token, Sentence
+from kgtools.type.span import token_offsets
 from kgtools.symbol import HTML
 # from kgtools.type.vocab import Vocab
 # from kgtools.type.token import Token
 # from kgtools.type.sentence import Sentence
 from kgtools.annotation import Cache, TimeLog
+from kgtools.nlp.models import get_profile, load_profile
+from kgtools.nlp.code import CodeDetector
+
+
+def nltk_st(text):
+    from nltk.tokenize import sent_tokenize
+    return sent_tokenize(text)
+
+
+def nltk_wt(text):
+    from nltk.tokenize import word_tokenize
+    return word_tokenize(text)
+
+
+def convert(spacy_tokens, vocab, profile):
+    """Tokens with the fields `profile` computes (the others are None)."""
+    lemma, pos, dep, ner = [field in profile.fields for field in ("lemma", "pos", "dep", "ner")]
+    return [Token(t.text, t.lemma_ if lemma else None, vocab=vocab, pos=t.pos_ if pos else None,
+                  dep=t.dep_ if dep else None, ner=t.ent_type_ if ner else None) for t in spacy_tokens]
+
+
+def noun_chunks(spacy_doc, profile):
+    return {(np.start, np.end) for np in spacy_doc.noun_chunks} if "nps" in profile.fields else set()
 
 
 class Tokenizer(metaclass=ABCMeta):
-    def __init__(self, vocab: Vocab):
+    def __init__(self, vocab: Vocab, profile="noun_chunks"):
         self.vocab = vocab
+        self.profile = get_profile(profile)
+        assert "lemma" in self.profile.fields or not vocab.lemma_first, "A 'lemma_first' vocab needs a profile with lemmas"
 
     @abstractmethod
     def word_tokenize(self, sent: str) -> Sentence:
@@ -38,35 +63,63 @@ class Tokenizer(metaclass=ABCMeta):
             sents.update(self.tokenize(text))
         return sents
 
+    def upgrade(self, sentences, profile="full"):
+        """Fill in the token fields (and noun chunks) of a richer `profile` for already tokenized `sentences`.
+
+        The tokens are kept and annotated in place, so a cheap profile can be run on everything and
+        only the sentences that need it are parsed. Lemma counts of the vocab follow changed lemmas.
+        """
+        from spacy.tokens import Doc
+
+        profile = get_profile(profile)
+        nlp = load_profile(profile)
+        lemma, pos, dep, ner = [field in profile.fields for field in ("lemma", "pos", "dep", "ner")]
+        added, removed = Counter(), Counter()
+        for sent in sentences:
+            offsets = token_offsets(sent.text, sent.tokens)
+            spaces = [end < begin for (_, end), (begin, _) in zip(offsets, offsets[1:])] + [False]
+            spacy_doc = Doc(nlp.vocab, words=[token.text for token in sent.tokens], spaces=spaces)
+            for _, proc in nlp.pipeline:
+                spacy_doc = proc(spacy_doc)
+            for token, t in zip(sent.tokens, spacy_doc):
+                if lemma and token.lemma != t.lemma_:
+                    if token.lemma is not None:
+                        removed[token.lemma] += 1
+                    added[t.lemma_] += 1
+                    token.lemma = t.lemma_
+                token.pos = t.pos_ if pos else token.pos
+                token.dep = t.dep_ if dep else token.dep
+                token.ner = t.ent_type_ if ner else token.ner
+            if "nps" in profile.fields:
+                sent.nps = set()
+                sent.add_nps(*noun_chunks(spacy_doc, profile))
+        self.vocab.lemma_counts.update(added)
+        self.vocab.lemma_counts.subtract(removed)
+        return sentences
+
 
 class SpacyTokenizer(Tokenizer):
     __name__ = "SpacyTokenizer"
 
-    def __init__(self, vocab: Vocab=Vocab()):
-        super(self.__class__, self).__init__(vocab)
-        self.nlp = spacy.load("en", disable=["ner"])
-        hyphen_re = re.compile(r"[A-Za-z\d]+-[A-Za-z\d]+|'[a-z]+|''|id|ID|Id")
-        prefix_re = spacy.util.compile_prefix_regex(self.nlp.Defaults.prefixes)
-        infix_re = spacy.util.compile_infix_regex(self.nlp.Defaults.infixes)
-        suffix_re = spacy.util.compile_suffix_regex(self.nlp.Defaults.suffixes)
-        self.nlp.tokenizer = spacy.tokenizer.Tokenizer(self.nlp.vocab, prefix_search=prefix_re.search,
-                                                       infix_finditer=infix_re.finditer,
-                                                       suffix_search=suffix_re.search, token_match=hyphen_re.match)
+    def __init__(self, vocab: Vocab=Vocab(), profile="noun_chunks"):
+        super(self.__class__, self).__init__(vocab, profile)
+        self.nlp = load_profile(self.profile)
 
     @Cache
     def word_tokenize(self, sent):
         spacy_doc = self.nlp(sent)
-        tokens = [Token(t.text, t.lemma_, vocab=self.vocab, pos=t.pos_, dep=t.dep_) for t in spacy_doc]
-        sentence = Sentence(sent, tokens=tokens)
-        nps = {(np.start, np.end) for np in spacy_doc.noun_chunks}
-        sentence.add_nps(*nps)
+        sentence = Sentence(sent, tokens=convert(spacy_doc, self.vocab, self.profile))
+        sentence.add_nps(*noun_chunks(spacy_doc, self.profile))
         return sentence
 
     @Cache
     def tokenize(self, text):
-        sents = {}
+        if "parser" in self.profile.disable:
+            # sentence boundaries come from the parser
+            return {self.word_tokenize(sent) for sent in nltk_st(text)}
+        sents = set()
         for sent in self.nlp(text).sents:
-            sents.add(Sentence(text, tokens=[Token(t.text, t.lemma_, vocab=self.vocab, pos=t.pos_, dep=t.dep_) for t in sent]))
+            sents.add(Sentence(sent.text, tokens=convert(sent, self.vocab, self.profile)))
         return sents
 
     def __call__(self, text):
@@ -84,25 +137,18 @@ class CompoundTokenizer(Tokenizer):
     #     "__CODE__": ""
     # }
 
-    def __init__(self, vocab=Vocab(), code_patterns=None):
-        super(self.__class__, self).__init__(vocab)
+    def __init__(self, vocab=Vocab(), code_patterns=None, assemble=False, detect_code=True, profile="noun_chunks", pieces_size=100000):
+        super(self.__class__, self).__init__(vocab, profile)
         self.vocab = vocab
-        self.patterns = [
-            re.compile(r'([a-zA-Z_][a-zA-Z\d_]*)(\.\1)+'),
-            re.compile(r'[a-zA-Z_]([a-z][A-Z])'),
-            re.compile(r'[a-zA-Z_][a-zA-Z\d_]*\([a-zA-Z\d_]*\)(\.[a-zA-Z_][a-zA-Z\d_]*\([a-zA-Z\d_]*\))'),
-            re.compile(r'')
-        ]
-        code_patterns = code_patterns if code_patterns is not None else []
-        self.patterns.extend(code_patterns)
-
-        self.spacy_nlp = spacy.load('en', disable=["ner"])
-        hyphen_re = re.compile(r"[A-Za-z\d]+-[A-Za-z\d]+|'[a-z]+|''|id|ID|Id")
-        prefix_re = spacy.util.compile_prefix_regex(self.spacy_nlp.Defaults.prefixes)
-        infix_re = spacy.util.compile_infix_regex(self.spacy_nlp.Defaults.infixes)
-        suffix_re = spacy.util.compile_suffix_regex(self.spacy_nlp.Defaults.suffixes)
-        self.spacy_nlp.tokenizer = spacy.tokenizer.Tokenizer(self.spacy_nlp.vocab, prefix_search=prefix_re.search, infix_finditer=infix_re.finditer,
-                                                             suffix_search=suffix_re.search, token_match=hyphen_re.match)
+        # build the spaCy doc from the NLTK tokens (see make_doc) instead of re-tokenizing their joined string
+        self.assemble = assemble
+        # LRU of the spaCy split of the most recent `pieces_size` distinct NLTK tokens
+        self.__pieces = OrderedDict()
+        self.pieces_size = pieces_size
+        self.detector = CodeDetector(code_patterns)
+        self.detect_code = detect_code
+
+        self.spacy_nlp = load_profile(self.profile)
 
     @Cache
     def sent_tokenize(self, text):
@@ -187,30 +233,88 @@ class CompoundTokenizer(Tokenizer):
         tokens = [t.replace("__eg__", "e.g.").replace("__ie__", "i.e.").replace("``", '"').replace("''", '"') for t in tokens]
         return tokens
 
+    def __convert(self, spacy_doc):
+        return convert(spacy_doc, self.vocab, self.profile), noun_chunks(spacy_doc, self.profile)
+
+    def __split(self, word):
+        pieces = self.__pieces.get(word)
+        if pieces is None:
+            # spaCy caches the split of a chunk too, but calling its tokenizer builds a Doc per token
+            pieces = [(t.text, len(t.whitespace_) > 0) for t in self.spacy_nlp.tokenizer(word)]
+            self.__pieces[word] = pieces
+            if len(self.__pieces) > self.pieces_size:
+                self.__pieces.popitem(last=False)
+        else:
+            self.__pieces.move_to_end(word)
+        return pieces
+
+    def make_doc(self, words):
+        """Build the spaCy doc that `spacy_nlp(" ".join(words))` would produce without re-scanning the joined string.
+
+        This is not a single pass: NLTK still tokenizes the sentence first. What it saves is spaCy's
+        second scan of the joined string, since each NLTK token is split by the spaCy tokenizer
+        rules once (kept in a bounded LRU per distinct token) and the pipeline components run on the
+        assembled doc.
+        """
+        from spacy.tokens import Doc
+
+        texts, spaces = [], []
+        for word in words:
+            pieces = self.__split(word)
+            if len(pieces) > 0:
+                texts.extend([text for text, _ in pieces])
+                spaces.extend([space for _, space in pieces])
+                spaces[-1] = True
+        if len(spaces) > 0:
+            spaces[-1] = False
+        spacy_doc = Doc(self.spacy_nlp.vocab, words=texts, spaces=spaces)
+        for _, proc in self.spacy_nlp.pipeline:
+            spacy_doc = proc(spacy_doc)
+        return spacy_doc
+
     @Cache
     def word_tokenize_spacy(self, sentence):
-        spacy_doc = self.spacy_nlp(sentence)
-        tokens = [Token(t.text, t.lemma_, vocab=self.vocab, pos=t.pos_, dep=t.dep_) for t in spacy_doc]
-        nps = {(np.start, np.end) for np in spacy_doc.noun_chunks}
-        return tokens, nps
+        return self.__convert(self.spacy_nlp(sentence))
 
     @Cache
-    def word_tokenize(self, sent):
+    def word_tokenize_assembled(self, sentence):
+        return self.__convert(self.make_doc(self.word_tokenize_nltk(sentence)))
+
+    def __word_tokenize(self, sent):
+        if self.assemble:
+            return self.word_tokenize_assembled(sent)
         tokens = self.word_tokenize_nltk(sent)
-        tokens, nps = self.word_tokenize_spacy(" ".join(tokens))
+        return self.word_tokenize_spacy(" ".join(tokens))
+
+    @Cache
+    def word_tokenize(self, sent):
+        tokens, nps = self.__word_tokenize(sent)
         sentence = Sentence(sent, tokens=tokens)
         sentence.add_nps(*nps)
+        if self.detect_code:
+            self.find_code(sentence)
         return sentence
 
     @Cache
     def tokenize(self, text):
         sents = self.sent_tokenize(text)
         for sent in sents:
-            tokens = self.word_tokenize_nltk(sent.text)
-            sent.tokens, nps = self.word_tokenize_spacy(" ".join(tokens))
+            sent.tokens, nps = self.__word_tokenize(sent.text)
             sent.add_nps(*nps)
+        if self.detect_code:
+            self.find_codes(sents)
         return sents
 
+    def verify_assembled(self, sentences):
+        """Return the sentences whose assembled-doc tokenization differs from the default one."""
+        mismatches = []
+        for sent in sentences:
+            expected, expected_nps = self.word_tokenize_spacy(" ".join(self.word_tokenize_nltk(sent)))
+            actual, actual_nps = self.word_tokenize_assembled(sent)
+            if [(t.text, t.lemma, t.pos, t.dep) for t in expected] != [(t.text, t.lemma, t.pos, t.dep) for t in actual] or expected_nps != actual_nps:
+                mismatches.append(sent)
+        return mismatches
+
     def __call__(self, text):
         return self.tokenize(text)
 
@@ -262,10 +366,13 @@ class CompoundTokenizer(Tokenizer):
     def find_code(self, sentence):
         '''find code elements
 
-        [description]
-
-        Arguments:
-            sentence {[type]} -- [description]
+        Returns the (kind, char_start, char_end) code elements of a sentence; a `Sentence` also
+        gets them attached as `codes`.
         '''
-        for pattern in self.patterns:
-            pass
+        elements = self.detector.find(str(sentence))
+        if isinstance(sentence, Sentence):
+            sentence.add_codes(*elements)
+        return elements
+
+    def find_codes(self, sentences):
+        return self.detector.annotate(sentences)
@@ -1,60 +1,586 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import argparse
+import hashlib
+import heapq
+import json
+import multiprocessing
+import queue
+import tempfile
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from itertools import chain, groupby, islice
 from pathlib import Path
-from kgtools.cleaner import BaseCleaner
-from kgtools.tokenizer import Tokenizer
-from kgtools.w2v import Word2Vec
-from kgtools.func import parallel
+
 from kgtools.type import Vocab
-from kgtools.saver import Saver
+from kgtools.saver import Saver, FileFormat
 
 from kgtools.wrapper import TimeLog
+from kgtools.profiler import logger
+
+_END = object()
+
+
+class _Failure:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def _drain(q, shared=False):
+    while True:
+        item = q.get()
+        if item is _END:
+            if shared:
+                q.put(_END)
+            return
+        if isinstance(item, _Failure):
+            if shared:
+                q.put(item)
+            raise item.exc
+        yield item
+
+
+class Resident:
+    """Picklable callable that builds `factory(**kwargs)` once per process and applies its `method`.
+
+    Items are (key, value) pairs; the key is passed through. With `each`, the method is applied to
+    every element of the value and the results are concatenated.
+    """
+
+    __instances = {}
+
+    def __init__(self, factory, method, each=False, **kwargs):
+        self.factory = factory
+        self.method = method
+        self.each = each
+        self.kwargs = kwargs
+        self.token = uuid.uuid4().hex
+
+    def instance(self):
+        if self.token not in Resident.__instances:
+            Resident.__instances[self.token] = self.factory(**self.kwargs)
+        return Resident.__instances[self.token]
+
+    def __call__(self, item):
+        key, value = item
+        fn = getattr(self.instance(), self.method)
+        if self.each:
+            return key, [result for element in value for result in fn(element)]
+        return key, fn(value)
+
+
+class Stage:
+    """One step of a Pipeline.
+
+    A "generator" stage gets the whole input stream (`fn(iterable)` yields outputs); "thread" and
+    "process" stages map `fn(item)` over the stream with `workers` threads or processes. With
+    `flatten`, each result is an iterable whose elements are emitted separately; None results are dropped.
+    `max_tasks` recycles process workers after that many tasks, which bounds per-worker caches.
+    """
+
+    GENERATOR = "generator"
+    THREAD = "thread"
+    PROCESS = "process"
+
+    def __init__(self, fn, mode=GENERATOR, workers=1, flatten=False, chunksize=1, max_tasks=None, name=None):
+        assert mode in {Stage.GENERATOR, Stage.THREAD, Stage.PROCESS}, "The parameter 'mode' must be in {'generator', 'thread', 'process'}"
+        self.fn = fn
+        self.mode = mode
+        self.workers = workers
+        self.flatten = flatten
+        self.chunksize = chunksize
+        self.max_tasks = max_tasks
+        self.name = name if name is not None else getattr(fn, "__qualname__", fn.__class__.__name__)
+
+    def __emit(self, result, outq):
+        if result is None:
+            return
+        if self.flatten:
+            for element in result:
+                outq.put(element)
+        else:
+            outq.put(result)
+
+    def run(self, inq, outq):
+        try:
+            if self.mode == Stage.GENERATOR:
+                for result in self.fn(_drain(inq)):
+                    outq.put(result)
+                outq.put(_END)
+            elif self.mode == Stage.THREAD:
+                self.__run_threads(inq, outq)
+            else:
+                self.__run_processes(inq, outq)
+        except Exception as e:
+            outq.put(_Failure(e))
+
+    def __run_threads(self, inq, outq):
+        remaining = [self.workers]
+        lock = threading.Lock()
+
+        def work():
+            try:
+                for item in _drain(inq, shared=True):
+                    self.__emit(self.fn(item), outq)
+            except Exception as e:
+                outq.put(_Failure(e))
+                return
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    outq.put(_END)
+
+        for _ in range(self.workers):
+            threading.Thread(target=work, name=self.name, daemon=True).start()
+
+    def __run_processes(self, inq, outq):
+        # at most `slots` items are in flight, so a slow consumer holds back the workers
+        slots = threading.Semaphore(self.workers * self.chunksize * 2)
+
+        def feed():
+            for item in _drain(inq):
+                slots.acquire()
+                yield item
+
+        with multiprocessing.Pool(self.workers, maxtasksperchild=self.max_tasks) as pool:
+            for result in pool.imap(self.fn, feed(), self.chunksize):
+                slots.release()
+                self.__emit(result, outq)
+        outq.put(_END)
+
+
+def parse_shard(shard):
+    """'i/N' or (i, N) -> (i, N)."""
+    index, count = (int(x) for x in shard.split("/")) if isinstance(shard, str) else shard
+    assert 0 <= index < count, "The shard must be 'i/N' with 0 <= i < N"
+    return index, count
+
+
+def shard_of(url, count):
+    # a stable hash (unlike hash(), which is salted per process), so every machine agrees on the partition
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big") % count
+
+
+class RecentSet:
+    """Fingerprints of the `capacity` most recently added texts; `add` returns False for one among them.
+
+    A bounded seen-set: texts repeated across many documents (boilerplate) stay in it, one-off texts
+    age out.
+    """
+
+    def __init__(self, capacity=200000):
+        self.capacity = capacity
+        self.keys = OrderedDict()
+
+    def add(self, text):
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+        if key in self.keys:
+            self.keys.move_to_end(key)
+            return False
+        self.keys[key] = None
+        if len(self.keys) > self.capacity:
+            self.keys.popitem(last=False)
+        return True
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class DocsFile:
+    """Re-iterable (url, sentence texts) pairs of a `docs.jsonl` written by Pipeline.process."""
+
+    def __init__(self, file_name):
+        self.file_name = Path(file_name)
+
+    def __iter__(self):
+        with self.file_name.open("r", encoding="utf-8") as f:
+            for line in f:
+                doc = json.loads(line)
+                yield doc["url"], doc["sentences"]
+
+
+class SentencesFile:
+    """Re-iterable (text, urls) pairs of a `sentences.jsonl` written by Pipeline.merge."""
+
+    def __init__(self, file_name):
+        self.file_name = Path(file_name)
+
+    def __iter__(self):
+        with self.file_name.open("r", encoding="utf-8") as f:
+            for line in f:
+                sent = json.loads(line)
+                yield sent["text"], set(sent["docs"])
+
+
+def _records(file_name):
+    with Path(file_name).open("r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
 
 
 class Pipeline:
-    def __init__(self, vocab=Vocab(), conf=None):
+    def __init__(self, vocab=Vocab(), conf=None, stages=None, queue_size=256):
         self.vocab = vocab
         self.conf = {} if conf is None else conf
+        self.stages = [] if stages is None else list(stages)
+        self.queue_size = queue_size
+        # blocks, bytes and sentences the default parse stage stripped as boilerplate in the last run
+        self.removed = Counter()
+
+    def add(self, stage):
+        self.stages.append(stage)
+        return self
+
+    def stream(self, source, stages=None):
+        """Run `source` through the stages with bounded queues in between and yield the outputs."""
+        stages = self.stages if stages is None else stages
+        queues = [queue.Queue(self.queue_size) for _ in range(len(stages) + 1)]
+
+        def feed():
+            try:
+                for item in source:
+                    queues[0].put(item)
+                queues[0].put(_END)
+            except Exception as e:
+                queues[0].put(_Failure(e))
+
+        threading.Thread(target=feed, name="source", daemon=True).start()
+        for stage, inq, outq in zip(stages, queues[:-1], queues[1:]):
+            threading.Thread(target=stage.run, args=(inq, outq), name=stage.name, daemon=True).start()
+        yield from _drain(queues[-1])
+
+    def default_stages(self, parser=None):
+        from kgtools.htmlparser import HTMLParser
+        from kgtools.nlp.tokenizer import CompoundTokenizer
+
+        workers = self.conf.get("workers", max(multiprocessing.cpu_count() - 1, 1))
+        parser = self.conf.get("parser", {}) if parser is None else parser
+        stages = [
+            # the workers' boilerplate counts travel with the texts and are added up in this process
+            Stage(Resident(HTMLParser, "_parse", **parser), Stage.PROCESS, workers, name="parse"),
+            Stage(self.__tally, Stage.GENERATOR, name="removed"),
+            Stage(Resident(CompoundTokenizer, "tokenize", each=True, **self.conf.get("tokenizer", {})), Stage.PROCESS, workers, name="tokenize"),
+        ]
+        if "near_duplicates" in self.conf:
+            from kgtools.dedup import NearDuplicateDetector
+            # one index over the whole stream, so it runs in this process after the tokenize workers
+            detector = NearDuplicateDetector(**self.conf["near_duplicates"])
+            stages.append(Stage(detector.stage, Stage.GENERATOR, name="near_duplicates"))
+        return stages
+
+    def __tally(self, items):
+        for url, (texts, removed) in items:
+            self.removed += removed
+            yield url, texts
+
+    def prepare(self, items):
+        """The stages for `items`, and `items` again.
+
+        With conf["parser"]["boilerplate"] (True or an unlearned Boilerplate), the boilerplate is learned
+        from the first `sample` pages of the stream before the default parse stage starts, and handed to
+        every parse worker; those pages are put back in front of the stream.
+        """
+        from kgtools.boilerplate import Boilerplate
+        from kgtools.htmlparser import HTMLParser
+
+        self.removed = Counter()
+        if len(self.stages) > 0:
+            return self.stages, items
+        parser = dict(self.conf.get("parser", {}))
+        boilerplate = Boilerplate() if parser.get("boilerplate") is True else parser.get("boilerplate")
+        if isinstance(boilerplate, Boilerplate) and not boilerplate.learned:
+            items = iter(items)
+            head = list(islice(items, boilerplate.sample))
+            parser["boilerplate"] = HTMLParser(**{**parser, "boilerplate": boilerplate}).learn_boilerplate(html for _, html in head)
+            items = chain(head, items)
+        return self.default_stages(parser), items
+
+    def __report(self):
+        if self.removed["pages"] > 0:
+            logger.info("@Pipeline[boilerplate]: removed %d blocks, %d bytes and ~%d sentences from %d pages.",
+                        self.removed["blocks"], self.removed["bytes"], self.removed["sentences"], self.removed["pages"])
+
+    @TimeLog
+    def process(self, data, workdir="pipeline", shard=None, train=True):
+        """Parse, tokenize and train on (url, html) pairs without keeping the corpus in memory.
+
+        `data` is a dict or any stream of (url, html) pairs, e.g. `Spider.pages()` to crawl, parse and
+        tokenize at once. Tokenized sentences are streamed into a ShardedCorpus under `workdir`, and a
+        `docs.jsonl` records the sentence texts of every url. A sentence repeated across pages (e.g.
+        boilerplate) is written to the corpus once: the texts seen last are kept in a bounded
+        RecentSet of `conf["dedupe_size"]` fingerprints (0 turns it off). With
+        `conf["near_duplicates"]` (NearDuplicateDetector arguments), near-duplicates are replaced by
+        their representative after tokenization too, in the corpus and in `docs.jsonl`.
+
+        Word2Vec needs the whole vocabulary before its first pass and several passes over the corpus,
+        so it does not train on the stream itself: it is trained on the written shards, read back from
+        disk, once the stream ends. The vocabulary counts and embedding are saved as `vocab.bin`.
 
-    def process(self, data):
+        With `shard` ('i/N'), only the urls that hash into shard i of N are processed, so N runs on
+        N machines cover the input exactly once; `merge` combines their workdirs.
 
-        @TimeLog
-        def clean():
-            return parallel(BaseCleaner(**(self.conf.get("cleaner", {}))).clean, list(data.items()))
-        rawdocs = clean()
+        Returns (docs, sentences) like before, but streamed from `workdir` instead of held in memory:
+        a DocsFile of (url, texts) and the ShardedCorpus of the unique tokenized sentences. The
+        vocabulary is `self.vocab`.
+        """
+        from kgtools.w2v import Word2Vec, ShardedCorpus
 
-        @TimeLog
-        def tokenize():
-            return Tokenizer(**(self.conf.get("tokenizer", {}))).tokenize(rawdocs)
-        docs, sentences, vocab = tokenize()
-        print(len(sentences))
+        items = data.items() if isinstance(data, dict) else data
+        if shard is not None:
+            index, count = parse_shard(shard)
+            items = ((url, html) for url, html in items if shard_of(url, count) == index)
+        Path(workdir).mkdir(parents=True, exist_ok=True)
+        # only the sentences written to the corpus are counted: tokens built in this process (by thread and
+        # generator stages) also count themselves into the shared Vocab, which may hold earlier counts too
+        token_counts, lemma_counts = self.vocab.new_counter(), self.vocab.new_counter()
+        dedupe_size = self.conf.get("dedupe_size", 200000)
+        seen = RecentSet(dedupe_size) if dedupe_size else None
+        stats = Counter()
+        stages, items = self.prepare(items)
+        # a shard also records the tokens of its sentences, which `merge` needs to count them across shards
+        records = (Path(workdir) / "sentences.jsonl").open("w", encoding="utf-8") if shard is not None else None
+        with (Path(workdir) / "docs.jsonl").open("w", encoding="utf-8") as docs:
+            def sentences():
+                for url, sents in self.stream(items, stages):
+                    docs.write(json.dumps({"url": url, "sentences": [sent.text for sent in sents]}) + "\n")
+                    stats["docs"] += 1
+                    for sent in sents:
+                        stats["sentences"] += 1
+                        if seen is not None and not seen.add(sent.text):
+                            continue
+                        token_counts.count([token.text for token in sent.tokens])
+                        lemma_counts.count([token.lemma for token in sent.tokens if token.lemma is not None])
+                        if records is not None:
+                            records.write(json.dumps({"text": sent.text, "tokens": [token.text for token in sent.tokens],
+                                                      "lemmas": [token.lemma for token in sent.tokens]}) + "\n")
+                        stats["unique"] += 1
+                        yield sent
+            try:
+                corpus = ShardedCorpus.write(sentences(), Path(workdir) / "corpus", self.conf.get("shard_size", 100000))
+            finally:
+                if records is not None:
+                    records.close()
+        self.vocab.token_counts, self.vocab.lemma_counts = token_counts, lemma_counts
+        logger.info("@Pipeline.process[shard=%s, docs=%d, sentences=%d, written=%d]", shard, stats["docs"], stats["sentences"], stats["unique"])
+        self.__report()
 
-        @TimeLog
-        def word2vec():
-            Word2Vec(**(self.conf.get("word2vec", {}))).train(sentences)
-        word2vec()
+        if train:
+            # the counts of the corpus replace gensim's own vocabulary scan
+            Word2Vec(self.vocab, **{"from_counts": True, **self.conf.get("word2vec", {})}).train(corpus)
+        self.__dump_vocab(Path(workdir) / "vocab.bin")
+        if shard is not None:
+            Saver.dump({"index": index, "count": count, "docs": stats["docs"]}, Path(workdir) / "shard.json", FileFormat.JSON)
+        return DocsFile(Path(workdir) / "docs.jsonl"), corpus
 
-        return docs, sentences
+    @TimeLog
+    def merge(self, workdirs, workdir="pipeline", embedding="global"):
+        """Combine the workdirs of the N shards of a sharded `process` run into one artifact set in `workdir`.
+
+        Writes the docs of all shards (`docs.jsonl`, in shard order), the deduplicated sentences with the
+        union of their docs (`sentences.jsonl`, sorted by text) and the merged vocabulary (`vocab.bin`).
+        The merge streams: each shard's sentences are sorted into a run file on disk (one shard in memory
+        at a time) and the runs are merged by text, so a sentence found in several shards is written and
+        counted once, as in an unsharded run. `embedding` is "global" (train one Word2Vec on the merged
+        corpus, written under `workdir`), "average" (count-weighted average of the shard embeddings after
+        aligning them) or None. Returns (docs, sentences, vocab): a DocsFile and a SentencesFile of
+        (text, urls) pairs.
+        """
+        from kgtools.w2v import Word2Vec, ShardedCorpus, average_embeddings
+
+        assert embedding in {"global", "average", None}, "The parameter 'embedding' must be in {'global', 'average', None}"
+        shards = sorted(((Saver.load(Path(d) / "shard.json", FileFormat.JSON), Path(d)) for d in workdirs), key=lambda x: x[0]["index"])
+        count = shards[0][0]["count"]
+        assert [meta["index"] for meta, _ in shards] == list(range(count)) and all(meta["count"] == count for meta, _ in shards), \
+            f"The workdirs must hold shards 0..{count - 1} of one run exactly once"
+        assert all((d / "sentences.jsonl").exists() for _, d in shards), "The shards must be processed with their sentence records (sentences.jsonl)"
+
+        Path(workdir).mkdir(parents=True, exist_ok=True)
+        stats = Counter()
+        # the urls of different shards are disjoint: their docs are concatenated
+        with (Path(workdir) / "docs.jsonl").open("w", encoding="utf-8") as f:
+            for _, d in shards:
+                for url, texts in DocsFile(d / "docs.jsonl"):
+                    f.write(json.dumps({"url": url, "sentences": texts}) + "\n")
+                    stats["docs"] += 1
+
+        token_counts, lemma_counts = self.vocab.new_counter(), self.vocab.new_counter()
+        with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+            runs = []
+            for i, (_, d) in enumerate(shards):
+                urls = {}
+                for url, texts in DocsFile(d / "docs.jsonl"):
+                    for text in texts:
+                        urls.setdefault(text, set()).add(url)
+                runs.append(Path(tmp) / f"{i}.jsonl")
+                with runs[-1].open("w", encoding="utf-8") as f:
+                    for record in sorted(_records(d / "sentences.jsonl"), key=lambda record: record["text"]):
+                        f.write(json.dumps({**record, "docs": sorted(urls.get(record["text"], ()))}) + "\n")
+
+            def merged():
+                with (Path(workdir) / "sentences.jsonl").open("w", encoding="utf-8") as f:
+                    for text, group in groupby(heapq.merge(*[_records(run) for run in runs], key=lambda record: record["text"]),
+                                               key=lambda record: record["text"]):
+                        group = list(group)
+                        f.write(json.dumps({"text": text, "docs": sorted(set().union(*[record["docs"] for record in group]))}) + "\n")
+                        tokens, lemmas = group[0]["tokens"], group[0]["lemmas"]
+                        token_counts.count(tokens)
+                        lemma_counts.count([lemma for lemma in lemmas if lemma is not None])
+                        stats["sentences"] += 1
+                        yield [lemma if self.vocab.lemma_first and lemma is not None else token for token, lemma in zip(tokens, lemmas)]
+
+            if embedding == "global":
+                corpus = ShardedCorpus.write(merged(), Path(workdir) / "corpus", self.conf.get("shard_size", 100000))
+            else:
+                for _ in merged():
+                    pass
+        self.vocab.token_counts, self.vocab.lemma_counts = token_counts, lemma_counts
+
+        if embedding == "global":
+            w2v = Word2Vec(self.vocab, **{"from_counts": True, **self.conf.get("word2vec", {})})
+            w2v.train(corpus)
+            w2v.save(Path(workdir) / "w2v.model")
+        elif embedding == "average":
+            key = "lemma_counts" if self.vocab.lemma_first else "token_counts"
+            trained = []
+            for _, d in shards:
+                vocab = Saver.load(d / "vocab.bin")
+                if len(vocab["embedding"]) > 0:
+                    trained.append((vocab["embedding"], vocab[key]))
+            assert len(trained) > 0, "The shards have no embeddings, run them with train=True"
+            self.vocab.embedding = average_embeddings([emb for emb, _ in trained], [counts for _, counts in trained])
+        self.__dump_vocab(Path(workdir) / "vocab.bin")
+        logger.info("@Pipeline.merge[shards=%d, docs=%d, sentences=%d, words=%d]", count, stats["docs"], stats["sentences"], len(self.vocab.counts))
+        return DocsFile(Path(workdir) / "docs.jsonl"), SentencesFile(Path(workdir) / "sentences.jsonl"), self.vocab
+
+    def __dump_vocab(self, file_name):
+        Saver.dump({"token_counts": self.vocab.token_counts, "lemma_counts": self.vocab.lemma_counts, "embedding": self.vocab.embedding}, file_name)
+
+    @staticmethod
+    def __count(counters, sent, sign=1):
+        token_counts, lemma_counts = counters
+        tokens = [token.text for token in sent.tokens]
+        lemmas = [token.lemma for token in sent.tokens if token.lemma is not None]
+        if sign > 0:
+            token_counts.count(tokens)
+            lemma_counts.count(lemmas)
+        else:
+            token_counts.subtract(tokens)
+            lemma_counts.subtract(lemmas)
+
+    @TimeLog
+    def update(self, data, workdir="pipeline", train=True):
+        """Bring the artifacts in `workdir` up to date with `data`, reprocessing only changed documents.
+
+        A manifest of content hashes decides which urls were added, changed or removed. Only new
+        contents go through the stages; the outputs of unchanged contents are reused from
+        `outputs/<hash>.bin`. Like `process`, the vocabulary counts every distinct sentence once: a
+        sentence is counted when its first doc appears and retracted when its last doc is gone. The
+        first run trains Word2Vec on the sentences written as a ShardedCorpus under `workdir`, later
+        runs update the model with the new sentences. Returns (docs, sentences, vocab).
+        """
+        from kgtools.manifest import Manifest
+        from kgtools.w2v import Word2Vec, ShardedCorpus
+
+        manifest = Manifest(workdir)
+        data = data if isinstance(data, dict) else dict(data)
+        hashes = {url: Manifest.digest(html) for url, html in data.items()}
+        added, changed, removed = manifest.diff(hashes)
+        logger.info("@Pipeline.update[added=%d, changed=%d, removed=%d, unchanged=%d]", len(added), len(changed), len(removed), len(hashes) - len(added) - len(changed))
+
+        pending = {url: data[url] for url in added | changed if not manifest.has_output(hashes[url])}
+        stages, items = self.prepare(pending.items())
+        for url, sents in self.stream(items, stages):
+            manifest.dump_output(hashes[url], sents)
+        self.__report()
+
+        artifacts = Path(workdir) / "artifacts.bin"
+        docs, sentences = {}, {}
+        counters = (self.vocab.new_counter(), self.vocab.new_counter())
+        if artifacts.exists():
+            state = Saver.load(artifacts)
+            docs, sentences = state[0], state[1]
+            if len(state) == 4:
+                counters = state[2:]
+            else:
+                # artifacts of earlier runs hold one counter, counted per doc: recount the sentences
+                for sent in sentences.values():
+                    Pipeline.__count(counters, sent)
+
+        # a sentence left without docs may come back with a changed doc, so it is only dropped at the end
+        orphans = set()
+        for url in removed | changed:
+            for text in set(docs.pop(url, [])):
+                sentences[text].docs.discard(url)
+                if len(sentences[text].docs) == 0:
+                    orphans.add(text)
+
+        new_sents = []
+        for url in [url for url in data if url in added or url in changed]:
+            sents = manifest.load_output(hashes[url])
+            docs[url] = [sent.text for sent in sents]
+            for sent in sents:
+                if sent.text in sentences:
+                    sentences[sent.text].docs.add(url)
+                else:
+                    sent.docs = {url}
+                    sentences[sent.text] = sent
+                    new_sents.append(sent)
+                    Pipeline.__count(counters, sent)
+        for text in orphans:
+            if len(sentences[text].docs) == 0:
+                Pipeline.__count(counters, sentences.pop(text), -1)
+        self.vocab.token_counts, self.vocab.lemma_counts = counters
+
+        if train:
+            model = Path(workdir) / "w2v.model"
+            if model.exists():
+                w2v = Word2Vec(self.vocab, **self.conf.get("word2vec", {}))
+                w2v.load(model)
+                if len(new_sents) > 0:
+                    w2v.update(new_sents)
+            else:
+                corpus = ShardedCorpus.write(sentences.values(), Path(workdir) / "corpus", self.conf.get("shard_size", 100000))
+                w2v = Word2Vec(self.vocab, **{"from_counts": True, **self.conf.get("word2vec", {})})
+                w2v.train(corpus)
+            w2v.save(model)
+
+        Saver.dump((docs, sentences) + tuple(counters), artifacts)
+        manifest.save(hashes)
+        return docs, set(sentences.values()), self.vocab
 
 
 if __name__ == "__main__":
+    import subprocess
+    import sys
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("data", nargs="?", default="testdata/guide.bin", help="dill file of {url: html}")
+    arg_parser.add_argument("--workdir", default="testdata/pipeline")
+    arg_parser.add_argument("--shard", default=None, help="process shard i/N only")
+    arg_parser.add_argument("--no-train", action="store_true")
+    arg_parser.add_argument("--merge", nargs="+", default=None, help="merge the workdirs of all shards into --workdir")
+    arg_parser.add_argument("--embedding", default="global", choices=["global", "average", "none"])
+    arg_parser.add_argument("--local", type=int, default=None, help="run N shards as separate processes, then merge")
+    args = arg_parser.parse_args()
+
     conf = {
-        "cleaner": {
-            "rules": [{"type": "root_node", "attr": "class", "value": "devsite-article-body"}]
-        }
+        "parser": {},
+        "word2vec": {"workers": 4}
     }
     pipeline = Pipeline(conf=conf)
-    data = Saver.load("testdata/guide.bin")
-    docs, sentences, vocab = pipeline.process(data)
-
-    Saver.dump(docs, "testdata/docs.bin")
-    Saver.dump(sentences, "testdata/sentences.bin")
-
-    with Path("testdata/sentences.txt").open("w", encoding="utf-8") as f:
-        f.write("\n".join([str(sent) for sent in sentences]))
-    with Path("testdata/tokens.txt").open("w", encoding="utf-8") as f:
-        f.write("\n".join([str(sent) + "\n" + sent.tokenized_text + "\n" + sent.lemma_text + "\n" for sent in sentences]))
-    with Path("testdata/vocab.txt").open("w", encoding="utf-8") as f:
-        f.write("\n".join(sorted(vocab.words, key=lambda x: x)))
-    print(vocab.get_emb("-PRON-"))
+    embedding = None if args.embedding == "none" else args.embedding
+    if args.local is not None:
+        workdirs = [str(Path(args.workdir) / f"shard-{i}") for i in range(args.local)]
+        shard_args = [] if embedding == "average" else ["--no-train"]
+        procs = [subprocess.Popen([sys.executable, "-m", "kgtools.preprocessing", args.data, "--workdir", d, "--shard", f"{i}/{args.local}", *shard_args])
+                 for i, d in enumerate(workdirs)]
+        assert all(proc.wait() == 0 for proc in procs), "A shard failed"
+        pipeline.merge(workdirs, Path(args.workdir) / "merged", embedding)
+    elif args.merge is not None:
+        pipeline.merge(args.merge, args.workdir, embedding)
+    else:
+        pipeline.process(Saver.load(args.data), args.workdir, args.shard, not args.no_train)
+        with (Path(args.workdir) / "vocab.txt").open("w", encoding="utf-8") as f:
+            f.write("\n".join(sorted(pipeline.vocab.words, key=lambda x: x)))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from functools import wraps
+from pathlib import Path
+
+
+class _DefaultHandler(logging.StreamHandler):
+    """Prints the kgtools messages to stdout (as they were before they were logged) until the application configures logging."""
+
+    def __init__(self):
+        super(_DefaultHandler, self).__init__(sys.stdout)
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(self, record):
+        if len(logging.getLogger().handlers) == 0:
+            self.stream = sys.stdout
+            super(_DefaultHandler, self).emit(record)
+
+
+logger = logging.getLogger("kgtools")
+if len(logger.handlers) == 0:
+    logger.addHandler(_DefaultHandler())
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, profiler, name, profile):
+        self.profiler = profiler
+        self.name = name
+        self.profile = profile
+        self.child_peak = 0
+
+    def __enter__(self):
+        stack = self.profiler.stack()
+        self.depth = len(stack)
+        if self.profiler.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if len(stack) > 0:
+                # resetting the peak below would lose the parent's peak so far
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            self.memory_start = current
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.cprofile = None
+        if self.profile or self.name in self.profiler.profile_names:
+            self.cprofile = cProfile.Profile()
+            try:
+                self.cprofile.enable()
+            except ValueError:
+                # another span is already being profiled
+                self.cprofile = None
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.profiler.save_profile(self.name, self.cprofile)
+        peak = 0
+        if self.profiler.memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak) - self.memory_start
+        stack = self.profiler.stack()
+        stack.pop()
+        if len(stack) > 0 and self.profiler.memory:
+            stack[-1].child_peak = max(stack[-1].child_peak, self.memory_start + peak)
+        self.profiler.record(self.name, self.wall_start, wall, cpu, peak, self.depth)
+        return False
+
+
+class Profiler:
+    """Process-wide hierarchical profiler.
+
+    `span(name)` times a block (wall and CPU, plus peak traced memory when enabled with `memory`)
+    and aggregates the results per name. Spans nest per thread. Spans listed in `profile_names`,
+    or opened with `profile=True`, are also captured with cProfile. When disabled, `span` returns a
+    shared no-op context manager.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.profile_names = set()
+        self.profile_dir = None
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.reset()
+
+    def enable(self, memory=False, profile_names=(), profile_dir=None):
+        self.enabled = True
+        self.memory = memory
+        self.profile_names = set(profile_names)
+        self.profile_dir = profile_dir
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.memory = False
+
+    def reset(self):
+        with self.__lock:
+            self.stats = {}
+            self.events = []
+            self.profiles = {}
+
+    def stack(self):
+        if not hasattr(self.__local, "stack"):
+            self.__local.stack = []
+        return self.__local.stack
+
+    def span(self, name, profile=False):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, profile)
+
+    def record(self, name, start, wall, cpu, peak, depth):
+        with self.__lock:
+            stat = self.stats.setdefault(name, {"calls": 0, "wall": 0., "cpu": 0., "peak": 0})
+            stat["calls"] += 1
+            stat["wall"] += wall
+            stat["cpu"] += cpu
+            stat["peak"] = max(stat["peak"], peak)
+            self.events.append({"name": name, "ph": "X", "ts": start * 1e6, "dur": wall * 1e6, "pid": os.getpid(),
+                                "tid": threading.get_ident(), "args": {"cpu": cpu, "peak": peak, "depth": depth}})
+
+    def save_profile(self, name, cprofile):
+        if self.profile_dir is not None:
+            Path(self.profile_dir).mkdir(parents=True, exist_ok=True)
+            cprofile.dump_stats(str(Path(self.profile_dir) / f"{name}.{os.getpid()}.prof"))
+        else:
+            with self.__lock:
+                self.profiles[name] = cprofile
+
+    def snapshot(self):
+        with self.__lock:
+            return {"stats": {name: dict(stat) for name, stat in self.stats.items()}, "events": list(self.events)}
+
+    def merge(self, snapshot):
+        """Fold a snapshot taken in another process (e.g. a Parallel worker) into this profiler."""
+        with self.__lock:
+            for name, other in snapshot["stats"].items():
+                stat = self.stats.setdefault(name, {"calls": 0, "wall": 0., "cpu": 0., "peak": 0})
+                stat["calls"] += other["calls"]
+                stat["wall"] += other["wall"]
+                stat["cpu"] += other["cpu"]
+                stat["peak"] = max(stat["peak"], other["peak"])
+            self.events.extend(snapshot["events"])
+
+    def report(self):
+        lines = ["%-48s %8s %12s %12s %12s" % ("span", "calls", "wall(s)", "cpu(s)", "peak(B)")]
+        for name, stat in sorted(self.stats.items(), key=lambda x: -x[1]["wall"]):
+            lines.append("%-48s %8d %12.3f %12.3f %12d" % (name, stat["calls"], stat["wall"], stat["cpu"], stat["peak"]))
+        return "\n".join(lines)
+
+    def export_json(self, file_name):
+        Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+        with Path(file_name).open("w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+    def export_chrome_trace(self, file_name):
+        Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+        with Path(file_name).open("w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.snapshot()["events"], "displayTimeUnit": "ms"}, f)
+
+
+PROFILER = Profiler()
+
+
+class Profiled:
+    """Picklable wrapper that runs `fn` in a fresh worker-side span and returns (result, snapshot)."""
+
+    def __init__(self, fn, name, memory=False):
+        self.fn = fn
+        self.name = name
+        self.memory = memory
+
+    def __call__(self, *args, **kwargs):
+        if not PROFILER.enabled:
+            PROFILER.enable(self.memory)
+        PROFILER.reset()
+        with PROFILER.span(self.name):
+            result = self.fn(*args, **kwargs)
+        return result, PROFILER.snapshot()
+
+
+def span(name, profile=False):
+    return PROFILER.span(name, profile)
+
+
+def timed(fn=None, name=None):
+    def outer(fn):
+        label = name if name is not None else fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            with _Span(PROFILER, label, False):
+                return fn(*args, **kwargs)
+        return wrapper
+    return outer(fn) if fn is not None else outer
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import inspect
+import queue
+import threading
+import time
+
+
+class Timed:
+    """Picklable wrapper that returns (fn(*args, **kwargs), elapsed seconds measured in the worker)."""
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = self.fn(*args, **kwargs)
+        if inspect.isawaitable(result):
+            return self.__timed(result, start)
+        return result, time.perf_counter() - start
+
+    @staticmethod
+    async def __timed(awaitable, start):
+        result = await awaitable
+        return result, time.perf_counter() - start
+
+
+class AsyncPool:
+    """Pool-like runner of coroutine functions on an event loop in a background thread.
+
+    `apply_async` has the signature of multiprocessing's, and at most `workers` coroutines run at once.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="AsyncPool", daemon=True)
+        self.thread.start()
+        self.semaphore = asyncio.run_coroutine_threadsafe(self.__semaphore(), self.loop).result()
+
+    async def __semaphore(self):
+        return asyncio.Semaphore(self.workers)
+
+    async def __run(self, fn, args, kwds):
+        async with self.semaphore:
+            return await fn(*args, **kwds)
+
+    def apply_async(self, fn, args=(), kwds=None, callback=None, error_callback=None):
+        future = asyncio.run_coroutine_threadsafe(self.__run(fn, args, {} if kwds is None else kwds), self.loop)
+
+        def done(f):
+            if f.exception() is not None:
+                if error_callback is not None:
+                    error_callback(f.exception())
+            elif callback is not None:
+                callback(f.result())
+        future.add_done_callback(done)
+        return future
+
+    def close(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ChunkScheduler:
+    """Cuts `size` items into chunks whose size follows the measured cost per item.
+
+    Chunks are cut on demand, so a chunk handed out late is sized with everything measured so far.
+    Without `hints`, chunks are contiguous ranges in input order. With `hints` (one cost estimate
+    per item, e.g. `len(html)`), items are handed out largest first and chunks are sized in hint
+    units, so one huge item is a chunk on its own while many small ones are grouped. A chunk is
+    never bigger than half of the remaining work per worker, so the tail stays balanced. With a
+    fixed `batch_size`, every chunk has that many items.
+    """
+
+    def __init__(self, size, workers, hints=None, batch_size=None, target=0.2, smoothing=0.5):
+        assert batch_size is None or batch_size > 0, "The parameter 'batch_size' must be positive"
+        self.workers = max(workers, 1)
+        self.batch_size = batch_size
+        self.target = target
+        self.smoothing = smoothing
+        if hints is None:
+            self.order = range(size)
+            self.weights = None
+            self.remaining = float(size)
+        else:
+            assert len(hints) == size, "The parameter 'hints' must have one value per item"
+            self.weights = [max(float(hint), 1.) for hint in hints]
+            self.order = sorted(range(size), key=lambda i: -self.weights[i])
+            self.remaining = sum(self.weights)
+        self.position = 0
+        self.cost = None
+        # probe with small chunks (a single item when hinted) until the first measurement comes back
+        self.initial = 1. if hints is not None else min(self.remaining / (self.workers * 16), 8.)
+
+    def __weight(self, i):
+        return 1. if self.weights is None else self.weights[i]
+
+    def budget(self):
+        """Weight of the next chunk: `target` seconds of work, at most remaining / (2 * workers)."""
+        tail = self.remaining / (2 * self.workers)
+        if self.cost is None:
+            return max(min(self.initial, tail), 1.)
+        return max(min(self.target / max(self.cost, 1e-9), tail), 1.)
+
+    def next(self):
+        if self.position >= len(self.order):
+            return None
+        if self.batch_size is not None:
+            chunk = list(self.order[self.position:self.position + self.batch_size])
+        else:
+            budget, total, end = self.budget(), 0., self.position
+            while end < len(self.order) and (end == self.position or total + self.__weight(self.order[end]) <= budget):
+                total += self.__weight(self.order[end])
+                end += 1
+            chunk = list(self.order[self.position:end])
+        self.position += len(chunk)
+        self.remaining -= sum(self.__weight(i) for i in chunk)
+        return chunk
+
+    def feedback(self, chunk, elapsed):
+        cost = elapsed / sum(self.__weight(i) for i in chunk)
+        self.cost = cost if self.cost is None else self.smoothing * cost + (1 - self.smoothing) * self.cost
+
+
+def schedule(pool, task, data, head=(), tail=(), kwargs=None, workers=1, hints=None, batch_size=None, target=0.2, indexed=False):
+    """Run `task(*head, chunk, *tail, **kwargs)` over chunks of `data` on `pool` and return the results in chunk order.
+
+    With `indexed`, the input positions of the chunk are passed first: `task(positions, *head, chunk, *tail)`.
+
+    Idle workers pull the next chunk from the scheduler: two chunks per worker are kept in flight and
+    a new one is cut (with the latest cost estimate) whenever one completes. `pool` is any pool with
+    `apply_async(fn, args, kwds, callback, error_callback)`. Returns (results, chunks).
+    """
+    kwargs = {} if kwargs is None else kwargs
+    scheduler = ChunkScheduler(len(data), workers, hints, batch_size, target)
+    timed = Timed(task)
+    done = queue.Queue()
+    chunks, results = [], {}
+
+    def submit():
+        chunk = scheduler.next()
+        if chunk is None:
+            return False
+        cid = len(chunks)
+        chunks.append(chunk)
+        args = (*head, [data[i] for i in chunk], *tail)
+        pool.apply_async(timed, (chunk, *args) if indexed else args, kwargs,
+                         callback=lambda rs: done.put((cid, rs, None)),
+                         error_callback=lambda e: done.put((cid, None, e)))
+        return True
+
+    in_flight = sum(1 for _ in range(2 * max(workers, 1)) if submit())
+    while in_flight > 0:
+        cid, rs, error = done.get()
+        in_flight -= 1
+        if error is not None:
+            raise error
+        result, elapsed = rs
+        scheduler.feedback(chunks[cid], elapsed)
+        results[cid] = result
+        in_flight += submit()
+    return [results[cid] for cid in range(len(chunks))], chunks
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# the mappings of this process, kept while something (a task, an embedding) still references them
+_ATTACHED = weakref.WeakValueDictionary()
+
+
+class _Segment(shared_memory.SharedMemory):
+    def __init__(self, name=None, create=False, size=0):
+        super(_Segment, self).__init__(name, create, size)
+        # mmap holds its own descriptor, so the segment's one is not needed
+        if getattr(self, "_fd", -1) >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def close(self):
+        # numpy arrays over `buf` keep the memoryview alive but hold no buffer export, so unmapping here
+        # could leave them dangling; the mapping goes away with the last array or object referencing it
+        self._buf = None
+        self._mmap = None
+
+
+class SharedArray:
+    """A numpy array in a named shared-memory segment.
+
+    It pickles as (name, shape, dtype) only: a worker that unpickles it maps the same memory (once
+    per process while the mapping is in use), so a large input is broadcast without copies and
+    workers can write results in place. The creating side owns the segment and `unlink`s it; arrays
+    already handed out stay valid.
+    """
+
+    def __init__(self, shape, dtype="float32", name=None):
+        self.shape = tuple(int(dim) for dim in np.atleast_1d(shape))
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self.segment = _Segment(name, self.owner, size)
+        self.name = self.segment.name
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.segment.buf)
+
+    @classmethod
+    def from_array(cls, array):
+        array = np.asarray(array)
+        shared = cls(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    def __reduce__(self):
+        return attach, (self.name, self.shape, self.dtype.str)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    def unlink(self):
+        if _ATTACHED.get(self.name) is self:
+            del _ATTACHED[self.name]
+        if self.owner:
+            self.owner = False
+            try:
+                self.segment.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
+        return False
+
+
+def attach(name, shape, dtype):
+    """Map the segment `name` in this process, reusing a mapping of it that is still referenced."""
+    shared = _ATTACHED.get(name)
+    if shared is None:
+        shared = _ATTACHED[name] = SharedArray(shape, dtype, name)
+    return shared
+
+
+def detach(name=None):
+    """Forget the mappings attached in this process (all of them without `name`)."""
+    for key in ([name] if name is not None else list(_ATTACHED.keys())):
+        _ATTACHED.pop(key, None)
+
+
+class RowWriter:
+    """Picklable task wrapper that writes `fn(batch)` (one row per item) into rows of a preallocated output.
+
+    It is called as `(indices, *args)` with the input positions of the batch and returns None, so
+    nothing but the output rows travels back from the worker.
+    """
+
+    def __init__(self, fn, out):
+        self.fn = fn
+        self.out = out
+
+    def __call__(self, indices, *args, **kwargs):
+        rows = self.fn(*args, **kwargs)
+        out = self.out.array if isinstance(self.out, SharedArray) else self.out
+        assert len(rows) == len(indices), "The function must return one row per item"
+        if len(indices) > 0 and np.all(np.diff(indices) == 1):
+            out[indices[0]:indices[-1] + 1] = rows
+        else:
+            out[indices] = rows
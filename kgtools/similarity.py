@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+def normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.
+    return matrix / norms
+
+
+def topk(scores, k, overwrite=False):
+    """Indices and values of the `k` largest scores of every row; with `overwrite`, `scores` is used as scratch space."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((len(scores), 0), dtype=np.int64), np.zeros((len(scores), 0), dtype=scores.dtype)
+    negated = np.negative(scores, out=scores if overwrite else None)
+    indices = np.argpartition(negated, k - 1, axis=1)[:, :k]
+    values = -np.take_along_axis(negated, indices, axis=1)
+    order = np.argsort(-values, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force cosine search. Queries are scored in blocks of `batch_size` rows (by default as many
+    as fit in `memory` bytes: a float32 score and an int64 partition index per row of the matrix).
+    """
+
+    def __init__(self, matrix, batch_size=None, memory=256 << 20):
+        self.matrix = normalize(matrix)
+        self.batch_size = batch_size if batch_size is not None else max(1, memory // (12 * max(len(self.matrix), 1)))
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def search(self, queries, k=10, exclude=None):
+        queries = normalize(np.atleast_2d(queries))
+        indices, values = [], []
+        for beg in range(0, len(queries), self.batch_size):
+            scores = queries[beg:beg + self.batch_size] @ self.matrix.T
+            if exclude is not None:
+                rows = np.arange(len(scores))
+                mask = exclude[beg:beg + self.batch_size] >= 0
+                scores[rows[mask], exclude[beg:beg + self.batch_size][mask]] = -np.inf
+            idx, val = topk(scores, k, overwrite=True)
+            # with k >= len(self) the excluded rows come last: drop them like IVFIndex does
+            idx[np.isneginf(val)] = -1
+            indices.append(idx)
+            values.append(val)
+        if len(indices) == 0:
+            return np.zeros((0, min(k, len(self))), dtype=np.int64), np.zeros((0, min(k, len(self))), dtype=np.float32)
+        return np.concatenate(indices), np.concatenate(values)
+
+
+class IVFIndex:
+    """Inverted-file index: rows are bucketed by spherical k-means and only the
+    `n_probe` closest buckets of a query are scanned.
+    """
+
+    def __init__(self, matrix, n_lists=None, n_probe=8, iterations=10, seed=0, batch_size=1024):
+        self.matrix = normalize(matrix)
+        self.n_lists = max(1, min(len(self.matrix), n_lists if n_lists is not None else int(np.sqrt(len(self.matrix)))))
+        self.n_probe = n_probe
+        self.batch_size = batch_size
+
+        rng = np.random.RandomState(seed)
+        sample = self.matrix[rng.choice(len(self.matrix), min(len(self.matrix), self.n_lists * 64), replace=False)]
+        self.centroids = sample[rng.choice(len(sample), self.n_lists, replace=False)]
+        for _ in range(iterations):
+            assign = self.__assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=self.n_lists) == 0
+            sums[empty] = self.centroids[empty]
+            self.centroids = normalize(sums)
+
+        assign = self.__assign(self.matrix)
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=self.n_lists))])
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def __assign(self, matrix):
+        return np.concatenate([(matrix[beg:beg + self.batch_size] @ self.centroids.T).argmax(axis=1)
+                               for beg in range(0, len(matrix), self.batch_size)] or [np.zeros(0, dtype=np.int64)])
+
+    def search(self, queries, k=10, exclude=None):
+        queries = normalize(np.atleast_2d(queries))
+        probes = topk(queries @ self.centroids.T, self.n_probe)[0]
+        indices = np.full((len(queries), min(k, len(self))), -1, dtype=np.int64)
+        values = np.full((len(queries), min(k, len(self))), -np.inf, dtype=np.float32)
+        for i, (query, probe) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([self.order[self.offsets[p]:self.offsets[p + 1]] for p in probe])
+            if exclude is not None and exclude[i] >= 0:
+                candidates = candidates[candidates != exclude[i]]
+            idx, val = topk((self.matrix[candidates] @ query)[None, :], k)
+            indices[i, :idx.shape[1]] = candidates[idx[0]]
+            values[i, :idx.shape[1]] = val[0]
+        return indices, values
@@ -3,31 +3,65 @@
 
 import asyncio
 import aiohttp
-import async_timeout
+import queue
 import re
+import sys
+import threading
+import zlib
+from pathlib import Path
+from xml.etree import ElementTree
 from bs4 import BeautifulSoup
 
-from kgtools.func import reduce_seqs
 from kgtools.saver import Saver, FileFormat
 from kgtools.annotation import TimeLog
+from kgtools.profiler import logger
+from kgtools.urlset import url_set, frontier, page_store, bytes_per_url
 
 
 class Spider:
+    """Crawls the pages under `upper` (and not under `lower`) into `storage` (url -> body html).
 
-    def __init__(self, root, upper=None, lower=None, proxy_server=None, pool_size=63, retry=3):
+    The frontier is seeded with `root`, explicit url lists (`seed`) and sitemaps, and crawled flat:
+    `pool_size` workers share one connection pool and pull urls from one queue, and the links of a
+    page are queued as soon as it is parsed instead of level by level.
+
+    `state` picks the backend of the seen-url set and of the frontier (see kgtools.urlset): "set"
+    (exact strings), "fingerprint" (8 bytes per url), "bloom" (a few bytes per url, rare false
+    positives skip a page) or "disk" (SQLite and files under `state_dir`, for very large crawls).
+    With "disk", `storage` is an SQLite store of compressed pages too, and a crawl interrupted or
+    rerun with the same `state_dir` resumes where it stopped: the seen urls, the frontier and the
+    fetched pages are all kept. `close` releases the state (and removes it unless under `state_dir`).
+    """
+
+    def __init__(self, root=None, upper=None, lower=None, proxy_server=None, pool_size=63, retry=3, timeout=10, state="set", state_dir=None):
+        assert root is not None or upper is not None, "Either 'root' or 'upper' must be given"
         self.root = root
-        simple_root = re.sub(r'(http://|https://)?(.*)', r'\2', root)
-        self.domain = re.sub(r'(http://|https://)?(.*)', r'\1', root) + simple_root.split("/")[0]
+        simple_root = re.sub(r'(http://|https://)?(.*)', r'\2', root if root is not None else upper)
+        self.domain = re.sub(r'(http://|https://)?(.*)', r'\1', root if root is not None else upper) + simple_root.split("/")[0]
         self.upper = upper if upper is not None else self.domain
         self.lower = lower if lower is not None else "<NO-LOWER>"
 
-        self.storage = {}
-        self.waiting_urls = set() if root is None else {root}
-        self.fialed_urls = set()
+        self.state = state
+        if state_dir is not None:
+            Path(state_dir).mkdir(parents=True, exist_ok=True)
+        self.storage = page_store(state, **self.__state_path(state_dir, "pages.sqlite"))
+        self.seen = url_set(state, **self.__state_path(state_dir, "seen.sqlite"))
+        self.frontier = frontier(state, **self.__state_path(state_dir, "frontier.txt"))
+        self.failed = frontier(state, **self.__state_path(state_dir, "failed.txt"))
+        if root is not None and self.seen.add(root):
+            self.frontier.push(root, 1)
         self.retry = retry
+        self.active = 0
+        self.wake = None
 
         self.proxy_server = proxy_server
-        self.semaphore = asyncio.Semaphore(pool_size)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = None
+        self.sink = None
+
+    def __state_path(self, state_dir, name):
+        return {"path": Path(state_dir) / name} if self.state == "disk" and state_dir is not None else {}
 
     def __is_in_scope(self, url):
         if url.startswith(self.upper) and not url.startswith(self.lower):
@@ -58,29 +92,49 @@ class Spider:
         url = "/".join(parts)
         return url
 
+    def seed(self, urls):
+        """Add the in-scope `urls` (an iterable, or a file with one url per line) to the frontier; returns how many were added."""
+        if isinstance(urls, (str, Path)):
+            with Path(urls).open(encoding="utf-8") as f:
+                urls = [line.strip() for line in f]
+        size = len(self.frontier)
+        for url in urls:
+            if len(url) > 0 and not url.startswith("#"):
+                self.__put(self.__normalize_url(url, url), 1)
+        return len(self.frontier) - size
+
+    def __session(self):
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size),
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout))
+
     async def __request(self, url):
         try:
-            async with self.semaphore:
-                async with aiohttp.ClientSession() as session:
-                    with async_timeout.timeout(10):
-                        async with session.get(url, proxy=self.proxy_server) as response:
-                            return await response.text()
+            if self.session is None:
+                async with self.__session() as session:
+                    async with session.get(url, proxy=self.proxy_server) as response:
+                        return await response.text()
+            async with self.session.get(url, proxy=self.proxy_server) as response:
+                return await response.text()
         except Exception:
             print(f"[Failed] {url}")
-            self.fialed_urls.add(url)
             return None
 
     async def fetch(self, url, recursive=True):
+        """Fetch `url` into `storage` and return its in-scope links (None if the request failed)."""
         links = set()
         if url in self.storage:
             return links
         html = await self.__request(url)
         if html is None:
-            return links
+            return None
         body = BeautifulSoup(html, "lxml").body
         if body is None:
             return links
-        self.storage[url] = str(body)
+        if self.sink is not None:
+            # a blocking consumer holds back this worker only
+            await asyncio.get_running_loop().run_in_executor(None, self.sink, url, str(body))
+        else:
+            self.storage[url] = str(body)
         if recursive:
             for a in body.findAll("a"):
                 link = a.get("href", "")
@@ -91,37 +145,178 @@ class Spider:
         print(f"[Done] {url}")
         return links
 
+    async def __robots(self):
+        try:
+            async with self.session.get(self.domain.rstrip("/") + "/robots.txt", proxy=self.proxy_server) as response:
+                text = await response.text() if response.status == 200 else ""
+        except Exception:
+            text = ""
+        return [line.split(":", 1)[1].strip() for line in text.splitlines() if line.lower().startswith("sitemap:")]
+
+    async def __sitemap(self, url, put, visited):
+        """Stream the sitemap (or sitemap index) `url`, gzipped or not, passing its page urls to `put`."""
+        if url in visited:
+            return
+        visited.add(url)
+        parser = ElementTree.XMLPullParser(events=("end",))
+        inflate, children = None, []
+        try:
+            async with self.session.get(url, proxy=self.proxy_server) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    if inflate is None:
+                        inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == b"\x1f\x8b" else False
+                    parser.feed(inflate.decompress(chunk) if inflate else chunk)
+                    for _, element in parser.read_events():
+                        tag = element.tag.rsplit("}", 1)[-1]
+                        if tag in {"url", "sitemap"}:
+                            loc = next((child.text.strip() for child in element if child.tag.endswith("loc") and child.text), None)
+                            if loc is not None and tag == "sitemap":
+                                children.append(loc)
+                            elif loc is not None:
+                                put(self.__normalize_url(loc, loc))
+                            element.clear()
+        except Exception:
+            print(f"[Failed] {url}")
+            return
+        logger.info("[Sitemap] %s", url)
+        await asyncio.gather(*[self.__sitemap(child, put, visited) for child in children])
+
+    def __put(self, url, depth):
+        if self.__is_in_scope(url) and self.seen.add(url):
+            self.frontier.push(url, depth)
+            if self.wake is not None:
+                self.wake.set()
+
+    async def __work(self, recursive_depth):
+        while True:
+            item = self.frontier.pop()
+            if item is None:
+                if self.active == 0:
+                    return
+                self.wake.clear()
+                await self.wake.wait()
+                continue
+            url, depth = item
+            self.active += 1
+            try:
+                links = await self.fetch(url, recursive=(recursive_depth is None or depth < recursive_depth))
+                if links is None:
+                    self.failed.push(url, depth)
+                else:
+                    for link in links:
+                        self.__put(link, depth + 1)
+            finally:
+                self.active -= 1
+                self.wake.set()
+
+    async def __discover(self, sitemaps):
+        # counted as active by __crawl before the workers start, so they wait for its urls
+        try:
+            if sitemaps == "robots":
+                sitemaps = await self.__robots() or [self.domain.rstrip("/") + "/sitemap.xml"]
+            await asyncio.gather(*[self.__sitemap(url, lambda link: self.__put(link, 1), set()) for url in sitemaps])
+        finally:
+            self.active -= 1
+            self.wake.set()
+
+    async def __crawl(self, recursive_depth, sitemaps):
+        async with self.__session() as session:
+            self.session, self.wake = session, asyncio.Event()
+            try:
+                tasks = []
+                if sitemaps is not None:
+                    self.active += 1
+                    tasks.append(self.__discover(sitemaps))
+                tasks.extend(self.__work(recursive_depth) for _ in range(self.pool_size))
+                await asyncio.gather(*tasks)
+            finally:
+                self.session, self.wake = None, None
+
     @TimeLog
-    def start_crawl(self, recursive_depth=None):
-        current_depth = 1
-        while (recursive_depth is None or current_depth <= recursive_depth) or len(self.waiting_urls) > 0:
-            loop = asyncio.get_event_loop()
-            tasks = [self.fetch(url, recursive=(current_depth != recursive_depth)) for url in self.waiting_urls]
-            resutls = loop.run_until_complete(asyncio.gather(*tasks))
-            self.waiting_urls = {url for url in reduce_seqs(resutls) if url not in self.storage and url not in self.fialed_urls}
-            current_depth += 1
-        for _ in range(self.retry):
-            if len(self.fialed_urls) == 0:
-                break
-            loop = asyncio.get_event_loop()
-            tasks = [self.fetch(url, recursive=False) for url in self.fialed_urls]
-            self.fialed_urls = set()
-            loop.run_until_complete(asyncio.gather(*tasks))
-
-        if len(self.fialed_urls) > 0:
+    def start_crawl(self, recursive_depth=None, sitemaps=None):
+        """Crawl the frontier, following links down to `recursive_depth` (unlimited with None; 1 fetches the seeds only).
+
+        `sitemaps` adds the pages listed in sitemaps to the frontier while the crawl runs: a list of
+        sitemap (or sitemap index) urls, or "robots" for the ones named in robots.txt (or /sitemap.xml).
+        Failed pages are retried `retry` times at their depth.
+        """
+        assert sitemaps is None or sitemaps == "robots" or not isinstance(sitemaps, str), "The parameter 'sitemaps' must be a list of urls or 'robots'"
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.__crawl(recursive_depth, sitemaps))
+            for _ in range(self.retry):
+                if len(self.failed) == 0:
+                    break
+                item = self.failed.pop()
+                while item is not None:
+                    self.frontier.push(*item)
+                    item = self.failed.pop()
+                loop.run_until_complete(self.__crawl(recursive_depth, None))
+        finally:
+            loop.close()
+
+        logger.info("[State] %d urls seen, %.1f bytes/url (%s)", len(self.seen), bytes_per_url(self.seen), self.state)
+        if len(self.failed) > 0:
             print("#### Failed Urls ####")
-            for url in self.fialed_urls:
+            for url, _ in self.failed:
                 print(url)
 
+    def pages(self, recursive_depth=None, sitemaps=None, queue_size=256):
+        """Crawl (see `start_crawl`) in a background thread and yield (url, body html) as pages are fetched.
+
+        This makes the Spider the source of a Pipeline: `pipeline.process(spider.pages(sitemaps="robots"))`.
+        The pages are not kept in `storage`, and the workers wait while `queue_size` pages are pending.
+        """
+        pages, done, errors = queue.Queue(queue_size), object(), []
+
+        def crawl():
+            try:
+                self.start_crawl(recursive_depth, sitemaps)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                self.sink = None
+                pages.put(done)
+
+        self.sink = lambda url, body: pages.put((url, body))
+        threading.Thread(target=crawl, name="Spider", daemon=True).start()
+        page = pages.get()
+        while page is not done:
+            yield page
+            page = pages.get()
+        if len(errors) > 0:
+            raise errors[0]
+
+    def memory(self):
+        """Size of the url state and of the stored pages: urls, bytes in memory and on disk, and bytes per url of each part."""
+        sizes = {name: {"urls": len(urls), "nbytes": urls.nbytes, "disk_bytes": urls.disk_bytes, "bytes_per_url": bytes_per_url(urls)}
+                 for name, urls in (("seen", self.seen), ("frontier", self.frontier), ("failed", self.failed))}
+        if isinstance(self.storage, dict):
+            nbytes = sys.getsizeof(self.storage) + sum(sys.getsizeof(url) + sys.getsizeof(body) for url, body in self.storage.items())
+            sizes["storage"] = {"urls": len(self.storage), "nbytes": nbytes, "disk_bytes": 0}
+        else:
+            sizes["storage"] = {"urls": len(self.storage), "nbytes": self.storage.nbytes, "disk_bytes": self.storage.disk_bytes}
+        sizes["storage"]["bytes_per_url"] = (sizes["storage"]["nbytes"] + sizes["storage"]["disk_bytes"]) / max(len(self.storage), 1)
+        return sizes
+
     def load_storage(self, file_name, file_format=FileFormat.JSON):
-        self.storage = Saver.load(file_name, file_format)
+        for url, body in Saver.load(file_name, file_format).items():
+            self.storage[url] = body
+            self.seen.add(url)
 
     def dump_storage(self, file_name, file_format=FileFormat.JSON):
-        Saver.dump(self.storage, file_name, file_format)
+        # a disk store is read back into memory for the dump
+        Saver.dump(self.storage if isinstance(self.storage, dict) else dict(self.storage.items()), file_name, file_format)
+
+    def close(self):
+        for state in (self.storage, self.seen, self.frontier, self.failed):
+            if hasattr(state, "close"):
+                state.close()
 
 
 if __name__ == '__main__':
     spider = Spider("https://docs.oracle.com/javase/8/docs/api/allclasses-noframe.html")
     # start = time.time()
     spider.start_crawl(recursive_depth=2)
-    spider.dump_storage("data/jdk8/all-class.html.json")
\ No newline at end of file
+    spider.dump_storage("data/jdk8/all-class.html.json")
@@ -1,12 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from nltk.tokenize import sent_tokenize as st, word_tokenize as wt
 import re
-import spacy
-from type import Vocab, Doc, Sentence, Token
-
+from kgtools.type import Vocab, Sentence, Token
+from kgtools.nlp.code import CodeDetector
+# NLTK and spaCy are imported on first use
+from kgtools.nlp.tokenizer import nltk_st as st, nltk_wt as wt
+from kgtools.nlp.models import load_spacy
 
+# the legacy hyphen rule, without the id/ID/Id exceptions of kgtools.nlp.models.HYPHEN_PATTERN
+HYPHEN_PATTERN = r"[A-Za-z\d]+-[A-Za-z\d]+|'[a-z]+|''"
 
 
 class Tokenizer:
@@ -22,22 +25,10 @@ class Tokenizer:
 
     def __init__(self, vocab=Vocab(), code_patterns=None):
         self.vocab = vocab
-        self.patterns = [
-            re.compile(r'([a-zA-Z_][a-zA-Z\d_]*)(\.\1)+'),
-            re.compile(r'[a-zA-Z_]([a-z][A-Z])'),
-            re.compile(r'[a-zA-Z_][a-zA-Z\d_]*\([a-zA-Z\d_]*\)(\.[a-zA-Z_][a-zA-Z\d_]*\([a-zA-Z\d_]*\))'),
-            re.compile(r'')
-        ]
-        code_patterns = code_patterns if code_patterns is not None else []
-        self.patterns.extend(code_patterns)
-        
-        self.nlp = spacy.load('en')
-        hyphen_re = re.compile(r"[A-Za-z\d]+-[A-Za-z\d]+|'[a-z]+|''")
-        prefix_re = spacy.util.compile_prefix_regex(self.nlp.Defaults.prefixes)
-        infix_re = spacy.util.compile_infix_regex(self.nlp.Defaults.infixes)
-        suffix_re = spacy.util.compile_suffix_regex(self.nlp.Defaults.suffixes)
-        self.nlp.tokenizer = spacy.tokenizer.Tokenizer(self.nlp.vocab, prefix_search=prefix_re.search, infix_finditer=infix_re.finditer,
-                               suffix_search=suffix_re.search, token_match=hyphen_re.match)
+        self.detector = CodeDetector(code_patterns)
+
+        # the full pipeline with the legacy tokenizer rules, shared with every tokenizer of this config
+        self.nlp = load_spacy("en", disable=(), token_match=HYPHEN_PATTERN)
 
     def sent_tokenize(self, text):
         text = text.translate(Tokenizer.PUNC_TABLE)
@@ -127,25 +118,24 @@ class Tokenizer:
         return tokens
 
     def tokenize(self, rawdocs):
-        docs = set()
+        """Returns the (url, sentence texts) pairs of the docs, their distinct sentences (`docs` holds the urls) and the vocab."""
+        docs = []
         sent2sent = {}
         for rawdoc in rawdocs:
             sents = []
             for text in rawdoc:
                 sents.extend(self.sent_tokenize(text))
             if len(sents) > 0:
-                docs.add(Doc(rawdoc.url, sents))
+                docs.append((rawdoc.url, [sent.text for sent in sents]))
                 for sent in sents:
-                    if sent in sent2sent:
-                        new_sent = sent + sent2sent.pop(sent)
-                        sent2sent[new_sent] = new_sent
-                    else:
-                        sent2sent[sent] = sent
+                    sent2sent.setdefault(sent, sent)
+                    sent = sent2sent[sent]
+                    sent.docs = set() if sent.docs is None else sent.docs
+                    sent.docs.add(rawdoc.url)
         sentences = set(sent2sent.values())
         for sent in sentences:
             tokens = self.word_tokenize_nltk(sent.text)
             sent.tokens = self.word_tokenize_spacy(" ".join(tokens))
-            sent.docs = {doc.url for doc in sent.docs}
         return docs, sentences, self.vocab
 
     # def __handle_sent(self, rawdocs):
@@ -196,13 +186,13 @@ class Tokenizer:
     def find_code(self, sentence):
         '''find code elements
 
-        [description]
-
-        Arguments:
-            sentence {[type]} -- [description]
+        Returns the (kind, char_start, char_end) code elements of a sentence; a `Sentence` also
+        gets them attached as `codes`.
         '''
-        for pattern in self.patterns:
-            pass
+        elements = self.detector.find(str(sentence))
+        if isinstance(sentence, Sentence):
+            sentence.add_codes(*elements)
+        return elements
 
 
 if __name__ == "__main__":
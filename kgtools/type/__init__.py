@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from kgtools.type.counter import FrequencyCounter, SpaceSaving
+from kgtools.type.embedding import Embedding
 from kgtools.type.vocab import Vocab
+from kgtools.type.span import Span, CodeSpan
 from kgtools.type.token import Token
-from kgtools.type.sentence import Sentence
+from kgtools.type.sentence import Sentence, SentenceTable
+from kgtools.type.corpus import Corpus
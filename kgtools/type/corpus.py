@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from kgtools.similarity import ExactIndex
+from kgtools.type.vocab import Vocab
+
+
+class Corpus:
+    """Sentence collection with one embedding matrix aligned with sentence ids.
+
+    Sentence vectors are (weighted) means of the token vectors in `vocab`, computed in
+    chunks with segment sums over flat token-id arrays. `weighting` is None, "sif" or "tfidf".
+    """
+
+    WEIGHTINGS = (None, "sif", "tfidf")
+
+    def __init__(self, sentences, vocab=None, weighting=None, sif_a=1e-3, remove_pc=True, chunk_size=100000):
+        assert weighting in Corpus.WEIGHTINGS, f"The parameter 'weighting' must be in {Corpus.WEIGHTINGS}"
+        self.sentences = list(sentences)
+        self.sentence2id = {sent: i for i, sent in enumerate(self.sentences)}
+        if vocab is None:
+            # the tokens' vocab; a corpus without tokens has no word to embed
+            vocab = next((token.vocab for sent in self.sentences for token in sent), None)
+            if vocab is None:
+                vocab = Vocab.new_instance()
+        self.vocab = vocab
+        self.weighting = weighting
+        self.sif_a = sif_a
+        self.remove_pc = remove_pc and weighting == "sif"
+        self.chunk_size = chunk_size
+
+        self.word2id = {}
+        token_ids = []
+        lengths = np.zeros(len(self.sentences), dtype=np.int64)
+        for i, sent in enumerate(self.sentences):
+            lengths[i] = len(sent.tokens)
+            token_ids.extend([self.word2id.setdefault(str(token), len(self.word2id)) for token in sent.tokens])
+        self.token_ids = np.array(token_ids, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.counts = np.bincount(self.token_ids, minlength=len(self.word2id))
+
+        self.weights = self.__weights()
+        self.vectors = self.vocab.get_embs(list(self.word2id.keys()))
+        self.pc = None
+        self.matrix = self.__embed(self.token_ids, self.offsets)
+        if self.remove_pc and len(self.matrix) > 0:
+            self.pc = np.linalg.svd(self.matrix[:self.chunk_size], full_matrices=False)[2][0]
+            self.matrix -= np.outer(self.matrix @ self.pc, self.pc)
+        self.__index = None
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def __getitem__(self, key):
+        return self.matrix[key if isinstance(key, (int, np.integer)) else self.sentence2id[key]]
+
+    def __weights(self):
+        if self.weighting == "sif":
+            return self.sif_a / (self.sif_a + self.counts / max(self.counts.sum(), 1))
+        if self.weighting == "tfidf":
+            sent_ids = np.repeat(np.arange(len(self.sentences)), np.diff(self.offsets))
+            df = np.bincount(np.unique(sent_ids * len(self.word2id) + self.token_ids) % max(len(self.word2id), 1), minlength=len(self.word2id))
+            return np.log((1 + len(self.sentences)) / (1 + df)) + 1
+        return np.ones(len(self.word2id))
+
+    def __embed(self, token_ids, offsets, vectors=None, weights=None):
+        vectors = self.vectors if vectors is None else vectors
+        weights = self.weights if weights is None else weights
+        matrix = np.zeros((len(offsets) - 1, vectors.shape[1]), dtype=np.float32)
+        for beg in range(0, len(offsets) - 1, self.chunk_size):
+            end = min(beg + self.chunk_size, len(offsets) - 1)
+            starts, lengths = offsets[beg:end], np.diff(offsets[beg:end + 1])
+            ids = token_ids[offsets[beg]:offsets[end]]
+            if len(ids) == 0:
+                continue
+            weight = weights[ids].astype(np.float32)
+            nonempty = lengths > 0
+            sums = np.add.reduceat(vectors[ids] * weight[:, None], starts[nonempty] - offsets[beg], axis=0)
+            totals = np.add.reduceat(weight, starts[nonempty] - offsets[beg])
+            matrix[beg:end][nonempty] = sums / np.maximum(totals, 1e-12)[:, None]
+        return matrix
+
+    def embed(self, sentences):
+        words = {}
+        token_ids, offsets = [], [0]
+        for sent in sentences:
+            for token in sent.tokens:
+                word = str(token)
+                token_ids.append(self.word2id[word] if word in self.word2id else len(self.word2id) + words.setdefault(word, len(words)))
+            offsets.append(len(token_ids))
+        vectors = np.concatenate([self.vectors, self.vocab.get_embs(list(words.keys()))])
+        unseen = self.weights.max() if self.weighting == "tfidf" and len(self.weights) > 0 else 1.
+        weights = np.concatenate([self.weights, np.full(len(words), unseen)])
+        matrix = self.__embed(np.array(token_ids, dtype=np.int64), np.array(offsets, dtype=np.int64), vectors, weights)
+        if self.pc is not None:
+            matrix -= np.outer(matrix @ self.pc, self.pc)
+        return matrix
+
+    def most_similar(self, queries, k=10):
+        if self.__index is None:
+            self.__index = ExactIndex(self.matrix)
+        exclude = np.array([self.sentence2id.get(q, -1) for q in queries], dtype=np.int64)
+        rows = np.array([i for i in exclude if i >= 0], dtype=np.int64)
+        matrix = np.zeros((len(queries), self.matrix.shape[1]), dtype=np.float32)
+        matrix[exclude >= 0] = self.matrix[rows]
+        unseen = [q for q, i in zip(queries, exclude) if i < 0]
+        if len(unseen) > 0:
+            matrix[exclude < 0] = self.embed(unseen)
+        indices, scores = self.__index.search(matrix, k, exclude=exclude)
+        return [[(self.sentences[j], float(s)) for j, s in zip(idx, score) if j >= 0] for idx, score in zip(indices, scores)]
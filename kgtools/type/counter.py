@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+
+import numpy as np
+
+
+class FrequencyCounter:
+    """Exact word counts in one int64 array indexed by `index` (word -> slot).
+
+    `update` and `subtract` take another counter, a mapping or an iterable of words and touch the
+    array with one vectorized add, so merging the counts of parallel workers is cheap. Single `add`s
+    are buffered in a small Counter and folded in once `buffer_size` distinct words are pending (or
+    on the next read). Words whose count drops to zero are removed.
+    """
+
+    def __init__(self, counts=None, buffer_size=65536):
+        self.index = {}
+        self.words = []
+        self.values = np.zeros(16, dtype=np.int64)
+        self.pending = Counter()
+        self.buffer_size = buffer_size
+        if counts is not None:
+            self.update(counts)
+
+    def _sync(self):
+        if len(self.pending) > 0:
+            pending, self.pending = self.pending, Counter()
+            self.update(pending)
+
+    def __len__(self):
+        self._sync()
+        return len(self.words)
+
+    def __contains__(self, word):
+        self._sync()
+        return word in self.index
+
+    def __iter__(self):
+        self._sync()
+        return iter(self.words)
+
+    def __getitem__(self, word):
+        return self.get(word)
+
+    def __getstate__(self):
+        self._sync()
+        state = self.__dict__.copy()
+        del state["index"]
+        state["values"] = self.values[:len(self.words)].copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.index = {word: i for i, word in enumerate(self.words)}
+
+    def __add__(self, other):
+        counter = self.copy()
+        counter.update(other)
+        return counter
+
+    def get(self, word, default=0):
+        self._sync()
+        slot = self.index.get(word)
+        return default if slot is None else int(self.values[slot])
+
+    def keys(self):
+        self._sync()
+        return self.index.keys()
+
+    def items(self):
+        self._sync()
+        return zip(self.words, self.values[:len(self.words)].tolist())
+
+    def total(self):
+        self._sync()
+        return int(self.values[:len(self.words)].sum())
+
+    def copy(self):
+        counter = object.__new__(self.__class__)
+        counter.__dict__.update(self.__getstate__())
+        counter.index, counter.words, counter.pending = dict(self.index), list(self.words), Counter()
+        return counter
+
+    def most_common(self, k=None):
+        self._sync()
+        values = self.values[:len(self.words)]
+        if k is not None and k < len(values):
+            top = np.argpartition(-values, k)[:k]
+            order = top[np.argsort(-values[top], kind="stable")]
+        else:
+            order = np.argsort(-values, kind="stable")
+        return [(self.words[i], int(values[i])) for i in order]
+
+    def add(self, word, count=1):
+        self.pending[word] += count
+        if len(self.pending) >= self.buffer_size:
+            self._sync()
+
+    def count(self, words):
+        """Buffered `add` of every word of an iterable."""
+        self.pending.update(words)
+        if len(self.pending) >= self.buffer_size:
+            self._sync()
+
+    def _slot(self, word):
+        slot = self.index.get(word)
+        if slot is None:
+            slot = self.index[word] = len(self.words)
+            self.words.append(word)
+            if slot >= len(self.values):
+                values = np.zeros(max(2 * len(self.values), 16), dtype=np.int64)
+                values[:len(self.values)] = self.values
+                self.values = values
+        return slot
+
+    @staticmethod
+    def _pairs(counts):
+        if isinstance(counts, FrequencyCounter):
+            counts._sync()
+            return counts.words, counts.values[:len(counts.words)]
+        if not hasattr(counts, "items"):
+            counts = Counter(counts)
+        return list(counts.keys()), np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+
+    def update(self, counts):
+        self._sync()
+        words, values = FrequencyCounter._pairs(counts)
+        slots = np.fromiter((self._slot(word) for word in words), dtype=np.int64, count=len(words))
+        self.values[slots] += values
+
+    def subtract(self, counts):
+        self._sync()
+        words, values = FrequencyCounter._pairs(counts)
+        slots = np.fromiter((self._slot(word) for word in words), dtype=np.int64, count=len(words))
+        self.values[slots] -= values
+        self._keep(self.values[:len(self.words)] > 0)
+
+    def prune(self, min_count=None, top_k=None):
+        """Drop the words counted fewer than `min_count` times or outside the `top_k`; returns them."""
+        self._sync()
+        values = self.values[:len(self.words)]
+        keep = np.ones(len(values), dtype=bool)
+        if min_count is not None:
+            keep &= values >= min_count
+        if top_k is not None and top_k < keep.sum():
+            ranked = np.argsort(-np.where(keep, values, -1), kind="stable")
+            keep[:] = False
+            keep[ranked[:top_k]] = True
+        removed = [word for word, kept in zip(self.words, keep) if not kept]
+        self._keep(keep)
+        return removed
+
+    def _keep(self, keep):
+        if keep.all():
+            return
+        self.words = [word for word, kept in zip(self.words, keep) if kept]
+        self.values = self.values[:len(keep)][keep].copy()
+        self.index = {word: i for i, word in enumerate(self.words)}
+
+    def clear(self):
+        self.__init__(buffer_size=self.buffer_size)
+
+
+class SpaceSaving(FrequencyCounter):
+    """Approximate counts with bounded memory: only the `capacity` most frequent words are kept.
+
+    Follows the mergeable Space-Saving summary: a word that is not monitored is assumed to have the
+    smallest monitored count, so a count overestimates the true one by at most `error(word)`, which
+    is bounded by total / capacity, and every word more frequent than that is kept. Single `add`s are
+    buffered and folded in once `capacity` distinct words are pending.
+    """
+
+    def __init__(self, capacity=1000000, counts=None):
+        self.capacity = capacity
+        self.errors = np.zeros(16, dtype=np.int64)
+        super(SpaceSaving, self).__init__(counts, capacity)
+
+    def __getstate__(self):
+        state = super(SpaceSaving, self).__getstate__()
+        state["errors"] = self.errors[:len(self.words)].copy()
+        return state
+
+    def floor(self):
+        return int(self.values[:len(self.words)].min()) if len(self.words) >= self.capacity else 0
+
+    def error(self, word):
+        self._sync()
+        slot = self.index.get(word)
+        return self.floor() if slot is None else int(self.errors[slot])
+
+    def update(self, counts):
+        self._sync()
+        if isinstance(counts, SpaceSaving):
+            counts._sync()
+            words, values, errors, floor = counts.words, counts.values[:len(counts.words)], counts.errors[:len(counts.words)], counts.floor()
+        else:
+            words, values = FrequencyCounter._pairs(counts)
+            errors, floor = np.zeros(len(values), dtype=np.int64), 0
+        n, own_floor = len(self.words), self.floor()
+        new = {}
+        slots = np.empty(len(words), dtype=np.int64)
+        for i, word in enumerate(words):
+            slot = self.index.get(word)
+            slots[i] = slot if slot is not None else n + new.setdefault(word, len(new))
+        merged_values = np.concatenate([self.values[:n], np.full(len(new), own_floor, dtype=np.int64)])
+        merged_errors = np.concatenate([self.errors[:n], np.full(len(new), own_floor, dtype=np.int64)])
+        added_values = np.full(len(merged_values), floor, dtype=np.int64)
+        added_errors = np.full(len(merged_values), floor, dtype=np.int64)
+        added_values[slots], added_errors[slots] = values, errors
+        merged_values += added_values
+        merged_errors += added_errors
+        self.words = self.words + list(new.keys())
+        self.values, self.errors = merged_values, merged_errors
+        if len(self.words) > self.capacity:
+            keep = np.zeros(len(self.words), dtype=bool)
+            keep[np.argpartition(-merged_values, self.capacity - 1)[:self.capacity]] = True
+            self._keep(keep)
+        else:
+            self.index.update((word, n + i) for word, i in new.items())
+
+    def _slot(self, word):
+        slot = super(SpaceSaving, self)._slot(word)
+        if len(self.errors) < len(self.values):
+            errors = np.zeros(len(self.values), dtype=np.int64)
+            errors[:len(self.errors)] = self.errors
+            self.errors = errors
+        return slot
+
+    def _keep(self, keep):
+        if keep.all():
+            return
+        self.errors = self.errors[:len(keep)][keep].copy()
+        super(SpaceSaving, self)._keep(keep)
+
+    def clear(self):
+        self.__init__(self.capacity)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class Embedding:
+    """Row-major word embedding store.
+
+    Vectors live in one matrix indexed by `index` (word -> row). The matrix is kept as
+    float32, float16 or int8 with one float32 scale per row; reads always return float32.
+    """
+
+    DTYPES = ("float32", "float16", "int8")
+
+    def __init__(self, dim=100, dtype="float32"):
+        assert dtype in Embedding.DTYPES, f"The parameter 'dtype' must be in {Embedding.DTYPES}"
+        self.dim = dim
+        self.dtype = dtype
+        self.index = {}
+        self.words = []
+        self.matrix = np.zeros((0, dim), dtype=dtype)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.version = 0
+        self._shared = None
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __getitem__(self, word):
+        return self._decode(self.matrix[self.index[word]], self.scales[self.index[word]])
+
+    def __setitem__(self, word, vec):
+        self.set_matrix([word], np.asarray(vec).reshape(1, -1))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        shared = state.pop("_shared", None)
+        if shared is not None and self.matrix is shared.array:
+            state["matrix"] = shared
+        else:
+            state["matrix"] = self.matrix[:len(self)].copy()
+        state["scales"] = self.scales[:len(self)].copy()
+        return state
+
+    def __setstate__(self, state):
+        from kgtools.shm import SharedArray
+
+        self.__dict__.update(state)
+        self._shared = None
+        if isinstance(self.matrix, SharedArray):
+            # the handle keeps this process' mapping cached (and pickles again as a handle) as long as the embedding lives
+            self._shared = self.matrix
+            self.matrix = self.matrix.array
+
+    @contextmanager
+    def shared(self):
+        """Within the block, the matrix lives in shared memory and pickles as a handle only.
+
+        Workers that unpickle this embedding (e.g. as an argument of Parallel or func.parallel) map
+        the parent's matrix once per process instead of receiving a copy with every batch.
+        """
+        from kgtools.shm import SharedArray
+
+        with SharedArray.from_array(self.matrix[:len(self)]) as shared:
+            self.matrix, self.scales, self._shared = shared.array, self.scales[:len(self)].copy(), shared
+            try:
+                yield self
+            finally:
+                self._shared = None
+
+    @property
+    def nbytes(self):
+        return self.matrix[:len(self)].nbytes + (self.scales[:len(self)].nbytes if self.dtype == "int8" else 0)
+
+    def keys(self):
+        return self.index.keys()
+
+    def items(self):
+        for word in self.words:
+            yield word, self[word]
+
+    def get(self, word, default=None):
+        row = self.index.get(word)
+        if row is None:
+            return default
+        return self._decode(self.matrix[row], self.scales[row])
+
+    def rows(self, words):
+        return np.array([self.index.get(word, -1) for word in words], dtype=np.int64)
+
+    def lookup(self, words):
+        rows = self.rows(words)
+        found = rows >= 0
+        result = np.zeros((len(rows), self.dim), dtype=np.float32)
+        result[found] = self._decode(self.matrix[rows[found]], self.scales[rows[found]])
+        return result
+
+    def dense(self):
+        return self._decode(self.matrix[:len(self)], self.scales[:len(self)])
+
+    def set_matrix(self, words, matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        assert matrix.shape == (len(words), self.dim), f"The matrix shape must be ({len(words)}, {self.dim})"
+        rows = np.empty(len(words), dtype=np.int64)
+        for i, word in enumerate(words):
+            row = self.index.get(word)
+            if row is None:
+                row = len(self.words)
+                self.index[word] = row
+                self.words.append(word)
+            rows[i] = row
+        self._reserve(len(self.words))
+        data, scales = self._encode(matrix)
+        self.matrix[rows] = data
+        self.scales[rows] = scales
+        self.version += 1
+
+    def update(self, other):
+        if isinstance(other, Embedding):
+            self.set_matrix(other.words, other.dense())
+        else:
+            other = dict(other)
+            if len(other) > 0:
+                self.set_matrix(list(other.keys()), np.stack([np.asarray(v, dtype=np.float32) for v in other.values()]))
+
+    def copy(self):
+        return self.astype(self.dtype)
+
+    def astype(self, dtype):
+        emb = Embedding(self.dim, dtype)
+        if dtype == self.dtype:
+            emb.matrix = self.matrix[:len(self)].copy()
+            emb.scales = self.scales[:len(self)].copy()
+            emb.words = list(self.words)
+            emb.index = dict(self.index)
+        else:
+            emb.set_matrix(list(self.words), self.dense())
+        return emb
+
+    def _reserve(self, size):
+        capacity = self.matrix.shape[0]
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 16)
+        matrix = np.zeros((capacity, self.dim), dtype=self.matrix.dtype)
+        matrix[:self.matrix.shape[0]] = self.matrix
+        scales = np.zeros(capacity, dtype=np.float32)
+        scales[:self.scales.shape[0]] = self.scales
+        self.matrix, self.scales = matrix, scales
+
+    def _encode(self, matrix):
+        if self.dtype == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.
+            scales[scales == 0] = 1.
+            return np.rint(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return matrix.astype(self.dtype), np.ones(len(matrix), dtype=np.float32)
+
+    def _decode(self, data, scales):
+        if self.dtype == "int8":
+            return data.astype(np.float32) * np.asarray(scales, dtype=np.float32)[..., None]
+        return data.astype(np.float32)
+
+
+def quantization_report(embedding, dtypes=("float16", "int8"), sample=10000, seed=0):
+    """Report the cosine-similarity error of storing `embedding` in each of `dtypes`.
+
+    Cosine similarities of `sample` random word pairs are compared with the float32 values.
+    """
+    assert len(embedding) > 0, "The embedding must not be empty"
+    reference = embedding.dense()
+    rng = np.random.RandomState(seed)
+    left, right = rng.randint(0, len(reference), sample), rng.randint(0, len(reference), sample)
+
+    def cosine(matrix):
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.
+        return (matrix[left] * matrix[right]).sum(axis=1) / (norms[left] * norms[right])
+
+    expected = cosine(reference)
+    report = {}
+    for dtype in dtypes:
+        quantized = embedding.astype(dtype)
+        error = np.abs(cosine(quantized.dense()) - expected)
+        report[dtype] = {
+            "bytes": quantized.nbytes,
+            "compression": embedding.astype("float32").nbytes / max(quantized.nbytes, 1),
+            "mean_error": float(error.mean()),
+            "max_error": float(error.max()),
+        }
+    return report
@@ -1,25 +1,61 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from bisect import bisect_left, bisect_right
+
 from kgtools.annotation import Lazy
-from kgtools.type.span import Span
+from kgtools.type.vocab import Vocab
+from kgtools.type.token import _from_fields
+from kgtools.type.span import Span, CodeSpan, token_offsets
 
 
 class Sentence:
-    def __init__(self, text, docs=None, tokens=None, nps=None):
+    def __init__(self, text, docs=None, tokens=None, nps=None, codes=None):
         self.text = text
         self.docs = docs
         self.tokens = tokens
         self.nps = set() if nps is None else nps
+        self.codes = set() if codes is None else codes
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        self._text = text
+        self._hash = hash(text)
 
     def __str__(self):
-        return self.text
+        return self._text
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        if self is other:
+            return True
+        if isinstance(other, Sentence):
+            return self._hash == other._hash and self._text == other._text
+        return self._hash == hash(other)
+
+    def __reduce__(self):
+        docs = None if self.docs is None else {getattr(doc, "url", doc) for doc in self.docs}
+        tokens = None if self.tokens is None else tuple(token.fields() for token in self.tokens)
+        handle = self.tokens[0].vocab.handle if self.tokens else None
+        nps = tuple((span.start, span.end) for span in self.nps)
+        codes = tuple((span.kind, span.char_start, span.char_end) for span in self.codes)
+        return _restore_sentence, (self.text, docs, tokens, nps, handle, codes)
+
+    def __setstate__(self, state):
+        # pickles of the plain __dict__ (before the hash was cached) hold `text`; the hash is salted per
+        # process, so it is recomputed
+        state = dict(state)
+        state["_text"] = state.pop("text", state.get("_text"))
+        state["_hash"] = hash(state["_text"])
+        state.setdefault("nps", set())
+        state.setdefault("codes", set())
+        self.__dict__.update(state)
 
     def __len__(self):
         return len(self.tokens)
@@ -48,6 +84,19 @@ class Sentence:
     def add_nps(self, *pairs):
         self.nps.update({Span(self, *pair) for pair in pairs})
 
+    def add_codes(self, *elements):
+        """Add code elements given as (kind, char_start, char_end), mapped to the tokens they overlap."""
+        offsets = token_offsets(self.text, self.tokens) if self.tokens else None
+        if offsets is not None:
+            begins, ends = [beg for beg, _ in offsets], [fin for _, fin in offsets]
+        for kind, char_start, char_end in elements:
+            start = end = None
+            if offsets is not None:
+                start, end = bisect_right(ends, char_start), bisect_left(begins, char_end)
+                if start >= end:
+                    start = end = None
+            self.codes.add(CodeSpan(self, kind, char_start, char_end, start, end))
+
     def find_spans(self, *spans, is_lemma=True):
         words = [token.lemma if is_lemma else token.text for token in self.tokens]
         group_dict = {}
@@ -83,3 +132,45 @@ class Sentence:
     @Lazy
     def emb(self):
         return sum([token.emb for token in self.tokens]) / len(self)
+
+
+def _restore_sentence(text, docs, tokens, nps, handle, codes=()):
+    sentence = Sentence(text, docs)
+    if tokens is not None:
+        vocab = Vocab.bind(handle)
+        sentence.tokens = [_from_fields(fields, vocab) for fields in tokens]
+    sentence.add_nps(*nps)
+    sentence.add_codes(*codes)
+    return sentence
+
+
+class SentenceTable:
+    """Canonical interning table: equal sentences map to one shared object.
+
+    With `merge_docs`, the `docs` of a duplicate are merged into the canonical sentence.
+    """
+
+    def __init__(self, merge_docs=True):
+        self.table = {}
+        self.merge_docs = merge_docs
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, sent):
+        return sent in self.table
+
+    def __iter__(self):
+        return iter(self.table.values())
+
+    def intern(self, sent):
+        canonical = self.table.setdefault(sent, sent)
+        if canonical is not sent and self.merge_docs and sent.docs:
+            if canonical.docs is None:
+                canonical.docs = set(sent.docs)
+            else:
+                canonical.docs |= sent.docs
+        return canonical
+
+    def __call__(self, sent):
+        return self.intern(sent)
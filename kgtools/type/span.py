@@ -7,10 +7,56 @@ class Span:
         self.start = start
         self.end = end
 
+    def __reduce__(self):
+        return Span, (self.sentence, self.start, self.end)
+
     def __str__(self):
         return " ".join([str(t) for t in self.sentence.tokens[self.start:self.end]])
 
     def __add__(self, other):
         if self.sentence == other.sentence and self.end == other.start:
             self.end = other.end
-        return self
\ No newline at end of file
+        return self
+
+
+class CodeSpan(Span):
+    """A code element of a sentence: `kind` and its characters `text[char_start:char_end]`.
+
+    `start` and `end` are the indices of the tokens it overlaps (None while the sentence has no tokens).
+    """
+
+    def __init__(self, sentence, kind, char_start, char_end, start=None, end=None):
+        super(CodeSpan, self).__init__(sentence, start, end)
+        self.kind = kind
+        self.char_start = char_start
+        self.char_end = char_end
+
+    def __reduce__(self):
+        return CodeSpan, (self.sentence, self.kind, self.char_start, self.char_end, self.start, self.end)
+
+    def __str__(self):
+        return self.sentence.text[self.char_start:self.char_end]
+
+    # the spans of a sentence are kept in a set: the same element found twice is one span
+    def __eq__(self, other):
+        return isinstance(other, CodeSpan) and (self.kind, self.char_start, self.char_end) == (other.kind, other.char_start, other.char_end)
+
+    def __hash__(self):
+        return hash((self.kind, self.char_start, self.char_end))
+
+    def __repr__(self):
+        return f"CodeSpan({self.kind!r}, {str(self)!r})"
+
+
+def token_offsets(text, tokens):
+    """Character (start, end) of every token in `text`, found left to right; a token missing from the text gets an empty span."""
+    offsets, position = [], 0
+    for token in tokens:
+        word = token.text
+        start = text.find(word, position)
+        if start < 0:
+            offsets.append((position, position))
+        else:
+            position = start + len(word)
+            offsets.append((start, position))
+    return offsets
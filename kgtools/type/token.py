@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import sys
+
 from kgtools.annotation import Lazy
 
 from kgtools.type.vocab import Vocab
@@ -12,17 +14,48 @@ class Token:
         self.lemma = lemma
         self.vocab = vocab
         self.lemma_first = vocab.lemma_first
-        self.vocab.add(lemma if self.lemma_first else text)
+        self.vocab.add_token(text, lemma)
         self.pos = pos
         self.dep = dep
         self.ner = ner
 
+    @classmethod
+    def restore(cls, text, lemma, vocab, pos=None, dep=None, ner=None):
+        token = object.__new__(cls)
+        token.text = text
+        token.lemma = lemma
+        token.vocab = vocab
+        token.lemma_first = vocab.lemma_first
+        token.pos = pos
+        token.dep = dep
+        token.ner = ner
+        return token
+
+    def __reduce__(self):
+        return _restore_token, (self.text, self.lemma, self.pos, self.dep, self.ner, self.vocab.handle)
+
+    def fields(self):
+        return self.text, self.lemma, self.pos, self.dep, self.ner
+
     def __str__(self):
         return self.lemma if self.lemma_first else self.text
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(self.lemma if self.lemma_first else self.text)
 
     @Lazy
     def emb(self):
         return self.vocab.get_emb(str(self))
+
+
+def _intern(string):
+    return sys.intern(string) if type(string) == str else string
+
+
+def _from_fields(fields, vocab):
+    text, lemma, pos, dep, ner = [_intern(field) for field in fields]
+    return Token.restore(text, lemma, vocab, pos, dep, ner)
+
+
+def _restore_token(text, lemma, pos, dep, ner, handle):
+    return _from_fields((text, lemma, pos, dep, ner), Vocab.bind(handle))
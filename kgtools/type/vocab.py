@@ -2,12 +2,19 @@
 # -*- coding: utf-8 -*-
 
 import threading
+import uuid
+import weakref
 import numpy as np
 
+from kgtools.type.counter import FrequencyCounter, SpaceSaving
+from kgtools.type.embedding import Embedding, quantization_report
+from kgtools.similarity import ExactIndex, IVFIndex
+
 
 class Vocab:
     __thread_lock = threading.Lock()
     # _process_lock = multiprocessing.Lock()
+    __registry = weakref.WeakValueDictionary()
 
     def __new__(cls, *args, **kwargs):
         if not hasattr(Vocab, "_instance"):
@@ -16,15 +23,63 @@ class Vocab:
                     Vocab._instance = object.__new__(cls)
         return Vocab._instance
 
-    def __init__(self, lemma_first=True, stopwords=None, emb_size=100):
-        self.words = set()
-        self.embedding = {}
+    def __init__(self, lemma_first=True, stopwords=None, emb_size=100, dtype="float32", approximate=False, capacity=1000000):
+        # token (surface text) and lemma frequencies; `counts` is the one matching `lemma_first`.
+        # With `approximate`, each keeps only the `capacity` most frequent words (Space-Saving)
+        self.approximate = approximate
+        self.capacity = capacity
+        self.token_counts = self.new_counter()
+        self.lemma_counts = self.new_counter()
+        self.embedding = Embedding(emb_size, dtype)
         self.stopwords = stopwords
         self.emb_size = emb_size
 
         self.lemma_first = lemma_first
 
-        self.ZERO = np.array([0.] * self.emb_size)
+        self.ZERO = np.zeros(self.emb_size, dtype=np.float32)
+        self.__sim_index = None
+
+        self.handle = uuid.uuid4().hex
+        Vocab.__registry[self.handle] = self
+
+    def __getstate__(self):
+        # the similarity index is a full float32 copy of the embedding: rebuilt on demand instead of pickled
+        state = self.__dict__.copy()
+        state["_Vocab__sim_index"] = None
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        state["_Vocab__sim_index"] = None
+        # vocabularies pickled before the counters were added
+        words, counts = state.pop("words", None), state.pop("counts", None)
+        self.__dict__.update(state)
+        if "token_counts" not in state:
+            self.approximate, self.capacity = False, 1000000
+            self.token_counts, self.lemma_counts = self.new_counter(), self.new_counter()
+            self.counts = counts if counts is not None else dict.fromkeys(words or (), 1)
+        if "handle" in state:
+            Vocab.__registry[self.handle] = self
+
+    def new_counter(self, counts=None):
+        return SpaceSaving(self.capacity, counts) if self.approximate else FrequencyCounter(counts)
+
+    @property
+    def counts(self):
+        return self.lemma_counts if self.lemma_first else self.token_counts
+
+    @counts.setter
+    def counts(self, counts):
+        counts = counts if isinstance(counts, FrequencyCounter) else self.new_counter(counts)
+        if self.lemma_first:
+            self.lemma_counts = counts
+        else:
+            self.token_counts = counts
+
+    @property
+    def words(self):
+        # a snapshot: the counter's own key view goes stale once it is pruned
+        return list(self.counts.keys())
 
     @classmethod
     def new_instance(cls, *args, **kwargs):
@@ -32,22 +87,95 @@ class Vocab:
         instance.__init__(*args, **kwargs)
         return instance
 
+    @staticmethod
+    def bind(handle):
+        vocab = Vocab.__registry.get(handle)
+        if vocab is None:
+            vocab = Vocab._instance if hasattr(Vocab, "_instance") else Vocab()
+        return vocab
+
     def get_emb(self, word):
         return self.embedding.get(word, self.ZERO)
 
+    def get_embs(self, words):
+        return self.embedding.lookup(words)
+
+    def shared(self):
+        """Context manager that broadcasts the embedding matrix to workers through shared memory, see Embedding.shared."""
+        return self.embedding.shared()
+
+    def quantize(self, dtype):
+        self.embedding = self.embedding.astype(dtype)
+
+    def quantization_report(self, dtypes=("float16", "int8"), sample=10000):
+        return quantization_report(self.embedding, dtypes, sample)
+
+    def similarity_index(self, approximate=False, **kwargs):
+        key = (id(self.embedding), self.embedding.version, approximate)
+        if self.__sim_index is None or self.__sim_index[0] != key:
+            matrix = self.embedding.dense()
+            self.__sim_index = (key, IVFIndex(matrix, **kwargs) if approximate else ExactIndex(matrix))
+        return self.__sim_index[1]
+
+    def most_similar(self, words, k=10, approximate=False, **kwargs):
+        index = self.similarity_index(approximate, **kwargs)
+        rows = self.embedding.rows(words)
+        found = rows >= 0
+        result = [[] for _ in words]
+        if found.any():
+            indices, scores = index.search(index.matrix[rows[found]], k, exclude=rows[found])
+            for i, idx, score in zip(np.nonzero(found)[0], indices, scores):
+                result[i] = [(self.embedding.words[j], float(s)) for j, s in zip(idx, score) if j >= 0]
+        return result
+
     def add(self, word):
-        self.words.add(word)
+        self.counts.add(word)
+
+    def add_token(self, text, lemma):
+        self.token_counts.add(text)
+        if lemma is not None:
+            self.lemma_counts.add(lemma)
+
+    def add_tokens(self, tokens):
+        self.token_counts.count([token.text for token in tokens])
+        # tokenizer profiles without lemmas leave them None
+        self.lemma_counts.count([token.lemma for token in tokens if token.lemma is not None])
+
+    def merge(self, counts):
+        """Add counts: a mapping or counter of `counts` keys, or another Vocab (both of its counters)."""
+        if isinstance(counts, Vocab):
+            self.token_counts.update(counts.token_counts)
+            self.lemma_counts.update(counts.lemma_counts)
+        else:
+            self.counts.update(counts)
+
+    def retract(self, counts):
+        self.counts.subtract(counts)
+
+    def reset_counts(self):
+        self.token_counts, self.lemma_counts = self.new_counter(), self.new_counter()
+
+    def most_common(self, k=None):
+        return self.counts.most_common(k)
+
+    def prune(self, min_count=None, top_k=None):
+        """Drop rare words from both counters (see FrequencyCounter.prune); returns the words removed from `counts`."""
+        other = self.token_counts if self.lemma_first else self.lemma_counts
+        other.prune(min_count, top_k)
+        return self.counts.prune(min_count, top_k)
 
     def __len__(self):
-        return len(self.words)
+        return len(self.counts)
 
     def __getitem__(self, key):
         return self.get_emb(key)
 
     def __add__(self, other):
-        vocab = Vocab(self.lemma_first, self.stopwords, self.emb_size)
-        vocab.words = self.words | other.words
-        vocab.embedding = dict(set(self.embedding.items()) | (other.embedding.items()))
+        vocab = Vocab.new_instance(self.lemma_first, self.stopwords, self.emb_size, self.embedding.dtype, self.approximate, self.capacity)
+        vocab.token_counts = self.token_counts + other.token_counts
+        vocab.lemma_counts = self.lemma_counts + other.lemma_counts
+        vocab.embedding = self.embedding.copy()
+        vocab.embedding.update(other.embedding)
         vocab.stopwords = self.stopwords
         if self.stopwords is not None:
             if other.stopwords is not None:
@@ -57,7 +185,7 @@ class Vocab:
         return vocab
 
     def __iadd__(self, other):
-        self.words |= other.words
+        self.merge(other)
         self.embedding.update(other.embedding)
         if self.stopwords is not None:
             if other.stopwords is not None:
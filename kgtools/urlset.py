@@ -0,0 +1,431 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""URL-state backends for the Spider: sets of seen urls and FIFO frontiers, in memory or on disk.
+
+Every set has `add(url)` (True if the url was new), `in`, `len`, `nbytes` (memory) and `disk_bytes`,
+so `bytes_per_url` can be compared across backends:
+
+    StringSet            exact, the urls themselves (~150 bytes per url)
+    FingerprintSet       64-bit hashes in a sorted numpy array (~8 bytes per url; collisions ~n^2 / 2^65)
+    ScalableBloomFilter  bits (~2-3 bytes per url at error_rate=0.001); grows with the crawl
+    DiskSet              64-bit hashes in SQLite (~15 bytes per url on disk); memory stays flat
+
+The disk backends opened at a given path keep what an earlier run left there, so a crawl can be
+resumed; the ones on a temporary file remove it when they are closed or garbage collected.
+"""
+
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import weakref
+import zlib
+from collections import deque
+from hashlib import blake2b
+from pathlib import Path
+
+import numpy as np
+
+
+def fingerprint(url):
+    return int.from_bytes(blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _temporary(suffix, prefix):
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix)
+    os.close(fd)
+    return path
+
+
+def _close(path, *handles):
+    for handle in handles:
+        handle.close()
+    if path is not None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def bytes_per_url(urls):
+    return (urls.nbytes + urls.disk_bytes) / max(len(urls), 1)
+
+
+class StringSet(set):
+    def add(self, url):
+        if url in self:
+            return False
+        super(StringSet, self).add(url)
+        return True
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self) + sum(sys.getsizeof(url) for url in self)
+
+    disk_bytes = 0
+
+
+class FingerprintSet:
+    """Exact (up to 64-bit hash collisions) set of urls kept as a sorted uint64 array.
+
+    New fingerprints are buffered in a small Python set and merged in once `buffer_size` are pending,
+    so memory is about 8 bytes per url plus the buffer.
+    """
+
+    def __init__(self, buffer_size=8192):
+        self.values = np.zeros(0, dtype=np.uint64)
+        self.pending = set()
+        self.buffer_size = buffer_size
+
+    def __len__(self):
+        return len(self.values) + len(self.pending)
+
+    def __has(self, fp):
+        if fp in self.pending:
+            return True
+        i = np.searchsorted(self.values, np.uint64(fp))
+        return i < len(self.values) and int(self.values[i]) == fp
+
+    def __contains__(self, url):
+        return self.__has(fingerprint(url))
+
+    def add(self, url):
+        fp = fingerprint(url)
+        if self.__has(fp):
+            return False
+        self.pending.add(fp)
+        if len(self.pending) >= self.buffer_size:
+            self._sync()
+        return True
+
+    def _sync(self):
+        if len(self.pending) > 0:
+            pending = np.sort(np.fromiter(self.pending, dtype=np.uint64, count=len(self.pending)))
+            # one memmove of the sorted array rather than a re-sort
+            self.values = np.insert(self.values, np.searchsorted(self.values, pending), pending)
+            self.pending = set()
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + sys.getsizeof(self.pending) + 32 * len(self.pending)
+
+    disk_bytes = 0
+
+
+def _hashes(url):
+    digest = blake2b(url.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter for `capacity` urls at `error_rate` false positives (k positions by double hashing)."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        assert 0 < error_rate < 1, "The parameter 'error_rate' must be in (0, 1)"
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _has(self, h1, h2):
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def _add(self, h1, h2):
+        bits, size, added = self.bits, self.size, False
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                bits[position >> 3] |= 1 << (position & 7)
+                added = True
+        self.count += added
+        return added
+
+    def __contains__(self, url):
+        return self._has(*_hashes(url))
+
+    def add(self, url):
+        return self._add(*_hashes(url))
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    disk_bytes = 0
+
+
+class ScalableBloomFilter:
+    """Bloom filter that grows: a new filter `growth` times larger with a `tightening` times smaller error
+    rate is added when the current one is full, so the total false-positive rate stays below
+    error_rate / (1 - tightening) however many urls are added.
+
+    A false positive means an unseen url is skipped; it never causes a page to be fetched twice.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001, growth=2, tightening=0.5):
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = [BloomFilter(capacity, error_rate * (1 - tightening))]
+
+    def __len__(self):
+        return sum(len(f) for f in self.filters)
+
+    def __contains__(self, url):
+        h1, h2 = _hashes(url)
+        return any(f._has(h1, h2) for f in self.filters)
+
+    def add(self, url):
+        h1, h2 = _hashes(url)
+        if any(f._has(h1, h2) for f in self.filters[:-1]):
+            return False
+        last = self.filters[-1]
+        if len(last) >= last.capacity:
+            last = BloomFilter(last.capacity * self.growth, last.error_rate * self.tightening)
+            self.filters.append(last)
+        return last._add(h1, h2)
+
+    @property
+    def nbytes(self):
+        return sum(f.nbytes for f in self.filters)
+
+    disk_bytes = 0
+
+
+class DiskSet:
+    """Url fingerprints in an SQLite table at `path` (a temporary file by default), committed every `batch_size` adds."""
+
+    def __init__(self, path=None, batch_size=10000):
+        temporary = _temporary(".sqlite", "urlset-") if path is None else None
+        self.path = Path(path if path is not None else temporary)
+        self.batch_size = batch_size
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS urls (fp INTEGER PRIMARY KEY) WITHOUT ROWID")
+        self.count = self.db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        self.uncommitted = 0
+        self.closer = weakref.finalize(self, _close, temporary, self.db)
+
+    @staticmethod
+    def __key(url):
+        # SQLite integers are signed
+        return fingerprint(url) - (1 << 63)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, url):
+        return self.db.execute("SELECT 1 FROM urls WHERE fp = ?", (DiskSet.__key(url),)).fetchone() is not None
+
+    def add(self, url):
+        added = self.db.execute("INSERT OR IGNORE INTO urls VALUES (?)", (DiskSet.__key(url),)).rowcount > 0
+        self.count += added
+        self.uncommitted += 1
+        if self.uncommitted >= self.batch_size:
+            self.db.commit()
+            self.uncommitted = 0
+        return added
+
+    def close(self):
+        self.db.commit()
+        self.closer()
+
+    nbytes = 0
+
+    @property
+    def disk_bytes(self):
+        self.db.commit()
+        return self.path.stat().st_size
+
+
+class DiskStore:
+    """Mapping url -> page body in an SQLite table at `path` (a temporary file by default), compressed with zlib.
+
+    Stands in for the in-memory `Spider.storage` dict in very large crawls.
+    """
+
+    def __init__(self, path=None, batch_size=1000):
+        temporary = _temporary(".sqlite", "pages-") if path is None else None
+        self.path = Path(path if path is not None else temporary)
+        self.batch_size = batch_size
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, body BLOB) WITHOUT ROWID")
+        self.uncommitted = 0
+        self.closer = weakref.finalize(self, _close, temporary, self.db)
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def __contains__(self, url):
+        return self.db.execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone() is not None
+
+    def __getitem__(self, url):
+        row = self.db.execute("SELECT body FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            raise KeyError(url)
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def __setitem__(self, url, body):
+        self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?)", (url, zlib.compress(body.encode("utf-8"))))
+        self.uncommitted += 1
+        if self.uncommitted >= self.batch_size:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def __iter__(self):
+        return (url for url, in self.db.execute("SELECT url FROM pages"))
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        return ((url, zlib.decompress(body).decode("utf-8")) for url, body in self.db.execute("SELECT url, body FROM pages"))
+
+    def close(self):
+        self.db.commit()
+        self.closer()
+
+    nbytes = 0
+
+    @property
+    def disk_bytes(self):
+        self.db.commit()
+        return self.path.stat().st_size
+
+
+class MemoryFrontier:
+    """FIFO of (url, depth) items."""
+
+    def __init__(self):
+        self.items = deque()
+
+    def __len__(self):
+        return len(self.items)
+
+    def push(self, url, depth=1):
+        self.items.append((url, depth))
+
+    def pop(self):
+        return self.items.popleft() if len(self.items) > 0 else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.items) + sum(sys.getsizeof(url) + 64 for url, _ in self.items)
+
+    disk_bytes = 0
+
+
+class DiskFrontier:
+    """FIFO of (url, depth) items appended to a file at `path` (a temporary file by default) and read back in order.
+
+    The items pending in an existing file are resumed (items popped but not yet drained by an
+    interrupted run are pending again).
+    """
+
+    def __init__(self, path=None):
+        temporary = _temporary(".txt", "frontier-") if path is None else None
+        self.path = Path(path if path is not None else temporary)
+        self.pushed = self.popped = 0
+        if temporary is None and self.path.exists():
+            self.pushed, end = DiskFrontier.__complete(self.path)
+            with self.path.open("r+b") as f:
+                # drop a line cut off by an interrupted write
+                f.truncate(end)
+        self.writer = self.path.open("a", encoding="utf-8")
+        self.reader = self.path.open("r", encoding="utf-8")
+        self.closer = weakref.finalize(self, _close, temporary, self.writer, self.reader)
+
+    @staticmethod
+    def __complete(path):
+        lines, end = 0, 0
+        with path.open("rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                lines += 1
+                end += len(line)
+        return lines, end
+
+    def __len__(self):
+        return self.pushed - self.popped
+
+    def push(self, url, depth=1):
+        self.writer.write(f"{depth}\t{url}\n")
+        self.pushed += 1
+
+    def pop(self):
+        if self.popped >= self.pushed:
+            return None
+        line = self.reader.readline()
+        if len(line) == 0 or not line.endswith("\n"):
+            self.writer.flush()
+            line += self.reader.readline()
+        self.popped += 1
+        if self.popped == self.pushed:
+            # drained: start the file over
+            self.writer.seek(0)
+            self.writer.truncate()
+            self.reader.seek(0)
+        return DiskFrontier.__parse(line)
+
+    @staticmethod
+    def __parse(line):
+        depth, url = line.rstrip("\n").split("\t", 1)
+        return url, int(depth)
+
+    def __iter__(self):
+        """The pending items, without popping them."""
+        self.writer.flush()
+        with self.path.open("r", encoding="utf-8") as f:
+            f.seek(self.reader.tell())
+            for line in f:
+                yield DiskFrontier.__parse(line)
+
+    def close(self):
+        self.closer()
+
+    nbytes = 0
+
+    @property
+    def disk_bytes(self):
+        self.writer.flush()
+        return self.path.stat().st_size
+
+
+SETS = {"set": StringSet, "fingerprint": FingerprintSet, "bloom": ScalableBloomFilter, "disk": DiskSet}
+
+
+def url_set(kind="set", **kwargs):
+    assert kind in SETS, f"The parameter 'kind' must be in {set(SETS.keys())}"
+    return SETS[kind](**kwargs)
+
+
+def frontier(kind="set", **kwargs):
+    """The frontier matching a url set kind: on disk for "disk", in memory otherwise."""
+    return DiskFrontier(**kwargs) if kind == "disk" else MemoryFrontier()
+
+
+def page_store(kind="set", **kwargs):
+    """The page storage matching a url set kind: on disk for "disk", a dict otherwise."""
+    return DiskStore(**kwargs) if kind == "disk" else {}
+
+
+if __name__ == "__main__":
+    urls = ["https://developer.example.com/reference/android/Class%d.html" % i for i in range(200000)]
+    for kind in SETS:
+        seen = url_set(kind)
+        for url in urls:
+            seen.add(url)
+        print("%-12s %d urls, %.1f bytes/url" % (kind, len(seen), bytes_per_url(seen)))
@@ -1,20 +1,154 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from gensim.models import Word2Vec as w2v
+import numpy as np
+from pathlib import Path
 from kgtools.type import Vocab
 
 
+class SentenceCorpus:
+    def __init__(self, sentences):
+        assert iter(sentences) is not sentences, "The sentences must be re-iterable, not a one-shot iterator"
+        self.sentences = sentences
+
+    def __iter__(self):
+        for sent in self.sentences:
+            yield [str(token) for token in sent]
+
+
+class ShardedCorpus:
+    def __init__(self, directory, pattern="*.txt"):
+        # one directory, or several (e.g. the corpora of sharded Pipeline runs) read in the given order
+        directories = [directory] if isinstance(directory, (str, Path)) else directory
+        self.shards = [shard for d in directories for shard in sorted(Path(d).glob(pattern))]
+
+    def __iter__(self):
+        for shard in self.shards:
+            with shard.open("r", encoding="utf-8") as f:
+                for line in f:
+                    words = line.split()
+                    if len(words) > 0:
+                        yield words
+
+    @staticmethod
+    def write(sentences, directory, shard_size=100000):
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        # shards of an earlier, longer corpus in the same directory would be read back with this one
+        for stale in Path(directory).glob("*.txt"):
+            stale.unlink()
+        f, count = None, 0
+        for sent in sentences:
+            if count % shard_size == 0:
+                if f is not None:
+                    f.close()
+                f = (Path(directory) / ("%08d.txt" % (count // shard_size))).open("w", encoding="utf-8")
+            f.write(" ".join([str(token) for token in sent]) + "\n")
+            count += 1
+        if f is not None:
+            f.close()
+        return ShardedCorpus(directory)
+
+
 class Word2Vec:
-    def __init__(self, vocab=Vocab(), min_count=1):
+    # written against the gensim 3 API (size=, iter=, wv.index2word; build_vocab_from_freq needs 3.3), which gensim 4 renamed
+    def __init__(self, vocab=Vocab(), min_count=1, workers=3, epochs=5, batch_words=10000, from_counts=False):
         self.vocab = vocab
+        # build the model vocabulary from `vocab.counts` (which must count the training corpus) instead of scanning it
+        self.from_counts = from_counts
         self.size = vocab.emb_size
         self.min_count = min_count
+        self.workers = workers
+        self.epochs = epochs
+        self.batch_words = batch_words
+        self.model = None
+
+    @staticmethod
+    def __corpus(sentences):
+        return sentences if isinstance(sentences, (SentenceCorpus, ShardedCorpus)) else SentenceCorpus(sentences)
 
     def train(self, sentences):
-        corpus = [[str(token) for token in sent] for sent in sentences]
-        model = w2v(corpus, size=self.size, min_count=self.min_count)
-        for word in model.wv.vocab.keys():
-            self.vocab.embedding[word] = model.wv[word]
+        from gensim.models import Word2Vec as w2v
+        corpus = Word2Vec.__corpus(sentences)
+        if self.from_counts and len(self.vocab.counts) > 0:
+            self.model = w2v(size=self.size, min_count=self.min_count, workers=self.workers, iter=self.epochs, batch_words=self.batch_words)
+            self.model.build_vocab_from_freq(dict(self.vocab.counts.items()))
+            self.model.train(corpus, total_words=self.vocab.counts.total(), epochs=self.epochs)
+        else:
+            self.model = w2v(corpus, size=self.size, min_count=self.min_count, workers=self.workers, iter=self.epochs, batch_words=self.batch_words)
+        self.vocab.embedding.set_matrix(self.model.wv.index2word, self.model.wv.vectors)
         # self.vocab.add("-UNKNOWN-")
         # self.vocab.embedding["-UNKNOWN-"] = np.arrar([0.] * self.size)
+
+    def update(self, sentences):
+        assert self.model is not None, "A trained or loaded model is required for incremental updates"
+        corpus = Word2Vec.__corpus(sentences)
+        self.model.build_vocab(corpus, update=True)
+        self.model.train(corpus, total_examples=self.model.corpus_count, epochs=self.epochs)
+        self.vocab.embedding.set_matrix(self.model.wv.index2word, self.model.wv.vectors)
+
+    def save(self, file_name):
+        Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+        self.model.save(str(file_name))
+
+    def load(self, file_name):
+        from gensim.models import Word2Vec as w2v
+        self.model = w2v.load(str(file_name))
+        self.vocab.embedding.set_matrix(self.model.wv.index2word, self.model.wv.vectors)
+        return self
+
+
+def align(emb, reference):
+    """Orthogonal map (Procrustes) that rotates `emb` onto `reference` over their shared words."""
+    words = [word for word in emb.words if word in reference]
+    assert len(words) > 0, "The embeddings must share words"
+    u, _, vt = np.linalg.svd(emb.lookup(words).T @ reference.lookup(words))
+    return u @ vt
+
+
+def average_embeddings(embeddings, counts=None):
+    """Average separately trained embeddings (e.g. one per Pipeline shard) into one Embedding.
+
+    Each embedding is first rotated onto the first one, since independent runs live in arbitrarily
+    rotated spaces; a word's vector is then the mean of its vectors, weighted by its count per
+    embedding when `counts` (one Counter per embedding) is given.
+    """
+    from kgtools.type import Embedding
+
+    reference = embeddings[0]
+    words = list(dict.fromkeys(word for emb in embeddings for word in emb.words))
+    row = {word: i for i, word in enumerate(words)}
+    total = np.zeros((len(words), reference.dim), dtype=np.float64)
+    weight = np.zeros(len(words), dtype=np.float64)
+    for i, emb in enumerate(embeddings):
+        rows = np.array([row[word] for word in emb.words], dtype=np.int64)
+        if counts is None:
+            w = np.ones(len(rows))
+        else:
+            w = np.array([max(counts[i].get(word, 0), 1) for word in emb.words], dtype=np.float64)
+        matrix = emb.dense() if i == 0 else emb.dense() @ align(emb, reference)
+        np.add.at(total, rows, matrix * w[:, None])
+        np.add.at(weight, rows, w)
+    merged = Embedding(reference.dim, reference.dtype)
+    merged.set_matrix(words, total / weight[:, None])
+    return merged
+
+
+def neighbour_overlap(emb_a, emb_b, k=10, sample=1000, seed=0):
+    """Mean overlap of the top-k cosine neighbours of the words shared by two embeddings.
+
+    Used to check an incrementally updated model against a full retrain (1.0 means identical neighbours).
+    """
+    words = [word for word in emb_a.words if word in emb_b]
+    assert len(words) > k, "The embeddings must share more than k words"
+    rng = np.random.RandomState(seed)
+    queries = rng.choice(len(words), min(sample, len(words)), replace=False)
+
+    def neighbours(emb):
+        matrix = emb.lookup(words)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        sims = matrix[queries] @ matrix.T
+        sims[np.arange(len(queries)), queries] = -np.inf
+        return np.argpartition(-sims, k, axis=1)[:, :k]
+
+    top_a, top_b = neighbours(emb_a), neighbours(emb_b)
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(top_a, top_b)]))
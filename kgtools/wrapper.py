@@ -1,34 +1,33 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import threading
 import time
 
+from kgtools.profiler import PROFILER, logger
+from kgtools.annotation import Lazy
+
 
 def TimeLog(fn):
     def inner(*args, **kwargs):
-        print("Start '%s'... (%s)" % (fn.__qualname__, time.asctime(time.localtime(time.time()))))
-        rs = fn(*args, **kwargs)
-        print("Finish '%s'... (%s)" % (fn.__qualname__, time.asctime(time.localtime(time.time()))))
+        logger.debug("Start '%s'...", fn.__qualname__)
+        start = time.perf_counter()
+        with PROFILER.span(fn.__qualname__):
+            rs = fn(*args, **kwargs)
+        logger.info("Finish '%s'... (%fs)", fn.__qualname__, time.perf_counter() - start)
         return rs
     return inner
 
 
-class Lazy(object):
-    def __init__(self, func):
-        self.func = func
-
-    def __get__(self, instance, cls):
-        val = self.func(instance)
-        setattr(instance, self.func.__name__, val)
-        return val
-
-
 def Singleton(cls):
     _instance = {}
+    _lock = threading.Lock()
 
     def _singleton(*args, **kargs):
         if cls not in _instance:
-            _instance[cls] = cls(*args, **kargs)
+            with _lock:
+                if cls not in _instance:
+                    _instance[cls] = cls(*args, **kargs)
         return _instance[cls]
 
     return _singleton
@@ -21,7 +21,7 @@ setup(
         'lxml',
         'spacy',
         'nltk',
-        'gensim',
+        'gensim>=3.3,<4',
         'numpy',
         'pathos',
         'dill',
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+
+from bs4 import BeautifulSoup
+
+from kgtools.boilerplate import Boilerplate
+from kgtools.htmlparser import HTMLParser
+from kgtools.preprocessing import Pipeline
+
+BANNER = '<div class="banner"><p>Was this page helpful?</p><ul><li>Yes</li><li>No</li></ul></div>'
+
+
+def _page(i):
+    return (f'<html><body>{BANNER}<div class="article"><h1>Title {i}</h1>'
+            f'<p>The method get{i}() returns the value number {i}.</p></div>'
+            '<div class="feedback"><p>Send feedback about this page.</p></div></body></html>')
+
+
+def _body(html):
+    return BeautifulSoup(html, "lxml").body
+
+
+def test_learn_and_strip():
+    boilerplate = Boilerplate(threshold=0.5, min_pages=3).learn(_body(_page(i)) for i in range(10))
+    assert boilerplate.learned and len(boilerplate) > 0
+    body = _body(_page(42))
+    removed = boilerplate.strip(body)
+    text = body.get_text(" ")
+    assert "helpful" not in text and "feedback" not in text
+    assert "get42()" in text and "Title 42" in text
+    assert removed["blocks"] == 2 and removed["sentences"] >= 4 and removed["bytes"] > 0
+
+
+def test_rare_blocks_are_kept():
+    pages = [_page(i) for i in range(10)]
+    pages[0] = pages[0].replace("</body>", '<div class="once"><p>Only here.</p></div></body>')
+    boilerplate = Boilerplate().learn(_body(html) for html in pages)
+    body = _body(pages[0])
+    boilerplate.strip(body)
+    assert "Only here." in body.get_text(" ")
+
+
+def test_unlearned_strip_is_a_noop(caplog):
+    parser = HTMLParser(boilerplate=True)
+    with caplog.at_level(logging.WARNING, logger="kgtools"):
+        texts = parser.parse(_page(1))
+    assert any("helpful" in text for text in texts)
+    assert "no boilerplate was learned" in caplog.text
+
+
+def test_process_learns_and_strips():
+    parser = HTMLParser(boilerplate=True)
+    docs = parser.process([_page(i) for i in range(20)])
+    assert not any("helpful" in text for text in docs)
+    assert parser.removed["pages"] == 20 and parser.removed["blocks"] == 40
+
+
+def test_pipeline_learns_before_parsing():
+    pipeline = Pipeline(conf={"workers": 2, "parser": {"boilerplate": True}})
+    stages, items = pipeline.prepare((f"url{i}", _page(i)) for i in range(20))
+    parsed = dict(pipeline.stream(items, stages[:2]))
+    assert len(parsed) == 20
+    assert not any("helpful" in text for texts in parsed.values() for text in texts)
+    assert pipeline.removed["pages"] == 20 and pipeline.removed["blocks"] == 40
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from kgtools.dedup import NearDuplicateDetector
+from kgtools.preprocessing import Pipeline, Stage
+from kgtools.type import Vocab
+from kgtools.type.sentence import Sentence
+
+BASE = "Use the getIntent method of the Activity class to read the extras passed by the caller in version {}"
+
+
+def _sentences(n, versions=3):
+    sents = []
+    for i in range(n):
+        sents.append(Sentence(BASE.format(i % versions), docs={f"url{i}"}))
+        sents.append(Sentence(f"Sentence {i} is about a completely different topic number {i} of the guide", docs={f"url{i}"}))
+    return sents
+
+
+def test_dedupe_merges_near_duplicates():
+    reps = NearDuplicateDetector(threshold=0.6).dedupe(_sentences(20))
+    near = [sent for sent in reps if sent.text.startswith("Use the")]
+    assert len(near) == 1 and near[0].text == BASE.format(0)
+    assert near[0].docs == {f"url{i}" for i in range(20)}
+    assert len(reps) == 21
+
+
+def test_every_bucket_member_is_found():
+    # a dissimilar sentence sharing a band key must not hide the similar ones behind it
+    detector = NearDuplicateDetector(threshold=0.6, bands=64, num_perm=128)
+    labels = detector.groups(_sentences(30))
+    assert (labels[0::2] == 0).all()
+    assert (labels[1::2] == range(1, 60, 2)).all()
+
+
+def test_streams_in_batches_with_bounded_index():
+    detector = NearDuplicateDetector(threshold=0.6, batch_size=7, capacity=5)
+    reps = detector.dedupe(iter(_sentences(50)))
+    assert len(detector.slots) == 5
+    # the near-duplicate representative is matched all the time, so it is never evicted
+    assert sum(sent.text.startswith("Use the") for sent in reps) == 1
+    assert len(reps) == 51
+
+
+def test_pipeline_stage():
+    def tokenize(items):
+        for url, text in items:
+            yield url, [Sentence(line) for line in text.split("\n")]
+
+    data = {f"url{i}": BASE.format(i) + "\nSomething else entirely on page " + str(i) for i in range(10)}
+    pipeline = Pipeline(Vocab.new_instance(), stages=[Stage(tokenize), Stage(NearDuplicateDetector(threshold=0.6).stage)])
+    docs = dict(pipeline.stream(data.items()))
+    assert {sents[0].text for sents in docs.values()} == {BASE.format(0)}
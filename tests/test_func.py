@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+
+from kgtools.func import reduce_seqs
+
+
+def test_reduce_seqs_types():
+    assert reduce_seqs([{1, 2}, {2, 3}]) == {1, 2, 3}
+    assert reduce_seqs([[1, 2], [2, 3]]) == [1, 2, 2, 3]
+    assert reduce_seqs([{"a": 1}, {"b": 2}]) == {"a": 1, "b": 2}
+    assert reduce_seqs([Counter(a=1, b=-1), Counter(a=2, c=1)]) == Counter(a=3, c=1)
+    assert reduce_seqs([1, 2, 3]) == 6
+    assert reduce_seqs([None, None]) is None
+
+
+def test_reduce_seqs_tuples():
+    merged = reduce_seqs([([1], Counter(a=1)), ([2], Counter(a=2))])
+    assert merged == ([1, 2], Counter(a=3))
+
+
+def test_reduce_seqs_many_chunks():
+    sets = [set(range(i * 100, i * 100 + 100)) for i in range(5000)]
+    assert len(reduce_seqs(sets)) == 500000
+    assert len(reduce_seqs([list(s) for s in sets])) == 500000
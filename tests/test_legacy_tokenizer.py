@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+from types import SimpleNamespace
+
+import kgtools.tokenizer as legacy
+from kgtools.type import Vocab
+
+
+class RawDoc(list):
+    def __init__(self, url, texts):
+        super(RawDoc, self).__init__(texts)
+        self.url = url
+
+
+def stub_nlp(text):
+    return [SimpleNamespace(text=word, lemma_=word.lower(), pos_="X", dep_="dep") for word in text.split()]
+
+
+def test_tokenize_merges_repeated_sentences(monkeypatch):
+    # no spaCy or NLTK data here: split on sentence ends and whitespace instead
+    monkeypatch.setattr(legacy, "load_spacy", lambda *args, **kwargs: stub_nlp)
+    monkeypatch.setattr(legacy, "st", lambda text: re.findall(r'[^.]+\.', text))
+    monkeypatch.setattr(legacy, "wt", str.split)
+    tokenizer = legacy.Tokenizer(vocab=Vocab.new_instance())
+    shared = "Call the method to get the value."
+    docs, sents, vocab = tokenizer.tokenize([RawDoc("a", [shared + " The first page is about intents."]), RawDoc("b", [shared])])
+    assert docs == [("a", [shared, "The first page is about intents."]), ("b", [shared])]
+    by_text = {sent.text: sent for sent in sents}
+    assert len(sents) == 2 and by_text[shared].docs == {"a", "b"}
+    assert [token.lemma for token in by_text[shared].tokens][:2] == ["call", "the"] and vocab is tokenizer.vocab
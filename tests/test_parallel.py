@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from kgtools.annotation import Parallel
+from kgtools.profiler import PROFILER
+from kgtools.scheduler import ChunkScheduler
+
+
+@pytest.fixture
+def profiler():
+    PROFILER.reset()
+    PROFILER.enable()
+    yield PROFILER
+    PROFILER.disable()
+    PROFILER.reset()
+
+
+def _chunks(scheduler):
+    chunks = []
+    chunk = scheduler.next()
+    while chunk is not None:
+        scheduler.feedback(chunk, 0.001 * len(chunk))
+        chunks.append(chunk)
+        chunk = scheduler.next()
+    return chunks
+
+
+def test_scheduler_covers_input_in_order():
+    chunks = _chunks(ChunkScheduler(1000, 4))
+    assert [i for chunk in chunks for i in chunk] == list(range(1000))
+
+
+def test_scheduler_hints_largest_first():
+    hints = [1] * 50 + [1000] + [1] * 50
+    chunks = _chunks(ChunkScheduler(len(hints), 4, hints=hints))
+    assert chunks[0] == [50]
+    assert sorted(i for chunk in chunks for i in chunk) == list(range(len(hints)))
+
+
+def test_scheduler_batch_size():
+    assert [len(chunk) for chunk in _chunks(ChunkScheduler(10, 2, batch_size=4))] == [4, 4, 2]
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_parallel_reduces_in_order(backend):
+    @Parallel(workers=2, backend=backend)
+    def double(batch):
+        return [x * 2 for x in batch]
+
+    assert double(list(range(500))) == [x * 2 for x in range(500)]
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+@pytest.mark.parametrize("enabled", [False, True])
+def test_parallel_out(backend, enabled, request):
+    if enabled:
+        request.getfixturevalue("profiler")
+
+    @Parallel(workers=2, backend=backend, out=2)
+    def rows(batch):
+        return [[x, -x] for x in batch]
+
+    matrix = rows(list(range(300)))
+    assert matrix.shape == (300, 2)
+    assert np.array_equal(matrix[:, 0], np.arange(300))
+    assert np.array_equal(matrix[:, 1], -np.arange(300))
+    if enabled:
+        assert PROFILER.stats[rows.__qualname__]["calls"] > 0
+
+
+def test_parallel_method():
+    class Doubler:
+        @Parallel(workers=2, backend="thread")
+        def run(self, batch):
+            return {x * 2 for x in batch}
+
+    assert Doubler().run(range(100)) == {x * 2 for x in range(100)}
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+
+from kgtools.nlp.parallel import ParallelTokenizer
+from kgtools.type import Vocab, Token, Sentence
+
+
+class StubTokenizer:
+    """Splits sentences on '. ' and words on spaces; no spaCy needed."""
+
+    def __init__(self, vocab, suffix=""):
+        self.vocab = vocab
+        self.suffix = suffix
+
+    def tokenize(self, text):
+        sents = []
+        for part in text.split(". "):
+            words = part.split()
+            sent = Sentence(part, tokens=[Token(word, word.lower() + self.suffix, vocab=self.vocab, pos="X" if i == 0 else None, dep="dep")
+                                          for i, word in enumerate(words)])
+            sent.add_nps((0, min(2, len(words))))
+            sent.add_codes(*[("call", part.index(word), part.index(word) + len(word)) for word in words if word.endswith("()")])
+            sents.append(sent)
+        return sents
+
+
+TEXTS = ["Call getIntent() first. The Intent holds extras", "Read the docs", "The docs say call getIntent()",
+         "Open the file. Close the file", "The end"]
+
+
+def test_round_trip_and_counts():
+    vocab = Vocab.new_instance(lemma_first=False)
+    tokenizer = ParallelTokenizer(StubTokenizer, vocab, workers=2, batch_size=2, suffix="_")
+    sents = tokenizer.tokenize(TEXTS)
+
+    expected = [StubTokenizer(Vocab.new_instance()).tokenize(text) for text in TEXTS]
+    assert [[sent.text for sent in group] for group in sents] == [[sent.text for sent in group] for group in expected]
+    for group, expected_group in zip(sents, expected):
+        for sent, other in zip(group, expected_group):
+            assert [t.fields() for t in sent.tokens] == [(t.text, t.lemma + "_", t.pos, t.dep, t.ner) for t in other.tokens]
+            assert all(t.vocab is vocab for t in sent.tokens)
+            assert {(np.start, np.end) for np in sent.nps} == {(np.start, np.end) for np in other.nps}
+            assert sent.codes == other.codes
+    # strings come back interned from one table per batch
+    words = [t.text for group in sents for sent in group for t in sent.tokens if t.text == "the"]
+    assert len(words) > 1 and all(word is words[0] for word in words)
+
+    tokens = [t for group in expected for sent in group for t in sent.tokens]
+    assert dict(vocab.token_counts.items()) == Counter(t.text for t in tokens)
+    assert dict(vocab.lemma_counts.items()) == Counter(t.lemma + "_" for t in tokens)
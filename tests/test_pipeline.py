@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from kgtools.annotation import Cache
+from kgtools.preprocessing import DocsFile, Pipeline, Stage, RecentSet, Resident
+from kgtools.type import Vocab
+from kgtools.type.sentence import Sentence
+from kgtools.type.token import Token
+
+
+def _tokenize(items):
+    # a generator stage: the tokens are built in this process and count themselves into the Vocab singleton
+    for url, html in items:
+        yield url, [Sentence(text, tokens=[Token(word, word.lower()) for word in text.split()]) for text in html.split(". ")]
+
+
+def test_process_counts_the_corpus_once(tmp_path):
+    vocab = Vocab()
+    vocab.add_token("stale", "stale")
+    data = {"a": "Open the file. Close the file", "b": "Open the socket"}
+    pipeline = Pipeline(vocab, stages=[Stage(_tokenize)])
+    pipeline.process(data, tmp_path, train=False)
+    assert vocab.counts.get("the") == 3
+    assert vocab.counts.get("open") == 2
+    assert "stale" not in vocab.counts
+    assert vocab.token_counts.get("Open") == 2
+
+
+def test_words_is_a_snapshot():
+    vocab = Vocab.new_instance(lemma_first=False)
+    vocab.token_counts.update({"a": 5, "b": 1})
+    words = vocab.words
+    vocab.prune(min_count=2)
+    assert sorted(words) == ["a", "b"]
+    assert vocab.words == ["a"]
+
+
+def test_process_writes_repeated_sentences_once(tmp_path):
+    data = {"a": "Open the file. Was this page helpful?", "b": "Close the file. Was this page helpful?"}
+    pipeline = Pipeline(Vocab(), stages=[Stage(_tokenize)])
+    docs, sentences = pipeline.process(data, tmp_path, train=False)
+    assert dict(docs) == {"a": ["Open the file", "Was this page helpful?"], "b": ["Close the file", "Was this page helpful?"]}
+    assert sorted(" ".join(words) for words in sentences) == ["close the file", "open the file", "was this page helpful?"]
+    assert pipeline.vocab.counts.get("helpful?") == 1
+
+
+def test_recent_set_is_bounded():
+    seen = RecentSet(2)
+    assert seen.add("a") and seen.add("b") and not seen.add("a")
+    assert seen.add("c") and len(seen) == 2
+    # "b" was the least recently seen
+    assert seen.add("b") and not seen.add("c")
+
+
+class _Splitter:
+    @Cache(maxsize=50)
+    def split(self, text):
+        return text.split()
+
+
+def test_resident_cache_stays_bounded():
+    splitter = Resident(_Splitter, "split")
+    pipeline = Pipeline(Vocab.new_instance(), stages=[Stage(splitter, Stage.THREAD, 2)])
+    outputs = dict(pipeline.stream(("url%d" % i, "sentence number %d" % i) for i in range(500)))
+    assert len(outputs) == 500 and outputs["url499"] == ["sentence", "number", "499"]
+    assert len(_Splitter.split.cache) == 50
+
+
+def test_tokenizer_caches_are_bounded():
+    from kgtools.nlp.tokenizer import CompoundTokenizer, SpacyTokenizer
+    for clazz in (CompoundTokenizer, SpacyTokenizer):
+        cached = [fn for fn in vars(clazz).values() if hasattr(fn, "cache")]
+        assert len(cached) > 0 and all(fn.maxsize is not None for fn in cached)
+
+
+class _Recorder:
+    def __init__(self):
+        self.urls = []
+
+    def __call__(self, items):
+        for url, html in items:
+            self.urls.append(url)
+            yield from _tokenize([(url, html)])
+
+
+def _snapshot(vocab):
+    return dict(vocab.token_counts.items()), dict(vocab.lemma_counts.items())
+
+
+def _texts(sentences):
+    return sorted(" ".join(str(token) for token in sent.tokens) for sent in sentences)
+
+
+A = {"a": "Open the file. Was this page helpful?", "b": "Close the file. Was this page helpful?", "c": "Read the docs"}
+B = {"a": "Open the file. Was this page helpful?", "b": "Close the socket. Was this page helpful?", "d": "Write the file. Read the docs",
+     "moved": "Read the docs"}
+
+
+def test_update_matches_process(tmp_path):
+    pipeline = Pipeline(Vocab(), stages=[Stage(_tokenize)])
+    docs, corpus = pipeline.process(B, tmp_path / "full", train=False)
+    expected_docs, expected_sents, expected_counts = dict(docs), sorted(" ".join(words) for words in corpus), _snapshot(pipeline.vocab)
+
+    recorder = _Recorder()
+    pipeline = Pipeline(Vocab(), stages=[Stage(recorder)])
+    pipeline.update(A, tmp_path / "inc", train=False)
+    first = list(recorder.urls)
+    docs, sentences, vocab = pipeline.update(B, tmp_path / "inc", train=False)
+    assert docs == expected_docs and _texts(sentences) == expected_sents and _snapshot(vocab) == expected_counts
+    # unchanged contents ("a", and "c" moved to "moved") are not processed again
+    assert sorted(first) == ["a", "b", "c"] and sorted(recorder.urls[len(first):]) == ["b", "d"]
+    by_text = {sent.text: sent for sent in sentences}
+    assert by_text["Read the docs"].docs == {"d", "moved"} and by_text["Was this page helpful?"].docs == {"a", "b"}
+    outputs = sorted(path.stem for path in (tmp_path / "inc" / "outputs").glob("*.bin"))
+    assert len(outputs) == 4
+
+
+def test_update_retracts_removed_docs(tmp_path):
+    pipeline = Pipeline(Vocab(), stages=[Stage(_tokenize)])
+    pipeline.update(A, tmp_path, train=False)
+    docs, sentences, vocab = pipeline.update({"c": A["c"]}, tmp_path, train=False)
+    assert docs == {"c": ["Read the docs"]} and _texts(sentences) == ["read the docs"]
+    assert _snapshot(vocab) == ({"Read": 1, "the": 1, "docs": 1}, {"read": 1, "the": 1, "docs": 1})
+
+
+def test_sharded_merge_matches_process(tmp_path):
+    data = {f"page{i}": f"Open the file {i % 3}. Was this page helpful? Read the docs" for i in range(12)}
+    pipeline = Pipeline(Vocab(), stages=[Stage(_tokenize)])
+    docs, corpus = pipeline.process(data, tmp_path / "full", train=False)
+    expected_docs, expected_counts = dict(docs), _snapshot(pipeline.vocab)
+    expected_sents = {text: {url for url, texts in expected_docs.items() if text in texts} for texts in expected_docs.values() for text in texts}
+
+    workdirs = [tmp_path / f"shard-{i}" for i in range(2)]
+    for i, workdir in enumerate(workdirs):
+        Pipeline(Vocab(), stages=[Stage(_tokenize)]).process(data, workdir, shard=f"{i}/2", train=False)
+    assert all(len(list(DocsFile(workdir / "docs.jsonl"))) > 0 for workdir in workdirs)
+    docs, sentences, vocab = Pipeline(Vocab()).merge(workdirs, tmp_path / "merged", embedding=None)
+    assert dict(docs) == expected_docs and dict(sentences) == expected_sents and _snapshot(vocab) == expected_counts
+    assert [text for text, _ in sentences] == sorted(expected_sents)
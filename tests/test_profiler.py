@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+
+SCRIPT = """
+import logging, sys
+sys.path.insert(0, %r)
+from kgtools.annotation import TimeLog
+
+@TimeLog
+def work():
+    return 1
+
+work()
+if len(sys.argv) > 1:
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING, format="root: %%(message)s")
+    work()
+"""
+
+
+def run(*args):
+    return subprocess.run([sys.executable, "-c", SCRIPT % os.getcwd(), *args], capture_output=True, text=True, check=True)
+
+
+def test_timelog_prints_without_logging_config():
+    rs = run()
+    assert "@TimeLog[" in rs.stdout and "work takes." in rs.stdout
+
+
+def test_timelog_defers_to_configured_logging():
+    rs = run("configure")
+    # printed once before logging is configured, then only through the root handler
+    assert rs.stdout.count("@TimeLog[") == 1 and rs.stderr.count("root: @TimeLog[") == 1
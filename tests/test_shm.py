@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import pickle
+
+import numpy as np
+import pytest
+
+from kgtools import shm
+from kgtools.annotation import Parallel
+from kgtools.shm import SharedArray
+from kgtools.type.embedding import Embedding
+
+
+def test_mapping_released_with_last_reference():
+    with SharedArray.from_array(np.arange(6, dtype=np.float32)) as shared:
+        attached = pickle.loads(pickle.dumps(shared))
+        assert pickle.loads(pickle.dumps(shared)) is attached and len(shm._ATTACHED) == 1
+        array = attached.array
+        del attached
+        gc.collect()
+        assert len(shm._ATTACHED) == 0 and array.tolist() == list(range(6))
+
+
+def test_unlink_evicts_mapping():
+    shared = SharedArray((3, ), "float32")
+    attached = pickle.loads(pickle.dumps(shared))
+    attached.unlink()
+    assert len(shm._ATTACHED) == 0
+    shared.unlink()
+
+
+def test_embedding_holds_mapping_while_alive():
+    embedding = Embedding(2)
+    embedding.set_matrix(["a", "b"], np.eye(2, dtype=np.float32))
+    with embedding.shared():
+        loaded = pickle.loads(pickle.dumps(embedding))
+        assert len(shm._ATTACHED) == 1 and loaded["b"].tolist() == [0, 1]
+        # pickled again (e.g. on to another worker) it is still a handle
+        assert isinstance(loaded.__getstate__()["matrix"], SharedArray)
+        del loaded
+        gc.collect()
+    assert len(shm._ATTACHED) == 0
+
+
+def rows(batch):
+    return [[x, len(shm._ATTACHED)] for x in batch]
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_parallel_out_leaves_no_mapping(backend):
+    matrix = Parallel(workers=2, backend=backend, batch_size=10, out=2)(rows)(list(range(100)))
+    gc.collect()
+    assert matrix[:, 0].tolist() == list(range(100)) and len(shm._ATTACHED) == 0
+    # a worker maps the output once per batch and drops it afterwards
+    assert matrix[:, 1].max() <= 1
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import tracemalloc
+
+import numpy as np
+
+from kgtools.similarity import ExactIndex, normalize
+
+
+def test_exact_index_blocks_within_memory():
+    rng = np.random.RandomState(0)
+    matrix, queries = rng.randn(20000, 16), rng.randn(300, 16)
+    index = ExactIndex(matrix, memory=1 << 20)
+    assert index.batch_size == (1 << 20) // (12 * 20000)
+    tracemalloc.start()
+    try:
+        indices, values = index.search(queries, k=5, exclude=np.arange(300))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # one block of scores and partition indices, not len(queries) x len(matrix)
+    assert peak < 2 << 20
+
+    scores = normalize(queries) @ normalize(matrix).T
+    scores[np.arange(300), np.arange(300)] = -np.inf
+    expected = np.argsort(-scores, axis=1)[:, :5]
+    assert (indices == expected).all() and np.allclose(values, np.take_along_axis(scores, expected, axis=1), atol=1e-6)
+
+
+def test_exact_index_search_keeps_matrix():
+    matrix = np.eye(3, dtype=np.float32)
+    index = ExactIndex(matrix)
+    index.search(matrix, k=2)
+    assert (index.matrix == matrix).all()
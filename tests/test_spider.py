@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+from kgtools.spider import Spider
+
+PAGES = 30
+
+
+def _app():
+    async def page(request):
+        i = int(request.match_info["i"])
+        links = "".join(f'<a href="/page/{j}.html">{j}</a>' for j in (i + 1, i * 2) if j < PAGES)
+        return web.Response(text=f"<html><body><p>Page {i}</p>{links}</body></html>", content_type="text/html")
+
+    async def sitemap(request):
+        base = f"http://{request.host}"
+        urls = "".join(f"<url><loc>{base}/page/{i}.html</loc></url>" for i in range(PAGES))
+        return web.Response(text=f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>',
+                            content_type="application/xml")
+
+    async def robots(request):
+        return web.Response(text=f"User-agent: *\nSitemap: http://{request.host}/sitemap.xml\n")
+
+    app = web.Application()
+    app.router.add_get("/page/{i}.html", page)
+    app.router.add_get("/sitemap.xml", sitemap)
+    app.router.add_get("/robots.txt", robots)
+    return app
+
+
+@pytest.fixture(scope="module")
+def server():
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def start():
+        runner = web.AppRunner(_app())
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        state.update(base="http://127.0.0.1:%d" % runner.addresses[0][1], runner=runner)
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait(10)
+    yield state["base"]
+    asyncio.run_coroutine_threadsafe(state["runner"].cleanup(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+
+@pytest.mark.parametrize("state", ["set", "fingerprint", "bloom", "disk"])
+def test_sitemap_only_crawl(server, state):
+    spider = Spider(upper=server + "/page/", pool_size=4, state=state)
+    spider.start_crawl(recursive_depth=1, sitemaps=[server + "/sitemap.xml"])
+    assert sorted(spider.storage) == sorted(f"{server}/page/{i}.html" for i in range(PAGES))
+
+
+def test_robots_sitemap_crawl(server):
+    spider = Spider(upper=server + "/page/", pool_size=4)
+    spider.start_crawl(recursive_depth=1, sitemaps="robots")
+    assert len(spider.storage) == PAGES
+
+
+def test_recursive_crawl(server):
+    spider = Spider(server + "/page/0.html", upper=server + "/page/", pool_size=4)
+    spider.start_crawl()
+    assert len(spider.storage) == PAGES
+
+
+def test_disk_state_resumes(server, tmp_path):
+    spider = Spider(upper=server + "/page/", pool_size=4, state="disk", state_dir=tmp_path)
+    spider.seed([f"{server}/page/{i}.html" for i in range(5)])
+    spider.close()
+    # the seen urls and the frontier are both kept, so the seeds are crawled by the next run
+    spider = Spider(upper=server + "/page/", pool_size=4, state="disk", state_dir=tmp_path)
+    assert len(spider.frontier) == 5
+    spider.start_crawl(recursive_depth=1)
+    assert len(spider.storage) == 5
+    spider.close()
+    spider = Spider(upper=server + "/page/", pool_size=4, state="disk", state_dir=tmp_path)
+    assert len(spider.frontier) == 0 and len(spider.storage) == 5
+    spider.close()
+
+
+def test_pages_stream(server):
+    spider = Spider(server + "/page/0.html", upper=server + "/page/", pool_size=4)
+    pages = dict(spider.pages(queue_size=2))
+    assert len(pages) == PAGES and all(body.startswith("<body>") for body in pages.values())
+    assert len(spider.storage) == 0
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from kgtools.nlp import models
+from kgtools.nlp.models import PROFILES, Profile, get_profile, load_profile, load_spacy, clear_models
+from kgtools.nlp.tokenizer import CompoundTokenizer, SpacyTokenizer
+from kgtools.type import Vocab
+
+SENTENCES = [
+    "Call onNewIntent(Intent) when the activity is re-launched, e.g. from a notification.",
+    "The app:initialExpandedChildrenCount=\"0\" attribute controls how many up-to-date children are shown.",
+    "Use <manifest> to declare the package name, i.e. the application ID of your app.",
+    "You can call getSupportFragmentManager().beginTransaction() to start a new transaction.",
+    "If the list is empty, java.util.List.get(int) throws an IndexOutOfBoundsException.",
+    "Don't call this method from the UI thread; it blocks until the result is available.",
+    "The user's \"settings\" aren't saved -- see Settings.Global for details.",
+]
+
+
+@pytest.fixture
+def stub_models(monkeypatch):
+    # records the configs built instead of loading spaCy
+    built = []
+
+    def build(name, disable, token_match):
+        built.append((name, disable, token_match))
+        return object()
+    monkeypatch.setattr(models, "_build_spacy", build)
+    clear_models()
+    yield built
+    clear_models()
+
+
+@pytest.fixture(scope="module")
+def spacy_en():
+    pytest.importorskip("spacy")
+    nltk = pytest.importorskip("nltk")
+    try:
+        nltk.data.find("tokenizers/punkt")
+        return load_spacy()
+    except (LookupError, OSError) as e:
+        pytest.skip(f"NLTK data or the spaCy model is missing: {e}")
+
+
+def test_profiles():
+    assert get_profile("pos") is PROFILES["pos"]
+    custom = Profile("custom", ("ner", ), ("text", "lemma"))
+    assert get_profile(custom) is custom
+    with pytest.raises(AssertionError):
+        get_profile("everything")
+    # every profile fills the fields its components produce
+    assert all("text" in profile.fields for profile in PROFILES.values())
+    assert [name for name, profile in PROFILES.items() if "dep" in profile.fields] == ["noun_chunks", "full"]
+
+
+def test_load_spacy_keys(stub_models):
+    nlp = load_spacy("en", disable=("ner", "parser"))
+    assert load_spacy("en", disable=["parser", "ner"]) is nlp
+    assert load_spacy("en", disable=("ner", )) is not nlp
+    assert load_spacy("en", disable=("ner", "parser"), token_match=None) is not nlp
+    assert load_profile("tokens") is load_spacy("en", disable=("tagger", "parser", "ner"))
+    assert stub_models == [("en", ("ner", "parser"), models.HYPHEN_PATTERN), ("en", ("ner", ), models.HYPHEN_PATTERN),
+                           ("en", ("ner", "parser"), None), ("en", ("ner", "parser", "tagger"), models.HYPHEN_PATTERN)]
+    clear_models()
+    assert load_spacy("en", disable=("ner", "parser")) is not nlp and len(stub_models) == 5
+
+
+def fields(tokens):
+    return [(t.text, t.lemma, t.pos, t.dep) for t in tokens]
+
+
+def test_assembled_doc_matches_default(spacy_en):
+    tokenizer = CompoundTokenizer(Vocab.new_instance(), pieces_size=8)
+    assert tokenizer.verify_assembled(SENTENCES) == []
+    for sent in SENTENCES:
+        expected, expected_nps = tokenizer.word_tokenize_spacy(" ".join(tokenizer.word_tokenize_nltk(sent)))
+        actual, actual_nps = tokenizer.word_tokenize_assembled(sent)
+        assert fields(actual) == fields(expected) and actual_nps == expected_nps
+
+
+def test_upgrade_fills_richer_profile(spacy_en):
+    vocab = Vocab.new_instance(lemma_first=False)
+    cheap = SpacyTokenizer(vocab, profile="tokens")
+    sents = [cheap.word_tokenize(sent) for sent in SENTENCES[:3]]
+    texts = [[t.text for t in sent.tokens] for sent in sents]
+    assert all(t.lemma is None and t.pos is None for sent in sents for t in sent.tokens)
+
+    cheap.upgrade(sents, "full")
+    full = SpacyTokenizer(Vocab.new_instance(lemma_first=False), profile="full")
+    for sent, words in zip(sents, texts):
+        expected = full.word_tokenize(sent.text)
+        assert [t.text for t in sent.tokens] == words
+        assert fields(sent.tokens) == fields(expected.tokens)
+        assert {(np.start, np.end) for np in sent.nps} == {(np.start, np.end) for np in expected.nps}
+    assert vocab.lemma_counts.total() == sum(len(sent.tokens) for sent in sents)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+import subprocess
+import sys
+
+import numpy as np
+
+from kgtools.annotation import ID
+from kgtools.type.corpus import Corpus
+from kgtools.type.sentence import Sentence
+from kgtools.type.token import Token
+from kgtools.type.vocab import Vocab
+
+
+@ID("name", "version")
+class Package:
+    def __init__(self, name, version):
+        self.name = name
+        self.version = version
+
+
+def test_id_equality_and_hash():
+    a, b = Package("numpy", "1.0"), Package("numpy", "1.0")
+    assert a == b and hash(a) == hash(b) and str(a) == "<Package: name=numpy version=1.0>"
+    assert Package("numpy", "2.0") != a
+
+
+def test_id_pickled_in_another_process():
+    # the other process salts string hashes differently
+    code = ("import pickle, sys; sys.path.insert(0, %r); from tests.test_types import Package; "
+            "p = Package('numpy', '1.0'); hash(p); sys.stdout.buffer.write(pickle.dumps(p))") % os.getcwd()
+    env = dict(os.environ, PYTHONHASHSEED="12345")
+    data = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, env=env, check=True).stdout
+    loaded = pickle.loads(data)
+    assert loaded == Package("numpy", "1.0") and hash(loaded) == hash(Package("numpy", "1.0"))
+    assert loaded in {Package("numpy", "1.0")}
+
+
+def test_sentence_pickle_round_trip():
+    sent = Sentence("Call getIntent() first.", docs={"url"})
+    loaded = pickle.loads(pickle.dumps(sent))
+    assert loaded == sent and hash(loaded) == hash(sent) and loaded.docs == {"url"}
+
+
+def test_sentence_loads_plain_dict_pickles(monkeypatch):
+    legacy = Sentence.__new__(Sentence)
+    legacy.__dict__.update({"text": "An old sentence.", "docs": None, "tokens": None, "nps": set()})
+    # pickled the way Sentence was before it had __reduce__
+    monkeypatch.setattr(Sentence, "__reduce__", object.__reduce__)
+    data = pickle.dumps(legacy)
+    monkeypatch.undo()
+    loaded = pickle.loads(data)
+    assert str(loaded) == "An old sentence." and loaded == Sentence("An old sentence.") and loaded.codes == set()
+
+
+def test_add_codes_twice():
+    sent = Sentence("Call getIntent() first.")
+    sent.add_codes(("call", 5, 16))
+    sent.add_codes(("call", 5, 16), ("camel", 5, 14))
+    assert sorted((span.kind, str(span)) for span in sent.codes) == [("call", "getIntent()"), ("camel", "getIntent")]
+    assert pickle.loads(pickle.dumps(sent)).codes == sent.codes
+
+
+def test_most_similar_with_k_beyond_vocab():
+    vocab = Vocab.new_instance(emb_size=2)
+    vocab.embedding.set_matrix(["a", "b", "c"], np.array([[1, 0], [1, 1], [0, 1]], dtype=np.float32))
+    for approximate in (False, True):
+        similar = vocab.most_similar(["a", "x"], k=10, approximate=approximate)
+        assert [word for word, _ in similar[0]] == ["b", "c"] and similar[1] == []
+        assert all(np.isfinite(score) for _, score in similar[0])
+
+
+def corpus_vocab():
+    vocab = Vocab.new_instance(emb_size=2, lemma_first=False)
+    vocab.embedding.set_matrix(["a", "b", "c"], np.array([[1, 0], [1, 1], [0, 1]], dtype=np.float32))
+    return vocab
+
+
+def test_corpus_most_similar_with_k_beyond_corpus():
+    vocab = corpus_vocab()
+    sents = [Sentence(text, tokens=[Token(text, text, vocab)]) for text in ("a", "b", "c")]
+    similar = Corpus(sents).most_similar([sents[0]], k=10)[0]
+    assert [str(sent) for sent, _ in similar] == ["b", "c"]
+
+
+def test_empty_corpus():
+    for sents in ([], [Sentence("No tokens yet.", tokens=[])]):
+        corpus = Corpus(sents)
+        assert len(corpus) == len(sents) and corpus.most_similar(sents, k=3) == [[] for _ in sents]
+
+
+def test_vocab_pickle_leaves_out_similarity_index():
+    vocab = Vocab.new_instance(emb_size=50, dtype="int8")
+    vocab.embedding.set_matrix(["w%d" % i for i in range(2000)], np.random.RandomState(0).randn(2000, 50))
+    size = len(pickle.dumps(vocab))
+    vocab.most_similar(["w0"], k=3)
+    assert len(pickle.dumps(vocab)) == size
+    loaded = pickle.loads(pickle.dumps(vocab))
+    assert [word for word, _ in loaded.most_similar(["w0"], k=3)[0]] == [word for word, _ in vocab.most_similar(["w0"], k=3)[0]]
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import os
+
+import pytest
+
+from kgtools.urlset import SETS, url_set, frontier, bytes_per_url, DiskFrontier, DiskSet, DiskStore
+
+URLS = [f"https://example.com/reference/Class{i}.html" for i in range(20000)]
+
+
+@pytest.mark.parametrize("kind", sorted(SETS))
+def test_sets(kind):
+    seen = url_set(kind)
+    assert all(seen.add(url) for url in URLS)
+    assert not any(seen.add(url) for url in URLS[:1000])
+    assert all(url in seen for url in URLS)
+    misses = sum(f"https://example.com/other/{i}" in seen for i in range(10000))
+    # bloom filters allow rare false positives
+    assert misses <= (30 if kind == "bloom" else 0)
+    assert abs(len(seen) - len(URLS)) <= (20 if kind == "bloom" else 0)
+    assert bytes_per_url(seen) > 0
+
+
+def test_compact_sets_are_smaller():
+    sizes = {}
+    for kind in ("set", "fingerprint", "bloom"):
+        seen = url_set(kind)
+        for url in URLS:
+            seen.add(url)
+        sizes[kind] = bytes_per_url(seen)
+    assert sizes["bloom"] < sizes["fingerprint"] < sizes["set"]
+
+
+@pytest.mark.parametrize("kind", ["set", "disk"])
+def test_frontier_fifo(kind):
+    queue = frontier(kind)
+    for i, url in enumerate(URLS[:100]):
+        queue.push(url, i)
+    assert list(queue)[:2] == [(URLS[0], 0), (URLS[1], 1)]
+    popped = [queue.pop() for _ in range(100)]
+    assert popped == [(url, i) for i, url in enumerate(URLS[:100])]
+    assert queue.pop() is None and len(queue) == 0
+    queue.push("https://example.com/again", 3)
+    assert queue.pop() == ("https://example.com/again", 3)
+
+
+def test_disk_frontier_resumes(tmp_path):
+    queue = DiskFrontier(tmp_path / "frontier.txt")
+    for url in URLS[:10]:
+        queue.push(url, 1)
+    queue.pop()
+    queue.close()
+    with (tmp_path / "frontier.txt").open("a", encoding="utf-8") as f:
+        f.write("1\thttps://example.com/cut")
+    queue = DiskFrontier(tmp_path / "frontier.txt")
+    # the popped item is pending again, the cut line is dropped
+    assert [url for url, _ in queue] == URLS[:10]
+    assert len(queue) == 10
+
+
+def test_disk_set_resumes(tmp_path):
+    seen = DiskSet(tmp_path / "seen.sqlite")
+    seen.add(URLS[0])
+    seen.close()
+    seen = DiskSet(tmp_path / "seen.sqlite")
+    assert URLS[0] in seen and len(seen) == 1
+
+
+def test_temporary_files_are_removed():
+    states = [DiskSet(), DiskFrontier(), DiskStore()]
+    paths = [state.path for state in states]
+    assert all(os.path.exists(path) for path in paths)
+    states[0].close()
+    del states
+    gc.collect()
+    assert not any(os.path.exists(path) for path in paths)
+
+
+def test_disk_store(tmp_path):
+    store = DiskStore(tmp_path / "pages.sqlite")
+    store["a"] = "<body>a</body>"
+    store["b"] = "<body>b</body>"
+    assert "a" in store and "c" not in store and len(store) == 2
+    assert store["b"] == "<body>b</body>"
+    assert dict(store.items()) == {"a": "<body>a</body>", "b": "<body>b</body>"}
+    with pytest.raises(KeyError):
+        store["c"]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from kgtools.type import Embedding, Sentence, Token, Vocab
+from kgtools.w2v import SentenceCorpus, ShardedCorpus, Word2Vec, align, average_embeddings
+
+WORDS = ["w%d" % i for i in range(40)]
+
+
+def embedding(words, matrix):
+    emb = Embedding(matrix.shape[1])
+    emb.set_matrix(words, matrix)
+    return emb
+
+
+def rotation(dim, seed=0):
+    return np.linalg.qr(np.random.RandomState(seed).randn(dim, dim))[0]
+
+
+@pytest.fixture
+def gensim():
+    return pytest.importorskip("gensim")
+
+
+def test_align_recovers_rotation():
+    reference = np.random.RandomState(1).randn(len(WORDS), 8)
+    q = rotation(8)
+    # the rotated embedding has an extra word and misses one
+    emb = embedding(WORDS[1:] + ["extra"], np.vstack([reference[1:] @ q, np.ones((1, 8))]))
+    assert np.allclose(emb.lookup(WORDS[1:]) @ align(emb, embedding(WORDS, reference)), reference[1:], atol=1e-4)
+
+
+def test_average_embeddings():
+    rng = np.random.RandomState(2)
+    reference, q = rng.randn(len(WORDS), 8), rotation(8)
+    a = embedding(WORDS, reference)
+    b = embedding(WORDS + ["only_b"], np.vstack([reference @ q, np.ones((1, 8))]))
+    merged = average_embeddings([a, b])
+    assert merged.words == WORDS + ["only_b"]
+    assert np.allclose(merged.lookup(WORDS), reference, atol=1e-4)
+    assert np.allclose(merged["only_b"], np.ones(8) @ q.T, atol=1e-4)
+
+    # count-weighted: a word seen 3 times in the first shard and once in the second
+    c = embedding(WORDS, np.vstack([reference[:1] + 1, reference[1:]]))
+    weighted = average_embeddings([a, c], [{"w0": 3}, {"w0": 1}])
+    expected = (3 * reference[0] + (c.lookup(["w0"]) @ align(c, a))[0]) / 4
+    assert np.allclose(weighted["w0"], expected, atol=1e-4)
+
+
+def sentences(n, words, seed=0):
+    rng = np.random.RandomState(seed)
+    return [list(rng.choice(words, 8)) for _ in range(n)]
+
+
+def test_update_adds_new_words(gensim, tmp_path):
+    vocab = Vocab.new_instance(emb_size=16)
+    w2v = Word2Vec(vocab, workers=1, epochs=2)
+    w2v.train(sentences(200, WORDS[:20]))
+    before = vocab.embedding.lookup(WORDS[:20])
+    w2v.save(tmp_path / "w2v.model")
+
+    w2v.update(sentences(200, WORDS[10:], seed=1))
+    assert set(WORDS) <= set(vocab.embedding.words)
+    assert not np.allclose(vocab.embedding.lookup(WORDS[10:20]), before[10:])
+
+    loaded = Word2Vec(Vocab.new_instance(emb_size=16), workers=1).load(tmp_path / "w2v.model")
+    assert np.allclose(loaded.vocab.embedding.lookup(WORDS[:20]), before)
+    with pytest.raises(AssertionError):
+        Word2Vec(Vocab.new_instance(emb_size=16)).update(sentences(10, WORDS))
+
+
+def test_sentence_corpus_is_reiterable():
+    sents = [Sentence("Open the file", tokens=[Token(word, word.lower(), vocab=Vocab.new_instance(lemma_first=False)) for word in "Open the file".split()])]
+    corpus = SentenceCorpus(sents)
+    assert list(corpus) == list(corpus) == [["Open", "the", "file"]]
+    with pytest.raises(AssertionError):
+        SentenceCorpus(iter(sents))
+
+
+def test_sharded_corpus(tmp_path):
+    lines = [["w%d" % i, "x"] for i in range(5)]
+    corpus = ShardedCorpus.write(lines, tmp_path / "a", shard_size=2)
+    assert [shard.name for shard in corpus.shards] == ["00000000.txt", "00000001.txt", "00000002.txt"]
+    assert list(corpus) == list(corpus) == lines
+    # rewriting a shorter corpus leaves no stale shard behind
+    assert list(ShardedCorpus.write(lines[:2], tmp_path / "a", shard_size=2)) == lines[:2]
+    ShardedCorpus.write([["y"]], tmp_path / "b")
+    assert list(ShardedCorpus([tmp_path / "b", tmp_path / "a"])) == [["y"]] + lines[:2]
+
+
+def test_train_from_counts(gensim, tmp_path):
+    data = sentences(300, WORDS)
+    vocab = Vocab.new_instance(lemma_first=False, emb_size=16)
+    vocab.token_counts.update([word for sent in data for word in sent])
+    w2v = Word2Vec(vocab, workers=1, epochs=2, from_counts=True)
+    w2v.train(ShardedCorpus.write(data, tmp_path / "corpus", shard_size=100))
+    # the model vocabulary is the counted one, not a scan of the corpus
+    assert {word: w2v.model.wv.vocab[word].count for word in WORDS} == dict(vocab.counts.items())
+    assert sorted(vocab.embedding.words) == sorted(WORDS)